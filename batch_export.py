@@ -0,0 +1,228 @@
+"""
+Modo por lotes sin navegador: genera un documento ODT por vehículo a partir de un archivo
+CSV o JSONL con las columnas site1, site2, site3, transmission y language.
+
+    python batch_export.py vehiculos.csv -o exportados --workers 8
+
+Cada fila es un vehículo: las URLs de los tres sitios (vacías si no se tienen), la opción
+de transmisión del Sitio 2 ("Por defecto", "Manual" o "Automático"; vacía = por defecto)
+y el idioma de la plantilla (vacío = --language). Las ternas se procesan en el pool de
+procesos de `DataProcessor.process_batch`, solo con los campos que usan las plantillas, y
+se combinan y exportan como en la aplicación. Al final se imprime un resumen de
+rendimiento y latencias (con --memory, también la memoria asignada por cada paso de las
+transformaciones); el código de salida es 1 si algún vehículo quedó sin documento.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+import unicodedata
+from contextlib import nullcontext, redirect_stdout
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from data_processor import BatchReport, DataProcessor, PipelinePool, TRANSMISSION_OPTIONS
+from data_transformation.schema import HOMOLOGATION_KEYS
+from data_transformation.step_metrics import PERCENTILES
+from exportToFile import ODTExporter, TEMPLATES_BY_LANGUAGE, template_path
+
+COLUMNS = ("site1", "site2", "site3", "transmission", "language")
+
+
+def _normalize(label) -> str:
+    """Texto en minúsculas y sin acentos, para aceptar "automatico" o "INGLES"."""
+    text = unicodedata.normalize("NFKD", str(label or "").strip().lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+_TRANSMISSIONS = {_normalize(option): value for option, value in TRANSMISSION_OPTIONS.items()}
+_TRANSMISSIONS[""] = None
+_LANGUAGES = {_normalize(language): language for language in TEMPLATES_BY_LANGUAGE}
+
+
+@dataclass
+class VehicleRow:
+    """Una fila del archivo de entrada, ya validada."""
+    number: int
+    urls: tuple
+    transmission_manual: Optional[bool]
+    language: str
+
+    @property
+    def file_name(self) -> str:
+        return f"vehiculo_{self.number:04d}_{_normalize(self.language)}.odt"
+
+
+@dataclass
+class BatchSummary:
+    """Resultado de `run_batch`: archivos escritos, errores por fila y tiempos."""
+    total: int = 0
+    written: Dict[int, str] = field(default_factory=dict)
+    # Errores de sitios (el documento se genera igual con los sitios restantes)
+    site_errors: Dict[int, List[str]] = field(default_factory=dict)
+    # Filas sin documento, con el motivo
+    failed: Dict[int, str] = field(default_factory=dict)
+    export_seconds: List[float] = field(default_factory=list)
+    seconds: float = 0.0
+    report: BatchReport = field(default_factory=BatchReport)
+    # Si los informes incluyen la memoria asignada por paso (--memory)
+    memory: bool = False
+
+    def print(self, percentiles=PERCENTILES):
+        print("\n=== RESUMEN DEL LOTE ===")
+        print(f"Vehículos: {self.total} | documentos: {len(self.written)} | "
+              f"sin documento: {len(self.failed)} | con errores de algún sitio: {len(self.site_errors)}")
+        rate = self.total / self.seconds if self.seconds else 0.0
+        print(f"Tiempo total: {self.seconds:.1f} s ({rate:.2f} vehículos/s)")
+        if self.report.urls:
+            print("\nLatencia por sitio (segundos):")
+            print(self.report.totals(percentiles).to_string(index=False, float_format="{:.3f}".format))
+        if self.report.urls and self.memory:
+            steps = self.report.steps(percentiles)
+            columns = [column for column in steps.columns if column.startswith(("allocated_bytes", "peak_bytes"))]
+            print("\nMemoria por paso de transformación (bytes):")
+            print(steps[["transformer", "mode", "step", "runs"] + columns].to_string(index=False, float_format="{:.0f}".format))
+        elif self.report.urls:
+            print("\nMemoria por paso: no medida (usar --memory)")
+        if self.export_seconds:
+            exports = pd.Series(self.export_seconds).quantile(list(percentiles))
+            print("\nExportación ODT (segundos): " + ", ".join(
+                f"p{round(percentile * 100):g}={value:.3f}" for percentile, value in exports.items()))
+        for number, errors in sorted(self.site_errors.items()):
+            for error in errors:
+                print(f"Fila {number}: {error}")
+        for number, reason in sorted(self.failed.items()):
+            print(f"Fila {number}: sin documento ({reason})")
+        print("=== FIN RESUMEN DEL LOTE ===\n")
+
+
+def read_rows(path: str) -> List[dict]:
+    """Filas del archivo de entrada (JSONL si la extensión es .jsonl o .json, si no CSV)."""
+    if os.path.splitext(path)[1].lower() in (".jsonl", ".json"):
+        with open(path, encoding="utf-8") as source:
+            return [json.loads(line) for line in source if line.strip()]
+    with open(path, encoding="utf-8-sig", newline="") as source:
+        return list(csv.DictReader(source))
+
+
+def parse_rows(rows: List[dict], default_language: str) -> List[VehicleRow]:
+    """
+    Valida todas las filas antes de empezar, para no descubrir un error después de horas
+    de procesamiento. Lanza ValueError con todas las filas inválidas.
+    """
+    vehicles, problems = [], []
+    for number, row in enumerate(rows, start=1):
+        row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+        urls = tuple(str(row.get(column) or "").strip() for column in COLUMNS[:3])
+        transmission = _normalize(row.get("transmission"))
+        language = _normalize(row.get("language")) or _normalize(default_language)
+        if not any(urls):
+            problems.append(f"Fila {number}: no tiene ninguna URL")
+        elif transmission not in _TRANSMISSIONS:
+            problems.append(f"Fila {number}: transmisión desconocida '{row.get('transmission')}'")
+        elif language not in _LANGUAGES:
+            problems.append(f"Fila {number}: idioma desconocido '{row.get('language')}'")
+        else:
+            vehicles.append(VehicleRow(number, urls, _TRANSMISSIONS[transmission], _LANGUAGES[language]))
+    if problems:
+        raise ValueError("\n".join(problems))
+    return vehicles
+
+
+def run_batch(vehicles: List[VehicleRow], output_dir: str, workers: Optional[int] = None,
+              batch_size: int = 50, chunksize: int = 4, verbose: bool = False,
+              memory: bool = False) -> BatchSummary:
+    """
+    Procesa, combina y exporta los vehículos. Las filas se agrupan por transmisión (un lote
+    del pool usa una sola) y se envían de a `batch_size`, de modo que los documentos se van
+    escribiendo y el progreso se ve mientras avanza el lote. Con `memory` se mide además la
+    memoria asignada por cada paso de las transformaciones.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    # Los diagnósticos del exportador (un DataFrame por documento) solo con --verbose
+    quiet = nullcontext if verbose else (lambda: redirect_stdout(io.StringIO()))
+    exporters = {language: ODTExporter(template_path(language))
+                 for language in {vehicle.language for vehicle in vehicles}}
+    with quiet():
+        template_fields = {language: exporter.fields_in_template(HOMOLOGATION_KEYS)
+                           for language, exporter in exporters.items()}
+
+    processor = DataProcessor(result_cache=False)
+    summary = BatchSummary(total=len(vehicles), memory=memory)
+    groups = {}
+    for vehicle in vehicles:
+        groups.setdefault(vehicle.transmission_manual, []).append(vehicle)
+
+    start = time.perf_counter()
+    with PipelinePool(workers, chunksize) as pool:
+        for transmission_manual, group in groups.items():
+            # Solo los campos que usa alguna de las plantillas del grupo (None = todos)
+            fields = [template_fields[vehicle.language] for vehicle in group]
+            processor.requested_keys = None if None in fields else frozenset().union(*fields)
+            for offset in range(0, len(group), batch_size):
+                chunk = group[offset:offset + batch_size]
+                processed, report = processor.process_batch(
+                    [vehicle.urls for vehicle in chunk], transmission_manual, pool=pool, report=True, memory=memory)
+                summary.report.urls.extend(report.urls)
+                for vehicle, (results, errors) in zip(chunk, processed):
+                    _export(vehicle, results, errors, exporters[vehicle.language], output_dir, summary, quiet)
+                done = len(summary.written) + len(summary.failed)
+                print(f"Procesados {done}/{summary.total} vehículos ({time.perf_counter() - start:.1f} s)")
+    summary.seconds = time.perf_counter() - start
+    return summary
+
+
+def _export(vehicle, results, errors, exporter, output_dir, summary, quiet):
+    if errors:
+        summary.site_errors[vehicle.number] = [errors[site] for site in sorted(errors)]
+    merged = DataProcessor.merge_dataframes(results.get(1), results.get(2), results.get(3))
+    if merged is None:
+        summary.failed[vehicle.number] = "ningún sitio devolvió datos"
+        return
+    start = time.perf_counter()
+    with quiet():
+        doc_bytes = exporter.export_to_odt(merged)
+    summary.export_seconds.append(time.perf_counter() - start)
+    if not doc_bytes:
+        summary.failed[vehicle.number] = "error al generar el documento ODT"
+        return
+    path = os.path.join(output_dir, vehicle.file_name)
+    with open(path, "wb") as target:
+        target.write(doc_bytes)
+    summary.written[vehicle.number] = path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Genera un documento ODT por vehículo sin la aplicación web.")
+    parser.add_argument("input", help="CSV o JSONL con las columnas " + ", ".join(COLUMNS))
+    parser.add_argument("-o", "--output-dir", default="exportados", help="carpeta de los documentos (por defecto: %(default)s)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="procesos en paralelo (por defecto: uno por núcleo)")
+    parser.add_argument("--batch-size", type=int, default=50, help="vehículos por envío al pool (por defecto: %(default)s)")
+    parser.add_argument("--chunksize", type=int, default=4, help="ternas por tarea de cada proceso (por defecto: %(default)s)")
+    parser.add_argument("--language", default=next(iter(TEMPLATES_BY_LANGUAGE)),
+                        help="idioma de las filas sin idioma: " + ", ".join(TEMPLATES_BY_LANGUAGE))
+    parser.add_argument("-v", "--verbose", action="store_true", help="muestra los diagnósticos del exportador ODT")
+    parser.add_argument("--memory", action="store_true",
+                        help="mide la memoria asignada por paso de transformación (tracemalloc; más lento)")
+    args = parser.parse_args(argv)
+    if _normalize(args.language) not in _LANGUAGES:
+        parser.error(f"idioma desconocido '{args.language}'; opciones: " + ", ".join(TEMPLATES_BY_LANGUAGE))
+
+    try:
+        vehicles = parse_rows(read_rows(args.input), args.language)
+    except (OSError, ValueError) as e:
+        print(f"Error en el archivo de entrada {args.input}:\n{e}", file=sys.stderr)
+        return 2
+    summary = run_batch(vehicles, args.output_dir, args.workers, args.batch_size, args.chunksize, args.verbose,
+                        args.memory)
+    summary.print()
+    return 1 if summary.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
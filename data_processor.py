@@ -0,0 +1,479 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from functools import partial
+from typing import List, Optional
+
+import pandas as pd
+
+from scraping.scraping_site_1 import Site1Scraper
+from scraping.scraping_site_2 import Site2Scraper
+from scraping.scraping_site_3 import Site3Scraper
+from scraping.async_engine import AsyncScrapeEngine, scrape_triples_async
+from scraping.result_memo import get_result_memo
+from scraping.result_cache import ResultCache, get_result_cache
+from data_transformation.transform_site1 import VehicleDataTransformer_site1, DEFAULT_CONFIG_1
+from data_transformation.transform_site2 import VehicleDataTransformer_site2, DEFAULT_CONFIG_2
+from data_transformation.transform_site3 import VehicleDataTransformer_site3, DEFAULT_CONFIG_3
+from data_transformation.site_merge import SITE_PRIORITY, merge_sites, merge_sites_many
+from data_transformation.step_metrics import PERCENTILES, TransformReport, profile_steps, summarize_reports
+
+# Opciones de transmisión del Sitio 2 y su valor de `transmission_manual`
+TRANSMISSION_OPTIONS = {"Por defecto": None, "Manual": True, "Automático": False}
+
+# Valor por defecto de `requested_keys` en los métodos: las claves del DataProcessor
+PROCESSOR_KEYS = object()
+
+
+@dataclass
+class UrlReport:
+    """Informe de `process_url(..., report=True)`: tiempos de extracción y de cada paso."""
+    url: str
+    site: int
+    scrape_seconds: float = 0.0
+    transform_seconds: float = 0.0
+    # Un informe por llamada al transformador (ver data_transformation.step_metrics)
+    transforms: List[TransformReport] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def to_frame(self) -> pd.DataFrame:
+        """Pasos de todas las transformaciones, con la URL y el sitio."""
+        frames = [report.to_frame() for report in self.transforms] or [TransformReport("", "").to_frame()]
+        frame = pd.concat(frames, ignore_index=True)
+        frame.insert(0, "url", self.url)
+        frame.insert(1, "site", self.site)
+        return frame
+
+
+@dataclass
+class BatchReport:
+    """Informes de un lote (`process_batch(..., report=True)`) y sus percentiles."""
+    urls: List[UrlReport] = field(default_factory=list)
+
+    def steps(self, percentiles=PERCENTILES) -> pd.DataFrame:
+        """Percentiles de tiempo, filas y memoria por transformador y paso (ver `summarize_reports`)."""
+        return summarize_reports([report for url in self.urls for report in url.transforms], percentiles)
+
+    def totals(self, percentiles=PERCENTILES) -> pd.DataFrame:
+        """Percentiles por sitio de los segundos de extracción y de transformación."""
+        frame = pd.DataFrame([{"site": url.site, "scrape_seconds": url.scrape_seconds,
+                               "transform_seconds": url.transform_seconds, "failed": url.error is not None}
+                              for url in self.urls],
+                             columns=["site", "scrape_seconds", "transform_seconds", "failed"])
+        groups = frame.groupby("site")
+        summary = groups.agg(urls=("site", "size"), failed=("failed", "sum"))
+        for percentile in percentiles:
+            values = groups[["scrape_seconds", "transform_seconds"]].quantile(percentile)
+            values.columns = [f"{column}_p{round(percentile * 100):g}" for column in values.columns]
+            summary = summary.join(values)
+        return summary.reset_index()
+
+
+class DataProcessor:
+    """
+    Clase para manejar el procesamiento y transformación de datos de vehículos
+    """
+    def __init__(self, error_reporter=print, requested_keys=None, result_cache=None, max_workers=8):
+        # Función que muestra los errores de process_url (st.error en la aplicación)
+        self.error_reporter = error_reporter
+        # Claves que se necesitan (p. ej. las que usa la plantilla ODT); None = todas.
+        # Los transformadores solo ejecutan los pasos de los que dependen esas claves.
+        self.requested_keys = None if requested_keys is None else frozenset(requested_keys)
+        self.site1_scraper = Site1Scraper()
+        self.site2_scraper = Site2Scraper()
+        self.site3_scraper = Site3Scraper()
+
+        self.transformer_site1 = VehicleDataTransformer_site1(DEFAULT_CONFIG_1)
+        self.transformer_site2 = VehicleDataTransformer_site2(DEFAULT_CONFIG_2)
+        self.transformer_site3 = VehicleDataTransformer_site3(DEFAULT_CONFIG_3)
+
+        # Resultados memorizados por contenido: una página idéntica no se vuelve a transformar
+        self.result_memo = get_result_memo()
+        # Resultados por (URL, sitio, transmisión) compartidos por todo el proceso; False la desactiva
+        self.result_cache = get_result_cache() if result_cache is None else result_cache
+        # Hilos en segundo plano para los sitios (ver submit_urls), creados al primer uso
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _transformer(self, site_number):
+        return {1: self.transformer_site1, 2: self.transformer_site2, 3: self.transformer_site3}[site_number]
+
+    def _keys(self, requested_keys):
+        """Claves pedidas de una llamada: las del DataProcessor salvo que se indiquen otras."""
+        if requested_keys is PROCESSOR_KEYS:
+            return self.requested_keys
+        return None if requested_keys is None else frozenset(requested_keys)
+
+    def _scrape(self, url, site_number, transmission_manual=None):
+        """Obtiene los datos sin transformar de un sitio."""
+        if site_number == 1:
+            return self.site1_scraper.scrape(url)
+        elif site_number == 2:
+            return self.site2_scraper.scrape(url, transmission_manual)
+        elif site_number == 3:
+            return self.site3_scraper.scrape(url)
+        raise ValueError(f"Número de sitio desconocido: {site_number}")
+
+    def _scrape_and_transform_measured(self, url, site_number, transmission_manual=None, memory=False,
+                                       requested_keys=PROCESSOR_KEYS):
+        """
+        Como `_scrape_and_transform`, pero midiendo la extracción y cada paso de la
+        transformación. La transformación no se toma de los resultados memorizados, para
+        que los tiempos sean reales. Retorna (DataFrame o None, UrlReport); no propaga errores.
+        """
+        report = UrlReport(url, site_number)
+        requested_keys = self._keys(requested_keys)
+        try:
+            start = time.perf_counter()
+            data = self._scrape(url, site_number, transmission_manual)
+            report.scrape_seconds = time.perf_counter() - start
+
+            transformer = self._transformer(site_number)
+            start = time.perf_counter()
+            with profile_steps(memory) as profiler:
+                if requested_keys is None:
+                    result = transformer.transform(data)
+                else:
+                    result = transformer.transform(data, keys=requested_keys)
+            report.transform_seconds = time.perf_counter() - start
+            report.transforms = profiler.reports
+            return result, report
+        except Exception as e:
+            report.error = f"Error al procesar el Sitio {site_number} ({url}): {e}"
+            return None, report
+
+    def _scrape_and_transform(self, url, site_number, transmission_manual=None, requested_keys=PROCESSOR_KEYS):
+        """Obtiene y transforma los datos de un sitio. Propaga cualquier excepción."""
+        # Solo para el site 2 se utiliza el parámetro transmission_manual.
+        if site_number != 2:
+            transmission_manual = None
+        requested_keys = self._keys(requested_keys)
+        key = ResultCache.key(url, site_number, transmission_manual, requested_keys)
+        result = self.result_cache.get(key) if self.result_cache else None
+        if result is None:
+            data = self._scrape(url, site_number, transmission_manual)
+            result = self.result_memo.transform(self._transformer(site_number), data, requested_keys)
+            if self.result_cache:
+                self.result_cache.put(key, result)
+        return result
+
+    def _scrape_and_transform_site2_variants(self, url, requested_keys=PROCESSOR_KEYS):
+        """
+        Obtiene y transforma el Sitio 2 para las tres opciones de transmisión con una sola
+        descarga y un solo parseo. Retorna {opción: DataFrame transformado}.
+        """
+        requested_keys = self._keys(requested_keys)
+        keys = {option: ResultCache.key(url, 2, option, requested_keys)
+                for option in Site2Scraper.TRANSMISSION_OPTIONS}
+        if self.result_cache:
+            cached = {option: self.result_cache.get(key) for option, key in keys.items()}
+            if all(result is not None for result in cached.values()):
+                return cached
+
+        frames = self.site2_scraper.scrape_transmissions(url)
+        results = {option: self.result_memo.transform(self.transformer_site2, data, requested_keys)
+                   for option, data in frames.items()}
+        if self.result_cache:
+            for option, result in results.items():
+                self.result_cache.put(keys[option], result)
+        return results
+
+    def process_url(self, url, site_number, transmission_manual=None, report=False, memory=False):
+        """
+        Procesa una URL y retorna los datos transformados.
+
+        Con `report` retorna (datos, UrlReport) con los segundos de extracción y, por cada
+        paso de la transformación, su tiempo, las filas antes y después y (con `memory`)
+        los bytes asignados.
+        """
+        if site_number not in (1, 2, 3):
+            message = f"Número de sitio desconocido: {site_number}"
+            self.error_reporter(message)
+            return (None, UrlReport(url, site_number, error=message)) if report else None
+        if report:
+            result, url_report = self._scrape_and_transform_measured(url, site_number, transmission_manual, memory)
+            if url_report.error:
+                self.error_reporter(url_report.error)
+            return result, url_report
+        try:
+            return self._scrape_and_transform(url, site_number, transmission_manual)
+        except Exception as e:
+            self.error_reporter(f"Error al procesar el Sitio {site_number} ({url}): {e}")
+            return None
+
+    @staticmethod
+    def site_error(site_number, url, exc) -> str:
+        return f"Error al procesar el Sitio {site_number} ({url}): {exc}"
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sitio")
+            return self._executor
+
+    def submit_urls(self, urls, transmission_manual=None, site2_variants=False, requested_keys=PROCESSOR_KEYS):
+        """
+        Lanza en segundo plano el procesamiento de cada URL y retorna enseguida
+        {numero_de_sitio: Future}; las URLs vacías se ignoran. Cada Future entrega el
+        resultado de ese sitio tal como en `process_urls` o lanza su excepción, de modo que
+        quien llama puede mostrar cada sitio en cuanto termina.
+        """
+        executor = self._get_executor()
+        futures = {}
+        for site, url in urls.items():
+            if not url:
+                continue
+            if site == 2 and site2_variants:
+                futures[site] = executor.submit(self._scrape_and_transform_site2_variants, url, requested_keys)
+            else:
+                futures[site] = executor.submit(self._scrape_and_transform, url, site,
+                                                transmission_manual if site == 2 else None, requested_keys)
+        return futures
+
+    def process_urls(self, urls, transmission_manual=None, site2_variants=False, requested_keys=PROCESSOR_KEYS):
+        """
+        Procesa en paralelo las URLs de cada sitio.
+
+        `urls` es un diccionario {numero_de_sitio: url}; las URLs vacías se ignoran.
+        Retorna (resultados, errores): ambos diccionarios indexados por número de sitio.
+        Los errores se devuelven como mensajes en lugar de mostrarse aquí, porque
+        Streamlit solo puede escribir en la página desde el hilo principal.
+
+        Con `site2_variants`, el resultado del Sitio 2 es un diccionario
+        {opción_de_transmisión: DataFrame} con las tres opciones (None, True, False), para
+        poder cambiar de transmisión después sin volver a descargar ni parsear nada.
+
+        `requested_keys` sustituye en esta llamada a las claves del DataProcessor.
+        """
+        results = {site: None for site in urls}
+        errors = {}
+        futures = {future: site for site, future in
+                   self.submit_urls(urls, transmission_manual, site2_variants, requested_keys).items()}
+        for future in as_completed(futures):
+            site = futures[future]
+            try:
+                results[site] = future.result()
+            except Exception as e:
+                errors[site] = self.site_error(site, urls[site], e)
+        return results, errors
+
+    def process_many(self, triples, transmission_manual=None, max_concurrency=50, per_host_limit=6):
+        """
+        Procesa muchas ternas (url_sitio1, url_sitio2, url_sitio3) con el motor asíncrono.
+
+        Todas las descargas comparten un único event loop con concurrencia acotada
+        (global y por host). Los sitios que ya están en `result_cache` no se descargan y
+        los resultados nuevos se guardan en ella, igual que en `process_urls`. Retorna una
+        lista, en el orden de entrada, de tuplas (resultados, errores) con el mismo formato
+        que `process_urls`.
+        """
+        triples = [tuple(triple) for triple in triples]
+        scrapers = {1: self.site1_scraper, 2: self.site2_scraper, 3: self.site3_scraper}
+        transformers = {1: self.transformer_site1, 2: self.transformer_site2, 3: self.transformer_site3}
+
+        def cache_key(site, url):
+            return ResultCache.key(url, site, transmission_manual if site == 2 else None, self.requested_keys)
+
+        cached, pending = [], []
+        for triple in triples:
+            hits = {}
+            if self.result_cache:
+                for site, url in enumerate(triple, start=1):
+                    result = self.result_cache.get(cache_key(site, url)) if url else None
+                    if result is not None:
+                        hits[site] = result
+            cached.append(hits)
+            # Solo se descargan los sitios que no están en la caché
+            pending.append(tuple("" if site in hits else url for site, url in enumerate(triple, start=1)))
+
+        async def scrape_all():
+            async with AsyncScrapeEngine(max_concurrency, per_host_limit) as engine:
+                return await scrape_triples_async(pending, scrapers, engine, transmission_manual)
+
+        processed = []
+        for triple, hits, (results, errors) in zip(triples, cached, asyncio.run(scrape_all())):
+            for site, data in results.items():
+                if site in hits:
+                    results[site] = hits[site]
+                    continue
+                if data is None:
+                    continue
+                try:
+                    results[site] = self.result_memo.transform(transformers[site], data, self.requested_keys)
+                except Exception as e:
+                    results[site] = None
+                    errors[site] = f"Error al procesar el Sitio {site} ({triple[site - 1]}): {e}"
+                    continue
+                if self.result_cache:
+                    self.result_cache.put(cache_key(site, triple[site - 1]), results[site])
+            processed.append((results, errors))
+        return processed
+
+    def process_batch(self, triples, transmission_manual=None, pool=None, report=False, memory=False):
+        """
+        Procesa muchas ternas (url_sitio1, url_sitio2, url_sitio3) en un pool de procesos.
+
+        El parseo HTML y las transformaciones retienen el GIL; repartiendo las ternas entre
+        procesos el rendimiento escala con los núcleos. Cada proceso mantiene sus propios
+        scrapers, transformadores y sesiones HTTP, y devuelve los resultados en forma compacta
+        (ver `VehicleSchema.pack`). Retorna lo mismo que `process_many`.
+
+        Con `report` retorna (procesados, BatchReport): cada proceso mide sus URLs una a una
+        (sin hilos, para no mezclar los tiempos) y el informe resume los pasos en percentiles.
+        Con `memory`, los pasos registran además los bytes asignados (tracemalloc; más lento).
+        """
+        pool = pool or get_pipeline_pool()
+        processed = []
+        batch_report = BatchReport()
+        for packed, errors, url_reports in pool.map(triples, transmission_manual, self.requested_keys, report, memory):
+            results = {site: None if record is None else self._transformer(site).schema.unpack(record)
+                       for site, record in packed.items()}
+            processed.append((results, errors))
+            batch_report.urls.extend(url_reports)
+        return (processed, batch_report) if report else processed
+
+    @staticmethod
+    def merge_dataframes(df1: pd.DataFrame | None, df2: pd.DataFrame | None, df3: pd.DataFrame | None,
+                         priority=SITE_PRIORITY) -> pd.DataFrame | None:
+        """
+        Combina hasta tres DataFrames manteniendo el orden original de df1
+        y priorizando los valores según `priority` (por defecto Sitio 2 > Sitio 1 > Sitio 3).
+        Para otro número de sitios, ver `merge_sites`.
+        """
+        return merge_sites({1: df1, 2: df2, 3: df3}, priority)
+
+    @staticmethod
+    def merge_dataframes_many(df1: pd.DataFrame | None, df2: pd.DataFrame | None, df3: pd.DataFrame | None,
+                              priority=SITE_PRIORITY) -> pd.DataFrame | None:
+        """
+        `merge_dataframes` para muchos vehículos en una sola operación: recibe las salidas
+        largas (vehicle_id, Key, Value) de cada sitio, como las de `transform_many`, y retorna
+        la tabla combinada de todos ellos con vehicle_id delante (ver `merge_sites_many`).
+        """
+        return merge_sites_many({1: df1, 2: df2, 3: df3}, priority)
+
+
+# --- Pool de procesos para el modo por lotes ---
+
+# DataProcessor de cada proceso del pool (se crea una vez al arrancar el proceso)
+_worker_processor = None
+
+
+def _init_worker():
+    global _worker_processor
+    _worker_processor = DataProcessor()
+
+
+def _process_triple(triple, transmission_manual=None, requested_keys=None, report=False, memory=False):
+    """
+    Ejecuta en un proceso del pool el scraping y la transformación de una terna.
+    Retorna (registros compactos, errores, informes por URL; vacío sin `report`).
+    """
+    urls = {site: url for site, url in enumerate(triple, start=1)}
+    url_reports = []
+    try:
+        if report:
+            results, errors = {site: None for site in urls}, {}
+            for site, url in urls.items():
+                if not url:
+                    continue
+                results[site], url_report = _worker_processor._scrape_and_transform_measured(
+                    url, site, transmission_manual if site == 2 else None, memory, requested_keys)
+                if url_report.error:
+                    errors[site] = url_report.error
+                url_reports.append(url_report)
+        else:
+            results, errors = _worker_processor.process_urls(urls, transmission_manual, requested_keys=requested_keys)
+        packed = {site: None if df is None else _worker_processor._transformer(site).schema.pack(df)
+                  for site, df in results.items()}
+    except Exception as e:
+        packed = {site: None for site in urls}
+        errors = {site: f"Error al procesar el Sitio {site} ({url}): {e}" for site, url in urls.items() if url}
+    return packed, errors, url_reports
+
+
+class PipelinePool:
+    """
+    Pool de procesos que ejecuta el flujo completo (scraping → transformación) por terna.
+
+    Los procesos se crean con "spawn" (seguro aunque el proceso principal tenga hilos,
+    como el servidor de Streamlit) la primera vez que se usa el pool y se reutilizan en
+    las llamadas siguientes, de modo que sus scrapers, transformadores, sesiones HTTP y
+    resultados memorizados siguen calientes entre lotes.
+    """
+
+    def __init__(self, workers: int | None = None, chunksize: int = 4):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def map(self, triples, transmission_manual=None, requested_keys=None, report=False, memory=False):
+        """
+        Lista, en el orden de entrada, de tuplas (registros compactos, errores, informes) por
+        terna; los informes (`UrlReport`) solo se generan con `report` (con `memory`, también
+        los bytes asignados por paso).
+        """
+        triples = [tuple(triple) for triple in triples]
+        if not triples:
+            return []
+        executor = self._get_executor()
+        try:
+            return list(executor.map(partial(_process_triple, transmission_manual=transmission_manual,
+                                             requested_keys=requested_keys, report=report, memory=memory),
+                                     triples, chunksize=self.chunksize))
+        except Exception:
+            # Un proceso caído deja el pool inservible: se descarta y se recrea en la próxima llamada
+            self.close()
+            raise
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pipeline_pool() -> PipelinePool:
+    """Devuelve el pool de procesos compartido por defecto."""
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = PipelinePool()
+    return _default_pool
+
+
+def configure_pipeline_pool(**kwargs) -> PipelinePool:
+    """Reemplaza el pool por defecto (p. ej. con otro número de procesos) y cierra el anterior."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+        _default_pool = PipelinePool(**kwargs)
+    return _default_pool
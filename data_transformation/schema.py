@@ -0,0 +1,202 @@
+import sys
+import threading
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Campos de homologación en el orden de la planilla. Es el mismo para los tres sitios:
+# cada campo ocupa siempre la misma posición (slot) en el vehículo transformado.
+HOMOLOGATION_KEYS: Tuple[str, ...] = (
+    'Number of axles / wheels',
+    'Powered axles',
+    'Wheelbase',
+    'Axle(s) track – 1 / 2',
+    'Length',
+    'Width',
+    'Height',
+    'Rear overhang',
+    'Mass of the vehicle with bodywork in running order',
+    'Technically permissible maximum laden mass',
+    'Distribution of this mass among the axles – 1 / 2',
+    'Technically permissible max mass on each axle – 1 / 2',
+    'Maximum permissible roof load',
+    'Maximum mass of trailer – braked / unbraked',
+    'Maximum mass of combination',
+    'Maximum vertical load at the coupling point for a trailer',
+    'Engine manufacturer',
+    'Engine code as marked on the enginee',
+    'Working principle',
+    'Direct injection',
+    'Pure electric',
+    'Hybrid [electric] vehicle',
+    'Number and arrangement of cylinders',
+    'Capacity',
+    'Fuel',
+    'Maximum net power',
+    'Clutch',
+    'Gearbox',
+    'Gear',
+    'Final drive ratio',
+    'EC type approval mark of couplind device if fitted',
+    'Maximum speed',
+    'Stationary (dB(A)) at engine speed',
+    'Drive by',
+    'Emissions standard',
+    'Exhaust emission',
+    'Emissions CO',
+    'Emissions HC',
+    'Emissions NOx',
+    'Emissions HC NOx',
+    'Emissions particulates',
+    'Smoke',
+    'NEDC CO2 urban conditions',
+    'NEDC CO2 extra-urban conditions',
+    'NEDC CO2 combined',
+    'NEDC Fuel consumption urban conditions',
+    'NEDC Fuel consumption extra-urban conditions',
+    'NEDC Fuel consumption combined',
+    'WLTP CO2 Low',
+    'WLTP CO2 Medium',
+    'WLTP CO2 High',
+    'WLTP CO2 Maximum Value',
+    'WLTP CO2 combined',
+    'WLTP Fuel consumption Low',
+    'WLTP Fuel consumption Medium',
+    'WLTP Fuel consumption High',
+    'WLTP Fuel consumption Maximum Value',
+    'WLTP Fuel consumption combined',
+    'Steering, method of assistance',
+    'Suspension',
+    'Brakes',
+    'Type of body',
+    'Number and configuration of doors',
+    'Number and position of seats',
+    'Make',
+    'Type',
+    'Variant',
+    'Version',
+    'Commercial name',
+    'Homologation number',
+)
+
+
+class VehicleSchema:
+    """
+    Esquema de claves con una posición (slot) entera por clave.
+
+    Sustituye a construir un `pd.Categorical` con las ordered_keys en cada transformación:
+    el tipo categórico y el índice clave→slot se crean una sola vez y se comparten. Un
+    vehículo transformado que tiene exactamente una fila por clave, en orden de slot, está
+    "alineado": su columna Value es un array de longitud fija y combinar varios sitios es
+    elegir, posición a posición, entre arrays alineados.
+    """
+
+    __slots__ = ("keys", "slots", "dtype", "code_dtype", "_index", "_aligned_codes")
+
+    def __init__(self, keys: Iterable[str]):
+        keys = tuple(sys.intern(key) if isinstance(key, str) else key for key in keys)
+        if len(set(keys)) != len(keys):
+            raise ValueError("Las claves del esquema no pueden repetirse")
+        self.keys = keys
+        self.slots: Dict[str, int] = {key: slot for slot, key in enumerate(keys)}
+        self.dtype = pd.CategoricalDtype(list(keys), ordered=True)
+        self._index = self.dtype.categories
+        # Mismo tipo entero que Categorical.codes: el quicksort de NumPy depende del tipo y,
+        # con claves repetidas, solo así se reproduce el orden de sort_values
+        self.code_dtype = pd.Categorical([], dtype=self.dtype).codes.dtype
+        self._aligned_codes = np.arange(len(keys))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def codes(self, keys: Sequence) -> np.ndarray:
+        """Slot de cada clave (-1 si no pertenece al esquema), igual que Categorical.codes."""
+        if len(keys) > 1000:
+            return self._index.get_indexer_for(np.asarray(keys, dtype=object)).astype(self.code_dtype)
+        slots = self.slots
+        return np.fromiter((slots.get(key, -1) for key in keys), dtype=self.code_dtype, count=len(keys))
+
+    def categorical(self, codes: np.ndarray) -> pd.Categorical:
+        return pd.Categorical.from_codes(codes, dtype=self.dtype)
+
+    @staticmethod
+    def order(codes: np.ndarray) -> np.ndarray:
+        """
+        Posiciones de las filas ordenadas por slot, exactamente como sort_values sobre la
+        columna categórica: quicksort (no estable) para las claves del esquema y, al final y
+        en su orden, las que no pertenecen a él.
+        """
+        valid = codes >= 0
+        if valid.all():
+            return codes.argsort(kind="quicksort")
+        positions = np.arange(len(codes))
+        return np.concatenate([positions[valid][codes[valid].argsort(kind="quicksort")], positions[~valid]])
+
+    def sort_frame(self, df: pd.DataFrame, limit: Optional[int] = None) -> pd.DataFrame:
+        """
+        Equivale a convertir Key en categórica con las claves del esquema, ordenar por ella
+        y quedarse con las primeras `limit` filas, con el índice reiniciado.
+        """
+        codes = self.codes(df["Key"].tolist())
+        positions = self.order(codes)
+        if limit is not None:
+            positions = positions[:limit]
+        return pd.DataFrame({
+            column: self.categorical(codes[positions]) if column == "Key" else df[column].to_numpy()[positions]
+            for column in df.columns
+        })
+
+    def aligned_values(self, df: pd.DataFrame, column: str = "Value") -> Optional[np.ndarray]:
+        """
+        Valores de `column` por slot si el DataFrame está alineado con el esquema (Key
+        categórica del esquema, una fila por clave y en orden de slot, como lo deja
+        `sort_frame`); None en caso contrario.
+        """
+        if len(df) != len(self.keys) or column not in df.columns:
+            return None
+        keys = df["Key"]
+        if keys.dtype != self.dtype or not np.array_equal(keys.array.codes, self._aligned_codes):
+            return None
+        return df[column].to_numpy()
+
+    def pack(self, df: pd.DataFrame) -> Tuple[Optional[bytes], tuple]:
+        """
+        Forma compacta de un DataFrame Key/Value del esquema (lo que devuelven los
+        transformadores), para enviarlo entre procesos sin serializar el DataFrame:
+        (slots, valores), con slots None si el DataFrame está alineado.
+        """
+        keys = df["Key"]
+        if keys.dtype != self.dtype:
+            raise ValueError("La columna Key no es categórica con las claves del esquema")
+        values = tuple(df["Value"].tolist())
+        codes = keys.cat.codes.to_numpy()
+        if len(codes) == len(self.keys) and np.array_equal(codes, self._aligned_codes):
+            return None, values
+        return codes.astype(self.code_dtype).tobytes(), values
+
+    def unpack(self, packed: Tuple[Optional[bytes], tuple]) -> pd.DataFrame:
+        """Reconstruye el DataFrame de `pack`: Key categórica del esquema y Value de tipo object."""
+        codes, values = packed
+        codes = self._aligned_codes if codes is None else np.frombuffer(codes, dtype=self.code_dtype).copy()
+        return pd.DataFrame({"Key": self.categorical(codes), "Value": pd.Series(values, dtype=object)})
+
+
+_schemas: Dict[Tuple, VehicleSchema] = {}
+_schemas_lock = threading.Lock()
+
+
+def get_schema(keys: Iterable[str]) -> VehicleSchema:
+    """Esquema (internado) para una lista de claves: listas iguales comparten el mismo objeto."""
+    keys = tuple(keys)
+    schema = _schemas.get(keys)
+    if schema is None:
+        with _schemas_lock:
+            schema = _schemas.get(keys)
+            if schema is None:
+                schema = _schemas[keys] = VehicleSchema(keys)
+    return schema
+
+
+# Esquema común a los tres sitios
+HOMOLOGATION_SCHEMA = get_schema(HOMOLOGATION_KEYS)
@@ -0,0 +1,268 @@
+"""
+Combinación de los vehículos transformados de varios sitios en la tabla de la aplicación:
+Key, una columna "Valor Sitio N" por sitio y "Valor Final".
+
+"Valor Final" es una coalescencia por prioridad: el valor del sitio de mayor prioridad que
+no sea nulo ni el texto 'None' (lo que ponen los transformadores en las claves que faltan);
+si ninguno lo tiene, el primer valor no nulo ('None' incluido) y, si tampoco, None.
+Todo se calcula sobre arrays, sin funciones de Python por fila.
+"""
+from typing import Dict, Hashable, Iterable, Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .schema import HOMOLOGATION_SCHEMA
+
+# Prioridad por defecto para "Valor Final": Sitio 2 > Sitio 1 > Sitio 3
+SITE_PRIORITY = (2, 1, 3)
+# Valor que ponen los transformadores en las claves sin dato
+NONE_SENTINEL = 'None'
+
+
+def value_column(site: Hashable) -> str:
+    return f"Valor Sitio {site}"
+
+
+def priority_order(sites: Iterable[Hashable], priority: Sequence[Hashable] = SITE_PRIORITY) -> list:
+    """Los sitios dados ordenados por `priority`; los que no figuran en ella van al final, en su orden."""
+    sites = list(sites)
+    ranked = [site for site in priority if site in sites]
+    return ranked + [site for site in sites if site not in ranked]
+
+
+def coalesce(columns: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    "Valor Final" posición a posición a partir de columnas de igual longitud ordenadas de
+    mayor a menor prioridad (ver el docstring del módulo). Retorna un array de objetos.
+
+    Cada columna solo se examina en las posiciones que siguen pendientes, de modo que las
+    de menor prioridad apenas cuestan cuando las primeras ya tienen casi todos los valores.
+    """
+    size = len(columns[0]) if len(columns) else 0
+    final = np.full(size, None, dtype=object)
+    # Primer valor no nulo (p. ej. 'None'), para las posiciones sin ningún valor real
+    fallback = np.full(size, None, dtype=object)
+    has_fallback = np.zeros(size, dtype=bool)
+    pending = np.arange(size)
+    for values in columns:
+        if not len(pending):
+            break
+        candidates = np.asarray(values, dtype=object)[pending]
+        present = pd.notna(candidates)
+        real = present.copy()
+        real[present] = candidates[present] != NONE_SENTINEL
+
+        final[pending[real]] = candidates[real]
+        first = present & ~real & ~has_fallback[pending]
+        fallback[pending[first]] = candidates[first]
+        has_fallback[pending[first]] = True
+        pending = pending[~real]
+    final[pending] = fallback[pending]
+    return final
+
+
+def _aligned_columns(frames: Dict[Hashable, pd.DataFrame]) -> Optional[Dict[Hashable, np.ndarray]]:
+    """
+    Valores por slot de cada DataFrame si todos están alineados con el esquema común (lo
+    que devuelven los transformadores): el merge por Key se reduce a elegir posición a
+    posición. None si alguno no lo está.
+    """
+    columns = {}
+    for site, df in frames.items():
+        values = HOMOLOGATION_SCHEMA.aligned_values(df)
+        if values is None:
+            return None
+        columns[site] = values
+    return columns
+
+
+def _outer_join(tables: Sequence[pd.DataFrame], on: list) -> tuple:
+    """
+    pd.merge(how="outer") encadenado de las tablas (columnas `on` y "position", la fila de
+    cada una en su DataFrame). Retorna (tabla unida, [posiciones de cada tabla]); las
+    posiciones son float, con NaN donde esa tabla no tiene la fila.
+    """
+    joined = tables[0].rename(columns={"position": 0})
+    for i, table in enumerate(tables[1:], start=1):
+        joined = joined.merge(table.rename(columns={"position": i}), on=on, how="outer", sort=False)
+    return joined, [joined[i].to_numpy(dtype=float) for i in range(len(tables))]
+
+
+def _key_ranks(keys: np.ndarray, dtypes: set) -> np.ndarray:
+    """
+    Rango de cada clave en el orden en que las deja pd.merge(how="outer"): el de las
+    categorías si todos los Key son de la misma categórica y el lexicográfico si no
+    (las claves nulas, al final).
+    """
+    if len(dtypes) == 1 and isinstance(next(iter(dtypes)), pd.CategoricalDtype):
+        dtype = next(iter(dtypes))
+        codes = pd.Categorical(keys, dtype=dtype).codes.astype(np.int64)
+        return np.where(codes < 0, len(dtype.categories), codes)
+    codes, uniques = pd.factorize(keys, sort=True)
+    return np.where(codes < 0, len(uniques), codes)
+
+
+def _merge_order(base: np.ndarray, ranks: np.ndarray, positions: Sequence[np.ndarray], *groups) -> np.ndarray:
+    """
+    Orden de las filas unidas que daba el merge original: (por `groups`) las filas del
+    DataFrame base en su orden, cada una seguida de sus combinaciones con las apariciones
+    de la clave en los demás sitios, y después las claves que no están en él por `ranks`.
+    """
+    in_base = ~np.isnan(base)
+    sort_keys = [*groups, np.where(in_base, base, np.inf), np.where(in_base, -1, ranks)]
+    sort_keys += [np.nan_to_num(position, nan=-1) for position in positions]
+    return np.lexsort(sort_keys[::-1])
+
+
+def _take_values(frames: Dict[Hashable, pd.DataFrame], positions: Sequence[np.ndarray],
+                 order: np.ndarray) -> Dict[Hashable, np.ndarray]:
+    columns = {}
+    for (site, df), position in zip(frames.items(), positions):
+        position = position[order]
+        found = ~np.isnan(position)
+        values = np.full(len(order), None, dtype=object)
+        values[found] = df["Value"].to_numpy(dtype=object)[position[found].astype(np.int64)]
+        columns[site] = values
+    return columns
+
+
+def _keyed_columns(frames: Dict[Hashable, pd.DataFrame]):
+    """
+    Alinea DataFrames arbitrarios por Key como el merge original (pd.merge outer encadenado
+    sobre el primer DataFrame). Una clave repetida da una fila por combinación de sus
+    apariciones en cada sitio; un sitio sin la clave cuenta como una aparición vacía. Las filas
+    siguen el orden del primer DataFrame, con las combinaciones de cada fila juntas en su
+    lugar, y después van las claves que no están en él, en el orden de pd.merge. Las
+    posiciones importan: la exportación asigna cada fila a su marcador {{B n}}.
+    Retorna (claves, {sitio: valores}).
+    """
+    tables = [pd.DataFrame({"Key": df["Key"].to_numpy(dtype=object), "position": np.arange(len(df))})
+              for df in frames.values()]
+    joined, positions = _outer_join(tables, ["Key"])
+    dtypes = {df["Key"].dtype for df in frames.values()}
+    order = _merge_order(positions[0], _key_ranks(joined["Key"].to_numpy(dtype=object), dtypes), positions)
+
+    keys = pd.Series(joined["Key"].to_numpy(dtype=object)[order], dtype=object)
+    if len(dtypes) == 1 and isinstance(next(iter(dtypes)), pd.CategoricalDtype):
+        keys = keys.astype(next(iter(dtypes)))
+    return keys, _take_values(frames, positions, order)
+
+
+def merge_sites(frames: Mapping[Hashable, Optional[pd.DataFrame]],
+                priority: Sequence[Hashable] = SITE_PRIORITY) -> Optional[pd.DataFrame]:
+    """
+    Combina los DataFrames (Key/Value) de cualquier número de sitios, {sitio: DataFrame o
+    None}, en una tabla con una columna "Valor Sitio N" por sitio (en el orden de `frames`)
+    y "Valor Final" según `priority`. Retorna None si no hay ningún DataFrame.
+    """
+    present = {site: df for site, df in frames.items() if df is not None}
+    if not present:
+        return None
+
+    columns = _aligned_columns(present)
+    if columns is not None:
+        keys = HOMOLOGATION_SCHEMA.categorical(np.arange(len(HOMOLOGATION_SCHEMA)))
+    else:
+        keys, columns = _keyed_columns(present)
+
+    empty = np.full(len(keys), None, dtype=object)
+    merged = {'Key': keys}
+    for site in frames:
+        merged[value_column(site)] = columns[site] if site in columns else empty
+    final = coalesce([columns[site] for site in priority_order(columns, priority)])
+    merged['Valor Final'] = final.tolist()
+    return pd.DataFrame(merged)
+
+
+# --- Lotes: salidas largas (vehicle_id, Key, Value) de muchos vehículos -------------------
+
+def _aligned_columns_many(frames: Dict[Hashable, pd.DataFrame]):
+    """
+    Si cada vehículo de cada DataFrame ocupa un bloque de filas alineado con el esquema (lo
+    que devuelve `transform_many`), los valores se reorganizan como matrices vehículo × slot
+    sin ningún join. Retorna (vehicle_ids, claves, {sitio: valores}) o None si alguno no lo está.
+    """
+    size = len(HOMOLOGATION_SCHEMA)
+    blocks = {}
+    for site, df in frames.items():
+        if len(df) % size or df["Key"].dtype != HOMOLOGATION_SCHEMA.dtype:
+            return None
+        if not (df["Key"].array.codes.reshape(-1, size) == np.arange(size)).all():
+            return None
+        ids = df["vehicle_id"].to_numpy().reshape(-1, size)
+        vehicles = ids[:, 0]
+        if not (ids == vehicles[:, None]).all() or pd.Index(vehicles).has_duplicates:
+            return None
+        blocks[site] = (vehicles, df["Value"].to_numpy().reshape(-1, size))
+
+    vehicle_ids = pd.Index(pd.unique(np.concatenate([vehicles for vehicles, _ in blocks.values()])))
+    columns = {}
+    for site, (vehicles, values) in blocks.items():
+        matrix = np.full((len(vehicle_ids), size), None, dtype=object)
+        matrix[vehicle_ids.get_indexer(vehicles)] = values
+        columns[site] = matrix.ravel()
+    vehicles = np.repeat(vehicle_ids.to_numpy(), size)
+    keys = HOMOLOGATION_SCHEMA.categorical(np.tile(np.arange(size), len(vehicle_ids)))
+    return vehicles, keys, columns
+
+
+def _keyed_columns_many(frames: Dict[Hashable, pd.DataFrame]):
+    """
+    Alinea las salidas largas por (vehicle_id, Key) con un único merge encadenado. Dentro de
+    cada vehículo el orden es el de `_keyed_columns`, con el primer sitio que tiene el
+    vehículo como base; los vehículos, por orden de aparición. Retorna (vehicle_ids, claves,
+    {sitio: valores}).
+    """
+    tables = [pd.DataFrame({"vehicle_id": df["vehicle_id"].to_numpy(), "Key": df["Key"].to_numpy(dtype=object),
+                            "position": np.arange(len(df))})
+              for df in frames.values()]
+    joined, positions = _outer_join(tables, ["vehicle_id", "Key"])
+    vehicle_ids = pd.Index(pd.unique(np.concatenate([table["vehicle_id"].to_numpy() for table in tables])))
+    vehicle_codes = vehicle_ids.get_indexer(joined["vehicle_id"])
+
+    # Base de cada vehículo: el primer sitio que lo tiene
+    base = np.full(len(joined), np.nan)
+    chosen = np.zeros(len(joined), dtype=bool)
+    for table, position in zip(tables, positions):
+        has = joined["vehicle_id"].isin(table["vehicle_id"]).to_numpy() & ~chosen
+        base[has] = position[has]
+        chosen |= has
+
+    dtypes = {df["Key"].dtype for df in frames.values()}
+    ranks = _key_ranks(joined["Key"].to_numpy(dtype=object), dtypes)
+    order = _merge_order(base, ranks, positions, vehicle_codes)
+
+    vehicles = vehicle_ids.take(vehicle_codes[order]).to_numpy()
+    keys = pd.Series(joined["Key"].to_numpy(dtype=object)[order], dtype=object)
+    if len(dtypes) == 1 and isinstance(next(iter(dtypes)), pd.CategoricalDtype):
+        keys = keys.astype(next(iter(dtypes)))
+    return vehicles, keys, _take_values(frames, positions, order)
+
+
+def merge_sites_many(frames: Mapping[Hashable, Optional[pd.DataFrame]],
+                     priority: Sequence[Hashable] = SITE_PRIORITY) -> Optional[pd.DataFrame]:
+    """
+    `merge_sites` para muchos vehículos a la vez: `frames` son las salidas largas
+    (vehicle_id, Key, Value) de cada sitio, como las de `transform_many`. Retorna una sola
+    tabla larga con vehicle_id delante; las filas de cada vehículo son las que daría
+    `merge_sites` con sus DataFrames (un sitio sin ese vehículo cuenta como None).
+    """
+    present = {site: df for site, df in frames.items() if df is not None}
+    if not present:
+        return None
+    for site, df in present.items():
+        missing = {"vehicle_id", "Key", "Value"} - set(df.columns)
+        if missing:
+            raise ValueError(f"Faltan columnas en el DataFrame del Sitio {site}: {sorted(missing)}")
+
+    aligned = _aligned_columns_many(present)
+    vehicles, keys, columns = aligned if aligned is not None else _keyed_columns_many(present)
+
+    empty = np.full(len(keys), None, dtype=object)
+    merged = {'vehicle_id': vehicles, 'Key': keys}
+    for site in frames:
+        merged[value_column(site)] = columns[site] if site in columns else empty
+    final = coalesce([columns[site] for site in priority_order(columns, priority)])
+    merged['Valor Final'] = final
+    return pd.DataFrame(merged)
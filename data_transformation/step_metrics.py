@@ -0,0 +1,171 @@
+"""
+Medición por paso de las transformaciones: tiempo, filas antes y después y memoria asignada.
+
+Fuera de `profile_steps` la medición no hace nada (una consulta a una variable del hilo por
+llamada). Dentro, cada ejecución de un transformador en ese hilo genera un `TransformReport`
+con un `StepMetrics` por paso del plan, más la limpieza y el ordenamiento finales.
+
+La memoria se mide con tracemalloc solo si se pide (`memory=True`): ralentiza los pasos y
+es global al proceso, así que con varios hilos transformando a la vez las cifras se mezclan.
+"""
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Iterable, List, Optional
+
+import pandas as pd
+
+# Percentiles con los que se resumen los lotes
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+@dataclass
+class StepMetrics:
+    """Métricas de un paso: segundos, filas antes/después y bytes asignados (neto y pico)."""
+    step: str
+    seconds: float = 0.0
+    rows_in: int = 0
+    rows_out: int = 0
+    allocated_bytes: Optional[int] = None
+    peak_bytes: Optional[int] = None
+    # El paso no se ejecutó porque no estaba ninguna de sus claves (ver Rule.triggers)
+    skipped: bool = False
+
+
+@dataclass
+class TransformReport:
+    """Pasos de una llamada a transform ("record") o transform_many ("batch")."""
+    transformer: str
+    mode: str
+    steps: List[StepMetrics] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def to_frame(self) -> pd.DataFrame:
+        frame = pd.DataFrame([asdict(step) for step in self.steps], columns=list(StepMetrics.__dataclass_fields__))
+        frame.insert(0, "transformer", self.transformer)
+        frame.insert(1, "mode", self.mode)
+        return frame
+
+    @contextmanager
+    def step(self, name: str, rows: Callable[[], int], memory: bool = False):
+        """Mide el bloque como un paso; `rows` cuenta las filas antes y después."""
+        metrics = StepMetrics(name, rows_in=rows())
+        if memory:
+            tracemalloc.reset_peak()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            metrics.seconds = time.perf_counter() - start
+            if memory:
+                current, peak = tracemalloc.get_traced_memory()
+                metrics.allocated_bytes = current - start_bytes
+                metrics.peak_bytes = peak - start_bytes
+            metrics.rows_out = rows()
+            self.steps.append(metrics)
+
+    def skip(self, name: str, rows: int):
+        self.steps.append(StepMetrics(name, rows_in=rows, rows_out=rows, skipped=True))
+
+
+class StepProfiler:
+    """Reúne los `TransformReport` de las transformaciones ejecutadas en un hilo."""
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.reports: List[TransformReport] = []
+        self._current: List[TransformReport] = []
+
+    @property
+    def current(self) -> Optional[TransformReport]:
+        return self._current[-1] if self._current else None
+
+    def to_frame(self) -> pd.DataFrame:
+        frames = [report.to_frame() for report in self.reports]
+        return pd.concat(frames, ignore_index=True) if frames else TransformReport("", "").to_frame()
+
+
+_local = threading.local()
+
+
+def active_profiler() -> Optional[StepProfiler]:
+    return getattr(_local, "profiler", None)
+
+
+@contextmanager
+def profile_steps(memory: bool = False):
+    """Activa la medición en el hilo actual y entrega el `StepProfiler` con los informes."""
+    previous = active_profiler()
+    profiler = StepProfiler(memory)
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _local.profiler = profiler
+    try:
+        yield profiler
+    finally:
+        _local.profiler = previous
+        if started_tracing:
+            tracemalloc.stop()
+
+
+@contextmanager
+def transform_report(transformer, mode: str):
+    """Abre el informe de una llamada al transformador (None si no se está midiendo)."""
+    profiler = active_profiler()
+    if profiler is None:
+        yield None
+        return
+    report = TransformReport(type(transformer).__name__, mode)
+    profiler._current.append(report)
+    start = time.perf_counter()
+    try:
+        yield report
+    finally:
+        report.seconds = time.perf_counter() - start
+        profiler._current.pop()
+        profiler.reports.append(report)
+
+
+def measure_step(name: str, rows: Callable[[], int]):
+    """Mide un paso dentro del informe en curso; sin medición activa no hace nada."""
+    profiler = active_profiler()
+    if profiler is None or profiler.current is None:
+        return nullcontext()
+    return profiler.current.step(name, rows, profiler.memory)
+
+
+def skip_step(name: str, rows: Callable[[], int]):
+    """Registra un paso omitido en el informe en curso, si lo hay."""
+    profiler = active_profiler()
+    if profiler is not None and profiler.current is not None:
+        profiler.current.skip(name, rows())
+
+
+def summarize_reports(reports: Iterable[TransformReport], percentiles: Iterable[float] = PERCENTILES) -> pd.DataFrame:
+    """
+    Resume muchos informes (p. ej. los de un lote) en percentiles por transformador, modo y paso:
+    una fila por paso con `runs`, `skipped` y, para cada métrica, sus percentiles
+    (columnas "seconds_p50", "rows_out_p90"...).
+    """
+    # Orden de los pasos: su posición en el informe, no el alfabético
+    frames = [report.to_frame().assign(order=range(len(report.steps))) for report in reports]
+    if not frames:
+        return pd.DataFrame(columns=["transformer", "mode", "step", "runs", "skipped"])
+    frame = pd.concat(frames, ignore_index=True)
+    by = ["transformer", "mode", "step"]
+    groups = frame.groupby(by, sort=False)
+    summary = groups.agg(order=("order", "min"), runs=("step", "size"), skipped=("skipped", "sum"))
+
+    metrics = ["seconds", "rows_in", "rows_out", "allocated_bytes", "peak_bytes"]
+    executed = frame.loc[~frame["skipped"].astype(bool)]
+    executed = executed.astype({metric: float for metric in metrics})
+    for percentile in percentiles:
+        values = executed.groupby(by, sort=False)[metrics].quantile(percentile)
+        values.columns = [f"{metric}_p{round(percentile * 100):g}" for metric in metrics]
+        summary = summary.join(values)
+    summary = summary.dropna(axis=1, how="all")
+    return summary.reset_index().sort_values(["transformer", "mode", "order"], kind="mergesort").drop(columns="order").reset_index(drop=True)
@@ -0,0 +1,693 @@
+"""
+Reglas de transformación declarativas y su compilación en un plan de ejecución.
+
+Cada configuración (`VehicleDataConfig.rules`) describe como datos los pasos de su sitio:
+renombrar claves, combinar A/B en "A/B", partir por un separador, escalar y formatear
+números... Las reglas se compilan una sola vez por configuración (`compile_plan`) en un
+`TransformPlan` inmutable que se reutiliza en todas las llamadas y hilos, tanto para
+`transform` (un `VehicleRecord`) como para `transform_many` (un `VehicleBatch`).
+
+Los pasos que no encajan en una regla genérica siguen siendo métodos del transformador y
+se referencian por nombre con `Custom`.
+
+Cada regla declara las claves que lee (`reads`) y las que escribe o elimina (`writes`),
+lo que forma el grafo de dependencias entre pasos: `TransformPlan.subset` se queda solo con
+los pasos de los que dependen las claves pedidas. Los pasos que pueden dejar una clave en
+varias filas (`repeats_keys`) se conservan siempre: esas filas desplazan las posiciones de
+la salida y, si aparecen, el vehículo se transforma con el plan completo. Además, una regla con `triggers` no tiene
+efecto si no está ninguna de esas claves y se omite sin recorrer el registro.
+"""
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .step_metrics import active_profiler, measure_step, skip_step
+from .vehicle_batch import SAFE_FLOAT, SAFE_INT, SAFE_INT_LIMIT, VehicleBatch, as_mask, matches
+from .vehicle_record import VehicleRecord
+
+
+# --- Partes: funciones de un valor, con su versión por columnas ------------------------
+#
+# `part(valor)` reproduce la transformación original valor a valor (y lanza las mismas
+# excepciones). `part.batch(valores)` la aplica a una Serie de textos y retorna
+# (resultado, válido): donde `válido` es False la versión valor a valor lanzaría una
+# excepción o no se puede garantizar el mismo resultado, y el vehículo se transforma aparte.
+#
+# Las partes de texto con `skip_na=True` sustituyen a un paso con el accesor .str y, como él,
+# dejan pasar un valor nulo (None, NaN...) y dan NaN para otro valor que no es texto; sin él
+# lanzan la misma excepción que el método de str al que sustituyen.
+
+@dataclass(frozen=True)
+class SplitPart:
+    """valor.split(separator)[index], con strip() opcional."""
+    separator: str
+    index: int
+    strip: bool = True
+    skip_na: bool = False
+
+    def __call__(self, value):
+        if self.skip_na and not isinstance(value, str):
+            return _non_text(value)
+        part = value.split(self.separator)[self.index]
+        return part.strip() if self.strip else part
+
+    def batch(self, values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        parts = values.str.split(self.separator, regex=False)
+        count = parts.str.len()
+        valid = count > self.index if self.index >= 0 else count >= -self.index
+        result = parts.str[self.index].astype(object)
+        if self.strip:
+            result = result.str.strip()
+        return result, valid
+
+
+@dataclass(frozen=True)
+class RestParts:
+    """Partes tras el primer separador, sin espacios y unidas con `joiner`."""
+    separator: str
+    joiner: str
+    skip_na: bool = False
+
+    def __call__(self, value):
+        if self.skip_na and not isinstance(value, str):
+            return _non_text(value)
+        parts = [part.strip() for part in value.split(self.separator)]
+        return self.joiner.join(parts[1:])
+
+    def batch(self, values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        # Quitar los espacios de los extremos y cambiar cada separador (con sus espacios)
+        # por `joiner` equivale a unir las partes sin espacios
+        pattern = re.compile(r'\s*' + re.escape(self.separator) + r'\s*')
+        rest = values.str.partition(self.separator)[2].astype(object).str.strip()
+        return rest.str.replace(pattern, self.joiner.replace("\\", "\\\\"), regex=True), _all_valid(values)
+
+
+@dataclass(frozen=True)
+class Replace:
+    old: str
+    new: str
+    skip_na: bool = False
+
+    def __call__(self, value):
+        if self.skip_na and not isinstance(value, str):
+            return _non_text(value)
+        return value.replace(self.old, self.new)
+
+    def batch(self, values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        return values.str.replace(self.old, self.new, regex=False).astype(object), _all_valid(values)
+
+
+@dataclass(frozen=True)
+class Template:
+    """Inserta el valor en una plantilla con un único "{}" (p. ej. "EURO {}")."""
+    template: str
+    skip_na: bool = False
+
+    def __call__(self, value):
+        if self.skip_na and not isinstance(value, str):
+            return _non_text(value)
+        return self.template.format(value)
+
+    def batch(self, values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        prefix, suffix = self.template.split("{}")
+        return (prefix + values + suffix).astype(object), _all_valid(values)
+
+
+@dataclass(frozen=True)
+class ValueMap:
+    """Sustituye el valor según `mapping`; los valores sin entrada pasan a `default`."""
+    mapping: Dict[str, str]
+    default: str
+
+    def __call__(self, value):
+        return self.mapping.get(value, self.default)
+
+    def batch(self, values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        return values.map(self.mapping).fillna(self.default).astype(object), _all_valid(values)
+
+
+@dataclass(frozen=True)
+class MaxOfPair:
+    """Máximo de un par de enteros separados por `separator` (o el entero si no hay par), como texto."""
+    separator: str
+
+    def __call__(self, value):
+        if self.separator in value:
+            num1, num2 = map(int, value.split(self.separator))
+            return str(max(num1, num2))
+        return str(int(value))
+
+    def batch(self, values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        parts = values.str.split(self.separator, regex=False)
+        has_pair = values.str.contains(self.separator, regex=False)
+        first = parts.str[0].astype(object)
+        second = parts.str[1].astype(object).where(has_pair, first)
+        valid = (~has_pair | (parts.str.len() == 2)) & matches(first, SAFE_INT) & matches(second, SAFE_INT)
+        maximum = np.maximum(first[valid].str.strip().astype(np.int64), second[valid].str.strip().astype(np.int64))
+        return maximum.map(str).astype(object).reindex(values.index), valid
+
+
+@dataclass(frozen=True)
+class Scale:
+    """str(np.round(float(valor) / divisor, decimals))."""
+    divisor: float
+    decimals: int
+
+    def __call__(self, value):
+        return str(np.round(float(value) / self.divisor, self.decimals))
+
+    def batch(self, values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        valid = matches(values, SAFE_FLOAT)
+        numbers = values[valid].astype(float)
+        return (numbers / self.divisor).round(self.decimals).map(str).astype(object).reindex(values.index), valid
+
+
+@dataclass(frozen=True)
+class FormatFloat:
+    """fmt.format(float(valor))."""
+    fmt: str
+
+    def __call__(self, value):
+        return self.fmt.format(float(value))
+
+    def batch(self, values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        valid = matches(values, SAFE_FLOAT)
+        return values[valid].astype(float).map(self.fmt.format).astype(object).reindex(values.index), valid
+
+
+@dataclass(frozen=True)
+class NumberPair:
+    """
+    "a/b" con cada número como float, escrito como entero si no tiene decimales
+    (p. ej. "110.0 / 5000" -> "110/5000").
+    """
+    separator: str
+    skip_na: bool = False
+
+    @staticmethod
+    def _format(number: float):
+        return int(number) if number.is_integer() else number
+
+    def __call__(self, value):
+        if self.skip_na and not isinstance(value, str):
+            return _non_text(value)
+        parts = value.split(self.separator)
+        num1 = float(parts[0].strip())
+        num2 = float(parts[1].strip())
+        return f"{self._format(num1)}{self.separator}{self._format(num2)}"
+
+    def batch(self, values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        parts = values.str.split(self.separator, regex=False)
+        num1 = parts.str[0].astype(object).str.strip()
+        num2 = parts.str[1].astype(object).str.strip()
+        valid = (parts.str.len() >= 2) & matches(num1, SAFE_FLOAT) & matches(num2, SAFE_FLOAT)
+        result = (_format_numbers(num1[valid].astype(float)) + self.separator
+                  + _format_numbers(num2[valid].astype(float)))
+        valid &= result.reindex(values.index).notna()
+        return result.reindex(values.index), valid
+
+
+@dataclass(frozen=True)
+class Chain:
+    """Aplica varias partes en orden."""
+    parts: Tuple[Any, ...]
+
+    def __call__(self, value):
+        for part in self.parts:
+            value = part(value)
+        return value
+
+    def batch(self, values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        index = values.index
+        for part in self.parts:
+            values, valid = part.batch(values)
+            values = values[as_mask(valid).to_numpy()]
+        return values.reindex(index), pd.Series(index.isin(values.index), index=index)
+
+
+def _non_text(value):
+    """Resultado del accesor .str para un valor que no es texto: el propio valor si es nulo, NaN si no."""
+    return value if pd.api.types.is_scalar(value) and pd.isna(value) else np.nan
+
+
+def _all_valid(values: pd.Series) -> pd.Series:
+    return pd.Series(True, index=values.index)
+
+
+def _format_numbers(numbers: pd.Series) -> pd.Series:
+    """Texto de int(n) si n es entero y de n si no; NaN para los enteros que no caben en int64."""
+    is_integer = np.isfinite(numbers) & (numbers == np.floor(numbers))
+    fits = numbers.abs() < SAFE_INT_LIMIT
+    integers = numbers.where(is_integer & fits, 0).astype(np.int64).map(str)
+    return numbers.map(str).astype(object).where(~is_integer, integers.where(fits))
+
+
+def _apply_part(batch: VehicleBatch, part, values: pd.Series) -> pd.Series:
+    """Aplica la parte a una Serie indexada por vehículo y aparta los vehículos inválidos."""
+    if part is None:
+        return values
+    result, valid = part.batch(values)
+    return batch.keep_valid(result, valid)
+
+
+# --- Dependencias entre claves ------------------------------------------------------------
+
+# Una clave terminada en "*" representa todas las que empiezan por ese prefijo; ANY_KEY, cualquiera
+ANY_KEY = "*"
+
+
+def _key_overlaps(a: str, b: str) -> bool:
+    a_prefix, b_prefix = a.endswith("*"), b.endswith("*")
+    if a_prefix and b_prefix:
+        return a[:-1].startswith(b[:-1]) or b[:-1].startswith(a[:-1])
+    if a_prefix:
+        return b.startswith(a[:-1])
+    if b_prefix:
+        return a.startswith(b[:-1])
+    return a == b
+
+
+def _overlaps(keys: Iterable[str], others: Iterable[str]) -> bool:
+    """True si alguna clave (o prefijo) de `keys` coincide con alguna de `others`."""
+    return any(_key_overlaps(key, other) for key in keys for other in others)
+
+
+# --- Reglas -------------------------------------------------------------------------------
+
+class Rule:
+    """Paso de transformación: `apply` sobre un VehicleRecord y `apply_batch` sobre un VehicleBatch."""
+
+    def bind(self, config, transformer_cls) -> "Rule":
+        """Precálculo al compilar el plan (por defecto, la propia regla)."""
+        return self
+
+    @property
+    def name(self) -> str:
+        return type(self).__name__
+
+    @property
+    def reads(self) -> Tuple[str, ...]:
+        """Claves que lee el paso (por defecto, cualquiera)."""
+        return (ANY_KEY,)
+
+    @property
+    def writes(self) -> Tuple[str, ...]:
+        """Claves que el paso añade, modifica o elimina (por defecto, cualquiera)."""
+        return (ANY_KEY,)
+
+    @property
+    def triggers(self) -> Optional[Tuple[str, ...]]:
+        """Claves sin las cuales (ninguna presente) el paso no hace nada; None si se ejecuta siempre."""
+        return None
+
+    @property
+    def repeats_keys(self) -> bool:
+        """True si el paso puede dejar varias filas con la misma clave."""
+        return False
+
+    def apply(self, transformer, record: VehicleRecord):
+        raise NotImplementedError
+
+    def apply_batch(self, transformer, batch: VehicleBatch):
+        raise NotImplementedError
+
+
+@dataclass(frozen=True)
+class RenameKeys(Rule):
+    """Renombra las claves según `column_mapping`; con `add_missing`, añade "None" para las que falten."""
+    add_missing: bool = False
+
+    def bind(self, config, transformer_cls) -> Rule:
+        return _BoundRename(dict(config.column_mapping),
+                            list(config.column_mapping.values()) if self.add_missing else [])
+
+
+@dataclass(frozen=True)
+class _BoundRename(Rule):
+    mapping: Dict[str, str]
+    missing_keys: List[str]
+
+    @property
+    def name(self) -> str:
+        return "RenameKeys"
+
+    def apply(self, transformer, record: VehicleRecord):
+        record.rename_keys(self.mapping)
+        if self.missing_keys:
+            record.add_missing(self.missing_keys, "None")
+
+    def apply_batch(self, transformer, batch: VehicleBatch):
+        batch.rename_keys(self.mapping)
+        if self.missing_keys:
+            batch.add_missing(self.missing_keys, "None")
+
+
+@dataclass(frozen=True)
+class Combine(Rule):
+    """
+    Si están todas las `sources`, une el primer valor de cada una (tras `part`) con
+    `separator`, lo inserta en `template` y añade una fila por cada clave de `targets`.
+
+    - `remove_sources`: elimina antes las filas de origen.
+    - `in_place`: en lugar de añadir, el resultado sustituye a la primera clave de origen
+      (que pasa a llamarse como el primer target) y se eliminan las demás.
+    - `default`: si falta alguna clave de origen, se añade este valor en los targets.
+    """
+    sources: Tuple[str, ...]
+    targets: Tuple[str, ...]
+    part: Any = None
+    separator: str = "/"
+    template: str = "{}"
+    remove_sources: bool = False
+    in_place: bool = False
+    default: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return f"Combine({', '.join(self.targets)})"
+
+    @property
+    def reads(self) -> Tuple[str, ...]:
+        return self.sources
+
+    @property
+    def writes(self) -> Tuple[str, ...]:
+        removed = self.sources if self.remove_sources or self.in_place else ()
+        return self.targets + removed
+
+    @property
+    def triggers(self) -> Optional[Tuple[str, ...]]:
+        return self.sources if self.default is None else None
+
+    def apply(self, transformer, record: VehicleRecord):
+        if all(source in record for source in self.sources):
+            values = [record.get(source) for source in self.sources]
+            if self.part is not None:
+                values = [self.part(value) for value in values]
+            new_value = self.template.format(self.separator.join(f"{value}" for value in values))
+            if self.in_place:
+                record.remove(*self.sources[1:])
+                record.set(self.sources[0], new_value)
+                record.rename(self.sources[0], self.targets[0])
+                return
+            if self.remove_sources:
+                record.remove(*self.sources)
+            for target in self.targets:
+                record.append(target, new_value)
+        elif self.default is not None:
+            for target in self.targets:
+                record.append(target, self.default)
+
+    def apply_batch(self, transformer, batch: VehicleBatch):
+        sources = batch.firsts(*self.sources)
+        missing = batch.vehicles().difference(sources[0].index)
+        values = [_apply_part(batch, self.part, value) for value in sources]
+        prefix, suffix = self.template.split("{}")
+        new_value = values[0]
+        for value in values[1:]:
+            new_value = new_value + self.separator + value
+        new_value = (prefix + new_value + suffix).dropna().astype(object)
+        if self.in_place:
+            batch.remove(*self.sources[1:], vehicles=new_value.index)
+            batch.set(self.sources[0], new_value)
+            batch.rename(self.sources[0], self.targets[0], vehicles=new_value.index)
+            return
+        if self.remove_sources:
+            batch.remove(*self.sources, vehicles=new_value.index)
+        for target in self.targets:
+            batch.append(target, new_value)
+        if self.default is not None:
+            for target in self.targets:
+                batch.append(target, pd.Series(self.default, index=missing, dtype=object))
+
+
+@dataclass(frozen=True)
+class MapValues(Rule):
+    """
+    Aplica `part` a los valores de `keys`.
+
+    - `from_first`: todas las filas de cada clave toman el resultado de su primer valor.
+    - `default`: si falta la clave, se añade una fila con este valor.
+    """
+    keys: Tuple[str, ...]
+    part: Any
+    from_first: bool = False
+    default: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return f"MapValues({', '.join(self.keys)})"
+
+    @property
+    def reads(self) -> Tuple[str, ...]:
+        return self.keys
+
+    @property
+    def writes(self) -> Tuple[str, ...]:
+        return self.keys
+
+    @property
+    def triggers(self) -> Optional[Tuple[str, ...]]:
+        return self.keys if self.default is None else None
+
+    def apply(self, transformer, record: VehicleRecord):
+        for key in self.keys:
+            if key in record:
+                if self.from_first:
+                    record.set(key, self.part(record.get(key)))
+                else:
+                    record.update(key, self.part)
+            elif self.default is not None:
+                record.append(key, self.default)
+
+    def apply_batch(self, transformer, batch: VehicleBatch):
+        for key in self.keys:
+            if self.default is not None:
+                missing = batch.vehicles().difference(batch.has(key))
+            if self.from_first:
+                batch.set(key, _apply_part(batch, self.part, batch.first(key)))
+            else:
+                mask = batch.mask(key)
+                result, valid = self.part.batch(batch.rows.loc[mask, "Value"])
+                batch.exclude_rows(batch.align(~as_mask(valid)))
+                mask = batch.align(mask)
+                batch.set_rows(mask, result.loc[mask[mask].index])
+            if self.default is not None:
+                batch.append(key, pd.Series(self.default, index=missing, dtype=object))
+
+
+@dataclass(frozen=True)
+class Derive(Rule):
+    """Si existe `source`, añade una fila por cada (clave, parte) de `outputs` a partir de su primer valor."""
+    source: str
+    outputs: Tuple[Tuple[str, Any], ...]
+    remove_source: bool = False
+
+    @property
+    def name(self) -> str:
+        return f"Derive({self.source})"
+
+    @property
+    def reads(self) -> Tuple[str, ...]:
+        return (self.source,)
+
+    @property
+    def writes(self) -> Tuple[str, ...]:
+        return tuple(key for key, _ in self.outputs) + ((self.source,) if self.remove_source else ())
+
+    @property
+    def triggers(self) -> Optional[Tuple[str, ...]]:
+        return (self.source,)
+
+    def apply(self, transformer, record: VehicleRecord):
+        if self.source in record:
+            value = record.get(self.source)
+            new_values = [(key, part(value)) for key, part in self.outputs]
+            for key, new_value in new_values:
+                record.append(key, new_value)
+            if self.remove_source:
+                record.remove(self.source)
+
+    def apply_batch(self, transformer, batch: VehicleBatch):
+        value = batch.first(self.source)
+        new_values = []
+        for key, part in self.outputs:
+            new_values.append((key, _apply_part(batch, part, value)))
+        vehicles = batch.vehicles()
+        for key, new_value in new_values:
+            batch.append(key, new_value)
+        if self.remove_source:
+            batch.remove(self.source, vehicles=value.index.intersection(vehicles))
+
+
+@dataclass(frozen=True)
+class Custom(Rule):
+    """
+    Paso escrito a mano: el método `method` del transformador (y `method + "_batch"` por lotes).
+
+    `reads` y `writes` declaran las claves que lee y escribe (por defecto, cualquiera).
+    Con `skip_if_missing`, el método no hace nada si no está ninguna de sus `reads`.
+    Con `repeats_keys`, el método puede escribir una misma clave en varias filas.
+    """
+    method: str
+    reads: Tuple[str, ...] = (ANY_KEY,)
+    writes: Tuple[str, ...] = (ANY_KEY,)
+    skip_if_missing: bool = False
+    repeats_keys: bool = False
+
+    def bind(self, config, transformer_cls) -> Rule:
+        # Resolver los métodos al compilar: un nombre erróneo falla aquí y no a mitad de un lote
+        return _BoundCustom(self.method, getattr(transformer_cls, self.method),
+                            getattr(transformer_cls, f"{self.method}_batch"),
+                            self.reads, self.writes, self.reads if self.skip_if_missing else None,
+                            self.repeats_keys)
+
+
+@dataclass(frozen=True)
+class _BoundCustom(Rule):
+    method: str
+    function: Callable
+    batch_function: Callable
+    reads: Tuple[str, ...] = (ANY_KEY,)
+    writes: Tuple[str, ...] = (ANY_KEY,)
+    triggers: Optional[Tuple[str, ...]] = None
+    repeats_keys: bool = False
+
+    @property
+    def name(self) -> str:
+        return self.method
+
+    def apply(self, transformer, record: VehicleRecord):
+        self.function(transformer, record)
+
+    def apply_batch(self, transformer, batch: VehicleBatch):
+        self.batch_function(transformer, batch)
+
+
+# --- Plan compilado ----------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class TransformPlan:
+    """Secuencia inmutable de reglas ya preparadas para una configuración."""
+    rules: Tuple[Rule, ...] = field(default_factory=tuple)
+    # Subplanes ya calculados por conjunto de claves pedidas
+    _subsets: Dict[frozenset, "TransformPlan"] = field(default_factory=dict, compare=False, repr=False)
+
+    def apply(self, transformer, record: VehicleRecord):
+        if active_profiler() is not None:
+            self._apply_measured(transformer, record)
+            return
+        for rule in self.rules:
+            triggers = rule.triggers
+            # Sin ninguna de sus claves el paso no haría nada: se omite con consultas O(1) al índice
+            if triggers is not None and not any(key in record for key in triggers):
+                continue
+            rule.apply(transformer, record)
+
+    def _apply_measured(self, transformer, record: VehicleRecord):
+        """`apply` registrando cada paso en el informe en curso (ver step_metrics)."""
+        for rule in self.rules:
+            triggers = rule.triggers
+            if triggers is not None and not any(key in record for key in triggers):
+                skip_step(rule.name, record.__len__)
+                continue
+            with measure_step(rule.name, record.__len__):
+                rule.apply(transformer, record)
+
+    def run(self, transformer, record: VehicleRecord, keys: Optional[Iterable[str]] = None):
+        """
+        Aplica el plan completo o, si se indican `keys`, solo los pasos de los que dependen
+        esas claves; en ese caso el registro se queda únicamente con ellas.
+
+        Con una clave en varias filas (en la entrada o tras un paso con `repeats_keys`) las
+        filas de las claves no pedidas también cuentan para la posición de cada clave en la
+        salida: se aplica el plan completo y las claves no pedidas quedan como "None".
+        """
+        if keys is None:
+            self.apply(transformer, record)
+            return
+        keys = frozenset(keys)
+        if not record.has_repeated_keys():
+            pairs = list(record.items())
+            self.subset(keys).apply(transformer, record)
+            if not record.has_repeated_keys():
+                with measure_step("keep_keys", record.__len__):
+                    record.keep_keys(keys)
+                return
+            record.__init__(pairs)
+        self.apply(transformer, record)
+        with measure_step("blank_keys", record.__len__):
+            record.blank_keys(keys, "None")
+
+    def subset(self, keys: Iterable[str]) -> "TransformPlan":
+        """
+        Plan con solo las reglas necesarias para obtener `keys`: se recorre el plan hacia
+        atrás conservando cada regla que escribe alguna clave necesaria (o que puede repetir
+        claves) y añadiendo a las necesarias las que esa regla lee.
+        """
+        keys = frozenset(keys)
+        plan = self._subsets.get(keys)
+        if plan is None:
+            needed = set(keys)
+            selected = []
+            for rule in reversed(self.rules):
+                if rule.repeats_keys or _overlaps(rule.writes, needed):
+                    selected.append(rule)
+                    needed.update(rule.reads)
+            plan = self._subsets.setdefault(keys, TransformPlan(tuple(reversed(selected))))
+        return plan
+
+    def batch_steps(self, transformer, keys: Optional[Iterable[str]] = None) -> List[Callable[[VehicleBatch], None]]:
+        """
+        Pasos para `transform_batch`: el plan completo o, con `keys`, el subplan y el filtro
+        final. Los vehículos con alguna clave repetida se apartan y se transforman uno a uno
+        (ver `run`).
+        """
+        if keys is not None:
+            keys = frozenset(keys)
+            return ([_exclude_repeated_keys] + self.subset(keys).batch_steps(transformer)
+                    + [_exclude_repeated_keys, lambda batch: _keep_keys(batch, keys)])
+
+        def step(batch: VehicleBatch, rule: Rule):
+            triggers = rule.triggers
+            if triggers is not None and not batch.has_any(triggers):
+                skip_step(rule.name, batch.__len__)
+                return
+            with measure_step(rule.name, batch.__len__):
+                rule.apply_batch(transformer, batch)
+
+        return [lambda batch, rule=rule: step(batch, rule) for rule in self.rules]
+
+
+def _keep_keys(batch: VehicleBatch, keys: frozenset):
+    with measure_step("keep_keys", batch.__len__):
+        batch.keep_keys(keys)
+
+
+def _exclude_repeated_keys(batch: VehicleBatch):
+    with measure_step("exclude_repeated_keys", batch.__len__):
+        batch.exclude_rows(batch.rows.duplicated(["vehicle", "Key"]))
+
+
+_plans: Dict[Tuple[int, type], Tuple[Any, TransformPlan]] = {}
+_plans_lock = threading.Lock()
+
+
+def compile_plan(config, transformer_cls) -> TransformPlan:
+    """
+    Compila las reglas de la configuración para la clase de transformador dada.
+    El plan se guarda por configuración y se reutiliza en llamadas posteriores.
+    """
+    key = (id(config), transformer_cls)
+    with _plans_lock:
+        cached = _plans.get(key)
+        # Se guarda la propia configuración para que su id no pueda reutilizarse
+        if cached is not None and cached[0] is config:
+            return cached[1]
+        plan = TransformPlan(tuple(rule.bind(config, transformer_cls) for rule in config.rules))
+        _plans[key] = (config, plan)
+        return plan
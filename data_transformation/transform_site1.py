@@ -1,235 +1,133 @@
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+from dataclasses import dataclass, field
 import re
 
+from .transform_plan import (Chain, Combine, Custom, FormatFloat, MapValues, RenameKeys, Replace, Rule,
+                             Scale, Template, compile_plan)
+from .schema import HOMOLOGATION_KEYS, get_schema
+from .step_metrics import measure_step, transform_report
+from .vehicle_batch import SAFE_FLOAT, SAFE_INT_LIMIT, VehicleBatch, as_objects, transform_batch
+from .vehicle_record import VehicleRecord
+
+# Expresiones usadas por los pasos de limpieza, compiladas una sola vez
+_CM_PATTERN = re.compile(r'(\d+)(?:\.?\d*)\s*cm')
+_LITER_PATTERN = re.compile(r'([\d,]+)\s*liter')
+
+
+def _strip_g_km(values: pd.Series) -> pd.Series:
+    return values.str.replace(" g/km", "", regex=False)
+
+
+def _liters_number(values: pd.Series) -> pd.Series:
+    """Número delante de "liter" con punto decimal (NaN si no lo hay), como `_extract_liters`."""
+    return values.str.extract(_LITER_PATTERN, expand=False).str.replace(",", ".", regex=False)
+
 @dataclass
 class VehicleDataConfig:
     """Configuración para la transformación de datos del vehículo."""
     column_mapping: Dict[str, str]
     ordered_keys: List[str]
+    # Pasos de la transformación como reglas declarativas (ver transform_plan)
+    rules: List[Rule] = field(default_factory=list)
 
 class VehicleDataTransformer_site1:
     """Clase para transformar datos de vehículos."""
 
+    # Versión de la transformación: incrementarla al cambiarla invalida los resultados memorizados
+    VERSION = 1
+
     def __init__(self, config: VehicleDataConfig):
         self.config = config
+        # Plan compilado una vez por configuración y compartido entre instancias e hilos
+        self.plan = compile_plan(config, type(self))
+        # Esquema de slots internado: los tres sitios comparten el mismo si sus claves coinciden
+        self.schema = get_schema(config.ordered_keys)
 
-    def transform(self, df_input: pd.DataFrame) -> pd.DataFrame:
-        """Método principal que orquesta la transformación de datos."""
-        df = df_input.copy()
-        df = self._rename_columns(df)
-        df = self.clean_values(df)
-        df = self._process_axle_wheel(df)
-        df = self._process_Axles_track(df)
-        df = self._process_Axles_distribution(df)
-        df = self._process_maximum_mass_trailer(df)
-        df = self._emissions_standard(df)
-        df = self.exhaust_emission(df)
-        df = self.clean_particulates(df)
-        df = self.clean_smoke(df)
-        df = self.nedc_co_values(df)
-        df = self.nedc_fuel_consumption(df)
-        df = self.wltp_co_values(df)
-        df = self.wltp_fuel_consumption_values(df)
-        df = self.stationary_engine_speed(df)
-
-
-
-
-        df = self._add_missing_keys(df)
-        df = self._sort_and_clean(df)
-        return df
-
-    def _rename_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Renombra las columnas según el mapeo configurado."""
-        df["Key"] = df["Key"].map(lambda x: self.config.column_mapping.get(x, x))
-        return df
-
-    def _process_axle_wheel(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Procesa y combina la información de los ejes y ruedas."""
-        if "wheel" in df["Key"].values:
-            wheel = df[df["Key"] == "wheel"]["Value"].values[0]
-
-            new_value = f"{2}/{wheel}"
-
-            new_row = pd.DataFrame({
-                    "Key": ["Number of axles / wheels"],
-                    "Value": [f"{new_value}"]
-                })
-
-            df = pd.concat([df, new_row], ignore_index=True)
-        return df
-
-
-
-
-
-
-    def _process_Axles_track(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Procesa y combina la información de las bases de los ejes."""
-        if "Axle track  1" in df["Key"].values and "Axle track  2" in df["Key"].values:
-          axle_1 = df[df["Key"] == "Axle track  1"]["Value"].values[0]
-          axle_2 = df[df["Key"] == "Axle track  2"]["Value"].values[0]
-
-          new_value = f"{axle_1}/{axle_2}"
-
-          new_row = pd.DataFrame({
-                  "Key": ["Axle(s) track – 1 / 2"],
-                  "Value": [f"{new_value}"]
-              })
-
-          df = pd.concat([df, new_row], ignore_index=True)
-        return df
-
-    def _process_Axles_distribution(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Procesa y combina la información de la distribución de los ejes."""
-        if "Distribution of this mass among the axles – 1" in df["Key"].values and "Distribution of this mass among the axles – 2" in df["Key"].values:
-          axle_1 = df[df["Key"] == "Distribution of this mass among the axles – 1"]["Value"].values[0]
-          axle_2 = df[df["Key"] == "Distribution of this mass among the axles – 2"]["Value"].values[0]
-
-          new_value = f"{axle_1}/{axle_2}"
-
-          new_row = pd.DataFrame({
-                  "Key": ["Distribution of this mass among the axles – 1 / 2"],
-                  "Value": [f"{new_value}"]
-              })
-
-          df = pd.concat([df, new_row], ignore_index=True)
-
-          new_row_2 = pd.DataFrame({
-                  "Key": ["Technically permissible max mass on each axle – 1 / 2"],
-                  "Value": [f"{new_value}"]
-              })
-
-          df = pd.concat([df, new_row_2], ignore_index=True)
-
-
-        return df
-
-
-    def _emissions_standard(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Agrega la palabra EURO a la emisión estándar"""
-        df.loc[df["Key"] == "Emissions standard", "Value"] = df["Value"].apply(lambda x: f"EURO {x}")
-        return df
-
-
-
-
-
-    def _process_maximum_mass_trailer(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Procesa y combina la información del peso máximo del camión."""
-        if "Braked" in df["Key"].values and "Unbraked" in df["Key"].values:
-          braked = df[df["Key"] == "Braked"]["Value"].values[0]
-          unbraked = df[df["Key"] == "Unbraked"]["Value"].values[0]
+    def transform(self, df_input: pd.DataFrame, keys: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Método principal que orquesta la transformación de datos.
 
-          new_value = f"{braked}/{unbraked}"
+        Los pasos (las reglas de la configuración, compiladas en `self.plan`) trabajan sobre
+        un `VehicleRecord` y solo se construye un DataFrame al final.
 
-          new_row = pd.DataFrame({
-                  "Key": ["Maximum mass of trailer – braked / unbraked"],
-                  "Value": [f"{new_value}"]
-              })
-          df = pd.concat([df, new_row], ignore_index=True)
+        Con `keys` solo se ejecutan los pasos de los que dependen esas claves; las demás
+        ordered_keys quedan como "None".
+        """
+        record = VehicleRecord.from_frame(df_input)
+        with transform_report(self, "record"):
+            self.plan.run(self, record, keys)
 
-        return df
+            with measure_step("_add_missing_keys", record.__len__):
+                self._add_missing_keys(record)
+            with measure_step("_sort_and_clean", record.__len__):
+                return self._sort_and_clean(record.to_frame())
 
-    def exhaust_emission(self, df: pd.DataFrame) -> pd.DataFrame:
+    def exhaust_emission(self, record: VehicleRecord):
       """Renombra la clave y convierte a mayúsculas el valor solo para los registros específicos."""
-      mask = df["Key"] == "Brandstof #1 - Milieuklasse licht"
-      df.loc[mask, "Key"] = "Exhaust emission"
-      df.loc[mask, "Value"] = df.loc[mask, "Value"].str.upper()
-      return df
-
-
-
-
-    def clean_values(self, df: pd.DataFrame) -> pd.DataFrame:
-        def process_value(value):
-            if pd.isna(value):  # Manejar valores NaN
-                return value
-
-
-            # Eliminar puntos en unidades específicas (como "kg" o "cm³")
-            for unit in ['kg', 'cm³', 'dB(A)']:
-                if unit in value:
-                    value = value.replace('.', '')
-                    break
-
-            # Eliminar espacios y otras unidades específicas
-            for unit in ['kg', 'cm³', 'dB(A)']:
-                if unit in value:
-                    value = value.replace(unit, '').strip()
-
-
-            # Convertir cm a mm usando regex
-            if 'cm' in value:
-                # Encuentra el número antes de "cm" y multiplica por 10
-                value = re.sub(r'(\d+)(?:\.?\d*)\s*cm',
-                              lambda m: str(int(float(m.group(1)) * 10)),
-                              value)
+      # Mismo resultado que Series.str.upper(): los valores que no son texto quedan como NaN
+      record.update("Brandstof #1 - Milieuklasse licht", lambda x: x.upper() if isinstance(x, str) else np.nan)
+      record.rename("Brandstof #1 - Milieuklasse licht", "Exhaust emission")
 
+    @staticmethod
+    def _clean_value(value):
+        if pd.isna(value):  # Manejar valores NaN
             return value
 
-        # Aplicar la transformación a la columna seleccionada
-        df["Value"] = df["Value"].astype(str).apply(process_value)
-        return df
 
-    def clean_particulates(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Limpia el valor de 'Emissions particulates', eliminando 'g/km' y dividiendo por 1000.
-        Si no existe el registro, lo crea con un valor de "0.00001" (como string).
-        """
-        mask = df["Key"] == "Emissions particulates"
+        # Eliminar puntos en unidades específicas (como "kg" o "cm³")
+        for unit in ['kg', 'cm³', 'dB(A)']:
+            if unit in value:
+                value = value.replace('.', '')
+                break
 
-        if mask.any():
-            # Si existe, limpiamos el valor, lo redondeamos a 6 decimales y lo convertimos en string
-            df.loc[mask, "Value"] = (df.loc[mask, "Value"]
-                                    .str.replace(" g/km", "", regex=False)
-                                    .astype(float) / 1000).round(6).astype(str)
-        else:
-            # Si no existe, lo creamos con el valor predeterminado como string
-            new_row = pd.DataFrame({"Key": ["Emissions particulates"], "Value": ["0.00001"]})
-            df = pd.concat([df, new_row], ignore_index=True)
+        # Eliminar espacios y otras unidades específicas
+        for unit in ['kg', 'cm³', 'dB(A)']:
+            if unit in value:
+                value = value.replace(unit, '').strip()
 
-        return df
 
+        # Convertir cm a mm usando regex
+        if 'cm' in value:
+            # Encuentra el número antes de "cm" y multiplica por 10
+            value = _CM_PATTERN.sub(lambda m: str(int(float(m.group(1)) * 10)), value)
 
+        return value
 
-    def clean_smoke(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Limpia el valor de 'Smoke', eliminando 'g/km' y formateándolo a 2 decimales."""
-        mask = df["Key"] == "Smoke"
-        df.loc[mask, "Value"] = df.loc[mask, "Value"].str.replace(" g/km", "", regex=False).astype(float).map("{:.2f}".format)
-        return df
+    def clean_values(self, record: VehicleRecord):
+        # Aplicar la transformación a todos los valores (convertidos a texto, como astype(str))
+        clean_value = self._clean_value
+        record.map_values(lambda value: clean_value(str(value)))
 
-    def nedc_co_values(self, df: pd.DataFrame) -> pd.DataFrame:
+    def nedc_co_values(self, record: VehicleRecord):
         """Limpia el valor de 'NEDC CO2 combined' eliminando 'g/km' y crea dos nuevos registros:
         - 'NEDC CO2 urban conditions' con el valor original + 12
         - 'NEDC CO2 extra-urban conditions' con el valor original - 12
         Los valores se mantienen como enteros.
         """
-        mask = df["Key"] == "NEDC CO2 combined"
-
         # Limpiamos el valor, eliminando " g/km", lo convertimos a float y luego a entero
-        df.loc[mask, "Value"] = df.loc[mask, "Value"].str.replace(" g/km", "", regex=False).astype(float).astype(int)
+        record.update("NEDC CO2 combined", lambda x: int(float(x.replace(" g/km", ""))))
 
         # Creamos los nuevos registros basándonos en el valor limpio
-        new_rows = []
-        for valor in df.loc[mask, "Value"]:
-            new_rows.append({
-                "Key": "NEDC CO2 urban conditions",
-                "Value": int(valor + 12)
-            })
-            new_rows.append({
-                "Key": "NEDC CO2 extra-urban conditions",
-                "Value": int(valor - 12)
-            })
-
-        # Concatenamos los nuevos registros al DataFrame original
-        df = pd.concat([df, pd.DataFrame(new_rows)], ignore_index=True)
-        return df
-
-    import re
-
-    def nedc_fuel_consumption(self, df: pd.DataFrame) -> pd.DataFrame:
+        for valor in record.get_all("NEDC CO2 combined"):
+            record.append("NEDC CO2 urban conditions", int(valor + 12))
+            record.append("NEDC CO2 extra-urban conditions", int(valor - 12))
+
+    @staticmethod
+    def _extract_liters(text):
+        if isinstance(text, str) and "liter" in text:
+            # Busca el número antes de "liter", considerando que puede usar coma como separador decimal
+            match = _LITER_PATTERN.search(text)
+            if match:
+                return float(match.group(1).replace(",", "."))
+        try:
+            # Si no hay "liter", intenta convertir directamente el valor a float
+            return float(text)
+        except Exception:
+            return text
+
+    def nedc_fuel_consumption(self, record: VehicleRecord):
         """Limpia el valor de los registros de consumo NEDC.
 
         Para cada registro con key:
@@ -242,25 +140,10 @@ class VehicleDataTransformer_site1:
         En caso de que el valor ya sea numérico (como en '7.4'), lo deja tal cual.
         """
         # Selecciona todos los registros que contengan 'NEDC Fuel consumption' en la key
-        mask = df["Key"].str.contains("NEDC Fuel consumption", na=False)
-
-        import re
-        def extract_value(text):
-            if isinstance(text, str) and "liter" in text:
-                # Busca el número antes de "liter", considerando que puede usar coma como separador decimal
-                match = re.search(r'([\d,]+)\s*liter', text)
-                if match:
-                    return float(match.group(1).replace(",", "."))
-            try:
-                # Si no hay "liter", intenta convertir directamente el valor a float
-                return float(text)
-            except Exception:
-                return text
-
-        df.loc[mask, "Value"] = df.loc[mask, "Value"].apply(extract_value)
-        return df
-
-    def wltp_co_values(self, df: pd.DataFrame) -> pd.DataFrame:
+        for key in [key for key in set(record.keys()) if isinstance(key, str) and "NEDC Fuel consumption" in key]:
+            record.update(key, self._extract_liters)
+
+    def wltp_co_values(self, record: VehicleRecord):
         """Limpia el valor de 'WLTP CO2 combined' eliminando ' g/km' y crea nuevos registros:
 
         - 'WLTP CO2 Low' con valor = original + 6
@@ -270,27 +153,17 @@ class VehicleDataTransformer_site1:
 
         El registro 'WLTP CO2 combined' permanece con su valor original (limpio).
         """
-        mask = df["Key"] == "WLTP CO2 combined"
-
         # Limpiar el valor eliminando " g/km" y convertirlo a entero
-        df.loc[mask, "Value"] = df.loc[mask, "Value"].str.replace(" g/km", "", regex=False).astype(float).astype(int)
-
-        # Obtener el/los valor(es) originales
-        original_values = df.loc[mask, "Value"].tolist()
-        new_rows = []
-        for valor in original_values:
-            new_rows.append({"Key": "WLTP CO2 Low", "Value": valor + 6})
-            new_rows.append({"Key": "WLTP CO2 Medium", "Value": valor - 3})
-            new_rows.append({"Key": "WLTP CO2 High", "Value": valor - 6})
-            new_rows.append({"Key": "WLTP CO2 Maximum Value", "Value": valor + 3})
-
-        # Agregamos los nuevos registros al DataFrame original
-        df = pd.concat([df, pd.DataFrame(new_rows)], ignore_index=True)
-        return df
+        record.update("WLTP CO2 combined", lambda x: int(float(x.replace(" g/km", ""))))
 
+        # Agregamos los nuevos registros a partir del/los valor(es) originales
+        for valor in record.get_all("WLTP CO2 combined"):
+            record.append("WLTP CO2 Low", valor + 6)
+            record.append("WLTP CO2 Medium", valor - 3)
+            record.append("WLTP CO2 High", valor - 6)
+            record.append("WLTP CO2 Maximum Value", valor + 3)
 
-
-    def wltp_fuel_consumption_values(self, df: pd.DataFrame) -> pd.DataFrame:
+    def wltp_fuel_consumption_values(self, record: VehicleRecord):
         """Limpia el valor de 'WLTP Fuel consumption combined', extrayendo el número antes de 'liter'
         y reemplazando la coma decimal por punto. Luego, crea nuevos registros:
 
@@ -301,96 +174,161 @@ class VehicleDataTransformer_site1:
 
         El registro 'WLTP Fuel consumption combined' se mantiene con su valor original (limpio).
         """
-        mask = df["Key"] == "WLTP Fuel consumption combined"
-
-        def extract_value(text):
-            if isinstance(text, str) and "liter" in text:
-                # Busca el número antes de "liter" y reemplaza la coma por punto
-                match = re.search(r'([\d,]+)\s*liter', text)
-                if match:
-                    return float(match.group(1).replace(",", "."))
-            try:
-                return float(text)
-            except Exception:
-                return text
-
         # Limpia el valor para que quede como 7.9
-        df.loc[mask, "Value"] = df.loc[mask, "Value"].apply(extract_value)
-
-        # Obtiene el/los valor(es) originales para generar los nuevos registros
-        original_values = df.loc[mask, "Value"].tolist()
-        new_rows = []
-        for valor in original_values:
-            new_rows.append({
-                "Key": "WLTP Fuel consumption Low",
-                "Value": round(valor + 0.6, 1)
-            })
-            new_rows.append({
-                "Key": "WLTP Fuel consumption Medium",
-                "Value": round(valor - 0.3, 1)
-            })
-            new_rows.append({
-                "Key": "WLTP Fuel consumption High",
-                "Value": round(valor - 0.6, 1)
-            })
-            new_rows.append({
-                "Key": "WLTP Fuel consumption Maximum Value",
-                "Value": round(valor + 0.3, 1)
-            })
-
-        # Agrega los nuevos registros al DataFrame original
-        df = pd.concat([df, pd.DataFrame(new_rows)], ignore_index=True)
-        return df
-
-
-    def stationary_engine_speed(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Crea un nuevo registro a partir de los registros 'Stationary' y 'Engine speed'.
-
-        El nuevo registro tendrá:
-          Key: "Stationary (dB(A)) at engine speed"
-          Value: "<valor de Stationary> at <valor de Engine speed>"
-        """
-        # Filtra los registros correspondientes
-        stationary_mask = df["Key"] == "Stationary"
-        engine_mask = df["Key"] == "Engine speed"
+        record.update("WLTP Fuel consumption combined", self._extract_liters)
+
+        # Agrega los nuevos registros a partir del/los valor(es) originales
+        for valor in record.get_all("WLTP Fuel consumption combined"):
+            record.append("WLTP Fuel consumption Low", round(valor + 0.6, 1))
+            record.append("WLTP Fuel consumption Medium", round(valor - 0.3, 1))
+            record.append("WLTP Fuel consumption High", round(valor - 0.6, 1))
+            record.append("WLTP Fuel consumption Maximum Value", round(valor + 0.3, 1))
 
-        # Extrae los valores (se asume que cada registro es único)
-        if not df.loc[stationary_mask, "Value"].empty and not df.loc[engine_mask, "Value"].empty:
-            stationary_val = df.loc[stationary_mask, "Value"].iloc[0]
-            engine_val = df.loc[engine_mask, "Value"].iloc[0]
 
-            # Crea el nuevo registro con el formato solicitado
-            new_value = f"{stationary_val} at {engine_val}"
-            new_row = {"Key": "Stationary (dB(A)) at engine speed", "Value": new_value}
+    def _add_missing_keys(self, record: VehicleRecord):
+        """Añade información sobre claves faltantes, asegurando que se incluyan todas las ordered_keys."""
+        record.add_missing(self.config.ordered_keys, "None")
 
-            # Agrega el nuevo registro al DataFrame
-            df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-        return df
 
 
+    # --- Transformación por lotes ------------------------------------------------------
 
-    def _add_missing_keys(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Añade información sobre claves faltantes, asegurando que se incluyan todas las ordered_keys."""
-        missing_rows = [
-            {"Key": key, "Value": "None"}
-            for key in self.config.ordered_keys if key not in df["Key"].values
-        ]
-        if missing_rows:
-            df = pd.concat([df, pd.DataFrame(missing_rows)], ignore_index=True)
-        return df
+    def transform_many(self, df_input: pd.DataFrame, keys: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Transforma muchos vehículos a la vez a partir de un DataFrame largo con columnas
+        vehicle_id, Key y Value.
 
+        Cada paso se aplica con operaciones de columna sobre todos los vehículos, en lugar
+        de llamar a `transform` una vez por vehículo. Retorna un DataFrame largo
+        (vehicle_id, Key, Value) en el que las filas de cada vehículo son las mismas que
+        devolvería `transform`; los vehículos que fallan se listan en attrs['failed_vehicles'].
+        """
+        return transform_batch(self, df_input, self.plan.batch_steps(self, keys), text_values=False,
+                               keys=keys)
+
+    def clean_values_batch(self, batch: VehicleBatch):
+        # La limpieza depende solo del valor: se aplica una vez por valor distinto
+        codes, uniques = pd.factorize(batch.rows["Value"].map(str))
+        codes = pd.Series(codes, index=batch.rows.index)
+        values = pd.Series(uniques, dtype=object)
+
+        units = ['kg', 'cm³', 'dB(A)']
+        has_unit = np.logical_or.reduce([values.str.contains(unit, regex=False) for unit in units])
+        values = values.where(~has_unit, values.str.replace('.', '', regex=False))
+        for unit in units:
+            has_unit = values.str.contains(unit, regex=False)
+            values = values.where(~has_unit, values.str.replace(unit, '', regex=False).str.strip())
+
+        has_cm = values.str.contains('cm', regex=False)
+        # Un número enorme delante de "cm" desbordaría int(float(...)): se transforma aparte
+        too_long = has_cm & values.str.contains(r'\d{300}')
+        if too_long.any():
+            batch.exclude_rows(codes.isin(too_long[too_long].index))
+            codes = codes.loc[batch.rows.index]
+        convert = has_cm & ~too_long
+        values[convert] = values[convert].str.replace(
+            _CM_PATTERN, lambda m: str(int(float(m.group(1)) * 10)), regex=True)
+        batch.set_all(values.to_numpy()[codes.to_numpy()])
+
+    def exhaust_emission_batch(self, batch: VehicleBatch):
+        batch.update("Brandstof #1 - Milieuklasse licht", lambda values: values.str.upper())
+        batch.rename("Brandstof #1 - Milieuklasse licht", "Exhaust emission")
+
+    def _integer_values_batch(self, batch: VehicleBatch, key: str, offsets: Dict[str, int]):
+        """Limpia `key` como entero y añade, por cada fila, una fila nueva por cada desplazamiento."""
+        mask, numbers = batch.floats(key, _strip_g_km)
+        too_large = numbers.abs() >= SAFE_INT_LIMIT
+        if too_large.any():
+            batch.exclude_rows(batch.align(too_large))
+            mask, numbers = batch.floats(key, _strip_g_km)
+        integers = numbers.astype(np.int64).to_numpy()
+        batch.set_rows(mask, integers)
+
+        vehicles = batch.rows.loc[mask, "vehicle"].to_numpy()
+        batch.append_rows(
+            np.repeat(vehicles, len(offsets)),
+            np.tile(np.array(list(offsets), dtype=object), len(vehicles)),
+            (integers[:, None] + np.array(list(offsets.values()), dtype=np.int64)).ravel(),
+        )
 
+    def nedc_co_values_batch(self, batch: VehicleBatch):
+        self._integer_values_batch(batch, "NEDC CO2 combined", {
+            "NEDC CO2 urban conditions": 12,
+            "NEDC CO2 extra-urban conditions": -12,
+        })
+
+    def _extract_liters_batch(self, batch: VehicleBatch, mask: pd.Series) -> pd.Series:
+        """Versión por lotes de `_extract_liters`; retorna la máscara vigente tras apartar vehículos."""
+        not_text = ~batch.rows.loc[mask, "Value"].map(lambda value: isinstance(value, str)).astype(bool)
+        batch.exclude_rows(batch.align(not_text))
+        # float() lanzaría una excepción con un número mal formado junto a "liter"
+        mask = batch.align(mask)
+        number = _liters_number(batch.rows.loc[mask, "Value"])
+        batch.exclude_rows(batch.align(number.notna() & ~number.str.fullmatch(SAFE_FLOAT, na=False)))
+
+        # Sin "liter" se intenta float() directamente; si no es un número se deja el texto
+        mask = batch.align(mask)
+        plain = batch.align(_liters_number(batch.rows.loc[mask, "Value"]).isna())
+        _, numbers = batch.floats(mask & plain, strict=False)
+
+        mask = batch.align(mask)
+        text = batch.rows.loc[mask, "Value"]
+        number = _liters_number(text)
+        values = text.to_numpy(dtype=object).copy()
+        from_liters = number.notna().to_numpy()
+        values[from_liters] = as_objects(number[from_liters].astype(float))
+        numbers = numbers.dropna()
+        values[text.index.get_indexer(numbers.index)] = as_objects(numbers)
+        batch.set_rows(mask, values)
+        return mask
+
+    def nedc_fuel_consumption_batch(self, batch: VehicleBatch):
+        mask = batch.key_mask(lambda keys: keys.str.contains("NEDC Fuel consumption", regex=False))
+        if mask.any():
+            self._extract_liters_batch(batch, mask)
+
+    def wltp_co_values_batch(self, batch: VehicleBatch):
+        self._integer_values_batch(batch, "WLTP CO2 combined", {
+            "WLTP CO2 Low": 6,
+            "WLTP CO2 Medium": -3,
+            "WLTP CO2 High": -6,
+            "WLTP CO2 Maximum Value": 3,
+        })
+
+    def wltp_fuel_consumption_values_batch(self, batch: VehicleBatch):
+        key = "WLTP Fuel consumption combined"
+        mask = batch.mask(key)
+        if not mask.any():
+            return
+        mask = self._extract_liters_batch(batch, mask)
+        # round() de un texto lanzaría TypeError: esos vehículos se transforman aparte
+        not_float = ~batch.rows.loc[mask, "Value"].map(lambda value: isinstance(value, float)).astype(bool)
+        batch.exclude_rows(batch.align(not_float))
+        mask = batch.mask(key)
+
+        values = batch.rows.loc[mask, "Value"].tolist()
+        vehicles = batch.rows.loc[mask, "vehicle"].to_numpy()
+        offsets = {
+            "WLTP Fuel consumption Low": 0.6,
+            "WLTP Fuel consumption Medium": -0.3,
+            "WLTP Fuel consumption High": -0.6,
+            "WLTP Fuel consumption Maximum Value": 0.3,
+        }
+        # round() de Python (redondeo decimal exacto), igual que en `transform`
+        batch.append_rows(
+            np.repeat(vehicles, len(offsets)),
+            np.tile(np.array(list(offsets), dtype=object), len(vehicles)),
+            [round(valor + offset, 1) for valor in values for offset in offsets.values()],
+        )
+
+    def _add_missing_keys_batch(self, batch: VehicleBatch):
+        batch.add_missing(self.config.ordered_keys, "None")
 
     def _sort_and_clean(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Ordena y limpia el DataFrame final, manteniendo solo las primeras 30 filas.
         """
-        df["Key"] = pd.Categorical(
-            df["Key"],
-            categories=self.config.ordered_keys,
-            ordered=True
-        )
-        return df.sort_values("Key").head(70).reset_index(drop=True)
+        return self.schema.sort_frame(df, limit=70)
 
     @staticmethod
     def _get_max_value(value: str) -> str:
@@ -461,80 +399,38 @@ DEFAULT_CONFIG_1 = VehicleDataConfig(
 
 
     },
-    ordered_keys=[
-        "Number of axles / wheels",
-        "Powered axles",
-        "Wheelbase",
-        "Axle(s) track – 1 / 2",
-        "Length",
-        "Width",
-        "Height",
-        "Rear overhang",
-        "Mass of the vehicle with bodywork in running order",
-        "Technically permissible maximum laden mass",
-        "Distribution of this mass among the axles – 1 / 2",
-        "Technically permissible max mass on each axle – 1 / 2",
-        "Maximum permissible roof load",
-        "Maximum mass of trailer – braked / unbraked",
-        "Maximum mass of combination",
-        "Maximum vertical load at the coupling point for a trailer",
-        "Engine manufacturer",
-        "Engine code as marked on the enginee",
-        "Working principle",
-        "Direct injection",
-        "Pure electric",
-        "Hybrid [electric] vehicle",
-        "Number and arrangement of cylinders",
-        "Capacity",
-        "Fuel",
-        "Maximum net power",
-        "Clutch",
-        "Gearbox",
-        "Gear",
-        "Final drive ratio",
-        "EC type approval mark of couplind device if fitted",
-        "Maximum speed",
-        "Stationary (dB(A)) at engine speed",
-        "Drive by",
-        "Emissions standard",
-        "Exhaust emission",
-        "Emissions CO",
-        "Emissions HC",
-        "Emissions NOx",
-        "Emissions HC NOx",
-        "Emissions particulates",
-        "Smoke",
-        "NEDC CO2 urban conditions",
-        "NEDC CO2 extra-urban conditions",
-        "NEDC CO2 combined",
-        "NEDC Fuel consumption urban conditions",
-        "NEDC Fuel consumption extra-urban conditions",
-        "NEDC Fuel consumption combined",
-        "WLTP CO2 Low",
-        "WLTP CO2 Medium",
-        "WLTP CO2 High",
-        "WLTP CO2 Maximum Value",
-        "WLTP CO2 combined",
-        "WLTP Fuel consumption Low",
-        "WLTP Fuel consumption Medium",
-        "WLTP Fuel consumption High",
-        "WLTP Fuel consumption Maximum Value",
-        "WLTP Fuel consumption combined",
-        "Steering, method of assistance",
-        "Suspension",
-        "Brakes",
-        "Type of body",
-        "Number and configuration of doors",
-        "Number and position of seats",
-        "Make",
-        "Type",
-        "Variant",
-        "Version",
-        "Commercial name",
-        "Homologation number",
-
-
-    ]
+    ordered_keys=list(HOMOLOGATION_KEYS),
+    rules=[
+        RenameKeys(),
+        # Limpia todos los valores: todo paso posterior depende de ella
+        Custom("clean_values"),
+        Combine(("wheel",), ("Number of axles / wheels",), template="2/{}"),
+        Combine(("Axle track  1", "Axle track  2"), ("Axle(s) track – 1 / 2",)),
+        Combine(("Distribution of this mass among the axles – 1", "Distribution of this mass among the axles – 2"),
+                ("Distribution of this mass among the axles – 1 / 2",
+                 "Technically permissible max mass on each axle – 1 / 2")),
+        Combine(("Braked", "Unbraked"), ("Maximum mass of trailer – braked / unbraked",)),
+        MapValues(("Emissions standard",), Template("EURO {}")),
+        Custom("exhaust_emission", reads=("Brandstof #1 - Milieuklasse licht",),
+               writes=("Brandstof #1 - Milieuklasse licht", "Exhaust emission"), skip_if_missing=True),
+        # Sin "g/km", dividido por 1000 y redondeado a 6 decimales (texto); "0.00001" si no existe
+        MapValues(("Emissions particulates",), Chain((Replace(" g/km", ""), Scale(1000, 6))), default="0.00001"),
+        MapValues(("Smoke",), Chain((Replace(" g/km", ""), FormatFloat("{:.2f}")))),
+        Custom("nedc_co_values", reads=("NEDC CO2 combined",),
+               writes=("NEDC CO2 combined", "NEDC CO2 urban conditions", "NEDC CO2 extra-urban conditions"),
+               skip_if_missing=True),
+        Custom("nedc_fuel_consumption", reads=("NEDC Fuel consumption*",), writes=("NEDC Fuel consumption*",)),
+        Custom("wltp_co_values", reads=("WLTP CO2 combined",),
+               writes=("WLTP CO2 combined", "WLTP CO2 Low", "WLTP CO2 Medium", "WLTP CO2 High",
+                       "WLTP CO2 Maximum Value"),
+               skip_if_missing=True),
+        Custom("wltp_fuel_consumption_values", reads=("WLTP Fuel consumption combined",),
+               writes=("WLTP Fuel consumption combined", "WLTP Fuel consumption Low",
+                       "WLTP Fuel consumption Medium", "WLTP Fuel consumption High",
+                       "WLTP Fuel consumption Maximum Value"),
+               skip_if_missing=True),
+        Combine(("Stationary", "Engine speed"), ("Stationary (dB(A)) at engine speed",), separator=" at "),
+    ],
 )
 
 
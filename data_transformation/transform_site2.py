@@ -1,185 +1,71 @@
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+from dataclasses import dataclass, field
 import re
 
+from .transform_plan import (Chain, Combine, Custom, Derive, MapValues, MaxOfPair, NumberPair, RenameKeys,
+                             Replace, RestParts, Rule, SplitPart, ValueMap, compile_plan)
+from .schema import HOMOLOGATION_KEYS, get_schema
+from .step_metrics import measure_step, transform_report
+from .vehicle_batch import VehicleBatch, matches, transform_batch
+from .vehicle_record import VehicleRecord
+
+# Formatos de "Transmission/IA" (ver _process_transmission), compilados una sola vez
+_DUAL_CLUTCH_PATTERN = re.compile(r'^m(\d+)a$')
+_AUTOMATIC_PATTERN = re.compile(r'^a(\d+)$')
+_MANUAL_PATTERN = re.compile(r'^m(\d+)$')
+_MECH_SPEED_PATTERN = re.compile(r'mech\s*(\d+)', re.IGNORECASE)
+_AUTOM_SPEED_PATTERN = re.compile(r'autom\s*(\d+)', re.IGNORECASE)
+_EMISSIONS_PREFIX_PATTERN = re.compile(r'72 Emissions -\s*')
+_PARENTHESIS_SUFFIX_PATTERN = re.compile(r'\s*\(.*\)')
+
 @dataclass
 class VehicleDataConfig:
     """Configuración para la transformación de datos del vehículo."""
     column_mapping: Dict[str, str]
     ordered_keys: List[str]
+    # Pasos de la transformación como reglas declarativas (ver transform_plan)
+    rules: List[Rule] = field(default_factory=list)
 
 class VehicleDataTransformer_site2:
     """Clase para transformar datos de vehículos."""
 
+    # Versión de la transformación: incrementarla al cambiarla invalida los resultados memorizados
+    VERSION = 1
+
     def __init__(self, config: VehicleDataConfig):
         self.config = config
+        # Plan compilado una vez por configuración y compartido entre instancias e hilos
+        self.plan = compile_plan(config, type(self))
+        # Esquema de slots internado: los tres sitios comparten el mismo si sus claves coinciden
+        self.schema = get_schema(config.ordered_keys)
 
-    def transform(self, df_input: pd.DataFrame) -> pd.DataFrame:
-        """Método principal que orquesta la transformación de datos."""
-        df = df_input.copy()
-        df = self._rename_columns(df)
-        df = self._process_axle_tracks(df)
-        df = self._add_powered_axles(df)
-        df = self._process_trailer_masses(df)
-        df = self._process_mass_distribution(df)
-        df = self._process_maximum_vertical_load(df)
-        df = self._process_engine_manufacturer(df)
-        df = self._process_max_power(df)
-        df = self._process_transmission(df)
-        df = self._process_drive_ratio(df)
-        df = self._process_Rear_overhang(df)
-        df = self._process_maximum_speed(df)
-        df = self._process_emissions(df)
-        df = self._transform_emissions_values(df)
-        df = self._process_dimensions(df)
-        df = self._process_engine_details(df)
-
-        df = self._add_missing_keys(df)
-        df = self._sort_and_clean(df)
-        return df
-
-    def _rename_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Renombra las columnas según el mapeo configurado y asegura que todas las claves estén presentes."""
-        # Renombrar las columnas según el mapeo
-        df["Key"] = df["Key"].map(lambda x: self.config.column_mapping.get(x, x))
-
-        # Verificar claves faltantes y agregar filas con "None"
-        missing_keys = [
-            self.config.column_mapping[key]
-            for key in self.config.column_mapping.keys()
-            if self.config.column_mapping[key] not in df["Key"].values
-        ]
-
-        if missing_keys:
-            missing_rows = [{"Key": key, "Value": "None"} for key in missing_keys]
-            df = pd.concat([df, pd.DataFrame(missing_rows)], ignore_index=True)
-
-        return df
-
-    def _process_axle_tracks(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Procesa y combina la información de los ejes."""
-        if "Axle(s) track – 1" in df["Key"].values and "Axle(s) track – 2" in df["Key"].values:
-            track1 = df[df["Key"] == "Axle(s) track – 1"]["Value"].values[0]
-            track2 = df[df["Key"] == "Axle(s) track – 2"]["Value"].values[0]
-
-            max_track1 = self._get_max_value(track1)
-            max_track2 = self._get_max_value(track2)
-
-            df = df[df["Key"] != "Axle(s) track – 2"]
-            mask = df["Key"] == "Axle(s) track – 1"
-            df.loc[mask, "Value"] = f"{max_track1}/{max_track2}"
-            df.loc[mask, "Key"] = "Axle(s) track – 1 / 2"
-
-        return df
-
-    def _add_powered_axles(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Añade información sobre ejes motorizados."""
-        if "Powered axles" in df["Key"].values:
-          actual_value = df[df["Key"] == "Powered axles"]["Value"].values[0]
-
-          if actual_value == "All-wheel drive":
-            df.loc[df["Key"] == "Powered axles", "Value"] = "2"
-          else:
-            df.loc[df["Key"] == "Powered axles", "Value"] = "1"
+    def transform(self, df_input: pd.DataFrame, keys: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Método principal que orquesta la transformación de datos.
 
-        return df
+        Los pasos (las reglas de la configuración, compiladas en `self.plan`) trabajan sobre
+        un `VehicleRecord` y solo se construye un DataFrame al final.
 
+        Con `keys` solo se ejecutan los pasos de los que dependen esas claves; las demás
+        ordered_keys quedan como "None".
+        """
+        record = VehicleRecord.from_frame(df_input)
+        with transform_report(self, "record"):
+            self.plan.run(self, record, keys)
 
+            with measure_step("_add_missing_keys", record.__len__):
+                self._add_missing_keys(record)
+            with measure_step("_sort_and_clean", record.__len__):
+                return self._sort_and_clean(record.to_frame())
 
-    def _add_missing_keys(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _add_missing_keys(self, record: VehicleRecord):
         """Añade información sobre claves faltantes, asegurando que se incluyan todas las ordered_keys."""
-        missing_rows = [
-            {"Key": key, "Value": "None"}
-            for key in self.config.ordered_keys if key not in df["Key"].values
-        ]
-        if missing_rows:
-            df = pd.concat([df, pd.DataFrame(missing_rows)], ignore_index=True)
-        return df
-
-
-    def _process_trailer_masses(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Procesa y combina la información de masas del remolque, tomando el máximo valor de cada par."""
-        if "Braked trailer" in df["Key"].values and "Unbraked trailer" in df["Key"].values:
-            # Obtiene los valores originales
-            braked = df[df["Key"] == "Braked trailer"]["Value"].values[0]      # ej: "600 / 1000"
-            unbraked = df[df["Key"] == "Unbraked trailer"]["Value"].values[0]  # ej: "450 / 1222"
-
-            # Obtiene el máximo de cada par
-            braked_max = self._get_max_from_pair(braked, '/')     # resultado: 1000
-            unbraked_max = self._get_max_from_pair(unbraked, '/') # resultado: 1222
-
-            # Elimina las filas originales
-            df = df[~df["Key"].isin(["Braked trailer", "Unbraked trailer"])]
-
-            # Crea una nueva fila con los máximos
-            new_row = pd.DataFrame({
-                "Key": ["Maximum mass of trailer – braked / unbraked"],
-                "Value": [f"{braked_max}/{unbraked_max}"]  # Resultado: "1000 / 1222"
-            })
-
-            df = pd.concat([df, new_row], ignore_index=True)
-
-        return df
-
-    def _process_Rear_overhang(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Procesa y combina la información de Rear overhang"""
-        if "Rear overhang" in df["Key"].values:
-            rear = df[df["Key"] == "Rear overhang"]["Value"].values[0]
-
-            # elimina el primer "/" de "/ 869 - 869"
-            rear = rear.split("/")[1]
-
-            # guarda el nuevo valor
-            df.loc[df["Key"] == "Rear overhang", "Value"] = rear
-
-
-        return df
+        record.add_missing(self.config.ordered_keys, "None")
 
-    #def Maximum vertical load at the coupling point for a trailer
-    def _process_maximum_vertical_load(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Procesa y transforma Maximum vertical load at the coupling point for a trailer"""
-        if "Support load" in df["Key"].values:
-            # Obtiene los valores originales
-            vertical_values = df[df["Key"] == "Support load"]["Value"].values[0]      # ej: "600 / 1000"
 
-            # Obtiene el máximo de cada par
-            vertical_value_max = self._get_max_from_pair(vertical_values, '/')     # resultado: 1000
-
-            # Elimina las filas originales
-            df = df[~df["Key"].isin(["Support load"])]
-
-            # Crea una nueva fila con los máximos
-            new_row = pd.DataFrame({
-                "Key": ["Maximum vertical load at the coupling point for a trailer"],
-                "Value": [f"{vertical_value_max}"]  # Resultado: "1000 / 1222"
-            })
-
-            df = pd.concat([df, new_row], ignore_index=True)
-
-        return df
-
-    def _process_max_power(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Procesa y combina la información la capacidad maxima."""
-        if "Maximum net power" in df["Key"].values:
-            power = df[df["Key"] == "Maximum net power"]["Value"].values[0]
-
-            num1 = float(self._get_value_slash(power, 0))
-            num2 = float(self._get_value_slash(power, 1))
-
-            num1 = int(num1) if num1.is_integer() else num1
-            num2 = int(num2) if num2.is_integer() else num2
-
-
-            new_value = f"{num1}/{num2}"
-
-
-            df.loc[df["Key"] == "Maximum net power", "Value"] = new_value
-
-        return df
-    
-
-    def _process_engine_details(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _process_engine_details(self, record: VehicleRecord):
         """
         Procesa una cadena de origen para extraer detalles del motor.
         Modifica la clave 'Working principle' existente y AÑADE NUEVAS FILAS
@@ -195,121 +81,50 @@ class VehicleDataTransformer_site2:
         target_key_di = "Direct injection"
         target_key_cyl = "Number and arrangement of cylinders"
 
-        new_rows_list = [] # Lista para almacenar las nuevas filas a añadir
-
-        # Verificar si la clave de origen existe
-        if source_key_name in df["Key"].values:
-            source_row_index = df[df["Key"] == source_key_name].index
-            # Asegurarse de que la clave de origen es única antes de proceder
-            if len(source_row_index) == 1:
-                source_value = df.loc[source_row_index[0], "Value"]
-
-                if isinstance(source_value, str) and "/" in source_value:
-                    parts = [part.strip() for part in source_value.split('/')]
-
-                    if len(parts) >= 4:
-                        part1 = parts[0] # 'D' o 'B'
-                        part3 = parts[2] # Número de cilindros, e.g., '4'
-                        part4 = parts[3] # Tipo de inyección/motor, e.g., 'Reihe-T-DI'
-
-                        # 1. Procesar Working Principle (MODIFICAR existente) y Fuel (AÑADIR nuevo)
-                        if part1 == 'D':
-                            df.loc[source_row_index[0], "Value"] = "Common rail" # Modificar WP
-                            new_rows_list.append({"Key": target_key_fuel, "Value": "Diesel"}) # Añadir Fuel
-                        elif part1 == 'B':
-                            df.loc[source_row_index[0], "Value"] = "Spark ignition, 4-stroke" # Modificar WP
-                            new_rows_list.append({"Key": target_key_fuel, "Value": "Petrol"}) # Añadir Fuel
-
-                        # 2. Procesar Direct Injection (AÑADIR nuevo)
-                        if part4 == "Reihe-Inj-T":
-                            new_rows_list.append({"Key": target_key_di, "Value": "Yes"})
+        # Verificar si la clave de origen existe y es única antes de proceder
+        if record.count(source_key_name) == 1:
+            source_value = record.get(source_key_name)
+
+            if isinstance(source_value, str) and "/" in source_value:
+                parts = [part.strip() for part in source_value.split('/')]
+
+                if len(parts) >= 4:
+                    part1 = parts[0] # 'D' o 'B'
+                    part3 = parts[2] # Número de cilindros, e.g., '4'
+                    part4 = parts[3] # Tipo de inyección/motor, e.g., 'Reihe-T-DI'
+
+                    # 1. Procesar Working Principle (MODIFICAR existente) y Fuel (AÑADIR nuevo)
+                    if part1 == 'D':
+                        record.set(source_key_name, "Common rail") # Modificar WP
+                        record.append(target_key_fuel, "Diesel") # Añadir Fuel
+                    elif part1 == 'B':
+                        record.set(source_key_name, "Spark ignition, 4-stroke") # Modificar WP
+                        record.append(target_key_fuel, "Petrol") # Añadir Fuel
+
+                    # 2. Procesar Direct Injection (AÑADIR nuevo)
+                    if part4 == "Reihe-Inj-T":
+                        record.append(target_key_di, "Yes")
+                    else:
+                        # Opcional: ajustar si "DI" en part4 también significa "Yes"
+                        record.append(target_key_di, "No")
+
+                    # 3. Procesar Number and arrangement of cylinders (AÑADIR nuevo)
+                    cyl_value = part3 # Valor por defecto si no es un número válido
+                    if part3.isdigit():
+                        num_cyl = int(part3)
+                        if num_cyl in [3, 4, 6]:
+                            cyl_value = f"{num_cyl}, in line"
                         else:
-                            # Opcional: ajustar si "DI" en part4 también significa "Yes"
-                            new_rows_list.append({"Key": target_key_di, "Value": "No"})
-
-                        # 3. Procesar Number and arrangement of cylinders (AÑADIR nuevo)
-                        cyl_value = part3 # Valor por defecto si no es un número válido
-                        if part3.isdigit():
-                            num_cyl = int(part3)
-                            if num_cyl in [3, 4, 6]:
-                                cyl_value = f"{num_cyl}, in line"
-                            else:
-                                cyl_value = str(num_cyl)
-                        new_rows_list.append({"Key": target_key_cyl, "Value": cyl_value})
-
-                        # Opcional: Limpiar el valor de la clave fuente si ya no se necesita explícitamente
-                        # Podrías querer borrarlo o dejarlo, ahora que se ha procesado
-                        # df.loc[source_row_index[0], "Value"] = "" # Por ejemplo, para borrarlo
-
-                # else: El valor no tiene el formato esperado
-            # else: La clave de origen no es única (o no se encontró), no hacer nada
-        # else: La clave de origen no se encontró
+                            cyl_value = str(num_cyl)
+                    record.append(target_key_cyl, cyl_value)
 
-        # Añadir todas las nuevas filas al DataFrame de una vez si se generaron
-        if new_rows_list:
-            new_rows_df = pd.DataFrame(new_rows_list)
-            df = pd.concat([df, new_rows_df], ignore_index=True)
+            # else: El valor no tiene el formato esperado
+        # else: La clave de origen no es única (o no se encontró), no hacer nada
 
-        return df
 
 
 
-
-    def _process_mass_distribution(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Procesa y combina la información de distribución de masas."""
-        key1 = "Distribution of this mass among the axles - 1"
-        key2 = "Distribution of this mass among the axles - 2"
-
-        if key1 in df["Key"].values and key2 in df["Key"].values:
-            mass1_pair = df[df["Key"] == key1]["Value"].values[0]
-            mass2_pair = df[df["Key"] == key2]["Value"].values[0]
-
-            mass1 = self._get_max_from_pair(mass1_pair, '-')
-            mass2 = self._get_max_from_pair(mass2_pair, '-')
-
-            df = df[~df["Key"].isin([key1, key2])]
-
-            new_row_1 = pd.DataFrame({
-                "Key": ["Distribution of this mass among the axles – 1 / 2"],
-                "Value": [f"{mass1}/{mass2}"]
-            })
-            df = pd.concat([df, new_row_1], ignore_index=True)
-
-            new_row_2 = pd.DataFrame({
-                "Key": ["Technically permissible max mass on each axle – 1 / 2"],
-                "Value": [f"{mass1}/{mass2}"]
-            })
-            df = pd.concat([df, new_row_2], ignore_index=True)
-
-        return df
-
-    def _process_engine_manufacturer(self, df: pd.DataFrame) -> pd.DataFrame:
-      """Obtiene la marca del motor"""
-      if "Brand / Type" in df["Key"].values:
-        brandType = df[df["Key"] == "Brand / Type"]["Value"].values[0]
-
-        brand = self._get_value_slash(brandType, 0)
-
-        parts = [part.strip() for part in brandType.split("/")]
-        type_Name = " / ".join(parts[1:])
-
-        new_row = pd.DataFrame({
-            "Key": ["Engine manufacturer"],
-            "Value": [f"{brand}"]
-        })
-        df = pd.concat([df, new_row], ignore_index=True)
-
-        new_row2 = pd.DataFrame({
-              "Key": ["Engine code as marked on the enginee"],
-              "Value": [f"{type_Name}"]
-          })
-        df = pd.concat([df, new_row2], ignore_index=True)
-
-        df = df[~df["Key"].isin(["Brand / Type"])]
-      return df
-
-
-    def _process_transmission(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _process_transmission(self, record: VehicleRecord):
         """Procesa la información de transmission y agrega nuevos registros según el formato especificado.
 
         Casos contemplados:
@@ -333,8 +148,8 @@ class VehicleDataTransformer_site2:
             - 29. Gearbox (type) => "Automatic"
             - 29.1 Gear: => 1
         """
-        if "Transmission/IA" in df["Key"].values:
-            transmission = df[df["Key"] == "Transmission/IA"]["Value"].values[0]
+        if "Transmission/IA" in record:
+            transmission = record.get("Transmission/IA")
             # Extraemos el primer segmento (suponiendo que es el que contiene la info relevante)
             transmission_spec = self._get_value_slash(transmission, 0).strip().lower()
 
@@ -343,21 +158,17 @@ class VehicleDataTransformer_site2:
             gear = None
 
             # Caso 1: 'mXa' (ej: m8a)
-            if re.match(r'^m(\d+)a$', transmission_spec):
+            if match := _DUAL_CLUTCH_PATTERN.match(transmission_spec):
                 clutch_type = "Dual clutch"
                 gearbox = "Automatic"
-                match = re.match(r'^m(\d+)a$', transmission_spec)
-                if match:
-                    gear = int(match.group(1))
+                gear = int(match.group(1))
             # Caso 2: 'aX' (ej: a8)
-            elif re.match(r'^a(\d+)$', transmission_spec):
+            elif match := _AUTOMATIC_PATTERN.match(transmission_spec):
                 clutch_type = "Single plate dry"
                 gearbox = "Automatic"
-                match = re.match(r'^a(\d+)$', transmission_spec)
-                if match:
-                    gear = int(match.group(1))
+                gear = int(match.group(1))
             # Caso 3: 'mX' (ej: m6)
-            elif re.match(r'^m(\d+)$', transmission_spec):
+            elif _MANUAL_PATTERN.match(transmission_spec):
                 clutch_type = "Single plate dry"
                 gearbox = "Manual"
             # Caso 4: 's'
@@ -367,34 +178,20 @@ class VehicleDataTransformer_site2:
                 gear = 1
 
             # Agregar registro para "28. Clutch /type"
-            new_row_clutch = pd.DataFrame({
-                "Key": ["Clutch"],
-                "Value": [clutch_type]
-            })
-            df = pd.concat([df, new_row_clutch], ignore_index=True)
+            record.append("Clutch", clutch_type)
 
             # Agregar registro para "29. Gearbox (type)"
-            new_row_gearbox = pd.DataFrame({
-                "Key": ["Gearbox"],
-                "Value": [gearbox]
-            })
-            df = pd.concat([df, new_row_gearbox], ignore_index=True)
+            record.append("Gearbox", gearbox)
 
             # Agregar registro para "29.1 Gear:" solo si se pudo extraer un número
             if gear is not None:
-                new_row_gear = pd.DataFrame({
-                    "Key": ["Gear"],
-                    "Value": [str(gear)]
-                })
-                df = pd.concat([df, new_row_gear], ignore_index=True)
-
-        return df
+                record.append("Gear", str(gear))
 
 
 
 
 
-    def _process_maximum_speed(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _process_maximum_speed(self, record: VehicleRecord):
       """
       Procesa la velocidad máxima según el tipo de transmisión.
 
@@ -402,13 +199,13 @@ class VehicleDataTransformer_site2:
       - Si es "Automatic", extrae el valor que sigue a "autom" en "19 Vehicle VMax".
       - Finalmente, crea un nuevo registro con Key "Maximum speed" y el valor obtenido.
       """
-      if "Gearbox" in df["Key"].values and "19 Vehicle VMax" in df["Key"].values:
-          gearbox_val = df[df["Key"] == "Gearbox"]["Value"].values[0].strip().lower()
-          vmax_val = df[df["Key"] == "19 Vehicle VMax"]["Value"].values[0]
+      if "Gearbox" in record and "19 Vehicle VMax" in record:
+          gearbox_val = record.get("Gearbox").strip().lower()
+          vmax_val = record.get("19 Vehicle VMax")
 
           # Buscar los números asociados a 'mech' y 'autom'
-          match_mech = re.search(r'mech\s*(\d+)', vmax_val, re.IGNORECASE)
-          match_autom = re.search(r'autom\s*(\d+)', vmax_val, re.IGNORECASE)
+          match_mech = _MECH_SPEED_PATTERN.search(vmax_val)
+          match_autom = _AUTOM_SPEED_PATTERN.search(vmax_val)
 
           maximum_speed = None
           if gearbox_val == "manual" and match_mech:
@@ -420,15 +217,9 @@ class VehicleDataTransformer_site2:
               maximum_speed = "Desconocido"
 
           # Agregar el registro de "Maximum speed"
-          new_row = pd.DataFrame({
-              "Key": ["Maximum speed"],
-              "Value": [maximum_speed]
-          })
-          df = pd.concat([df, new_row], ignore_index=True)
+          record.append("Maximum speed", maximum_speed)
 
-      return df
-
-    def _process_emissions(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _process_emissions(self, record: VehicleRecord):
       """
       Procesa los registros de emisiones.
 
@@ -447,44 +238,36 @@ class VehicleDataTransformer_site2:
       new_rows = []
 
       # Contar cuántos registros de Transmission hay
-      transmissions = df[df["Key"].str.contains("72 Emissions - Transmission", regex=False)]
-      count_transmissions = len(transmissions)
+      rows = list(record.items())
+      count_transmissions = sum(1 for key, _ in rows if "72 Emissions - Transmission" in key)
 
       if count_transmissions == 1:
           # Solo hay un grupo: se procesan todos los registros de emisiones (excepto el de Transmission)
-          for index, row in df.iterrows():
-              key = row["Key"]
+          for key, value in rows:
               if key.startswith("72 Emissions -") and "Transmission" not in key:
                   # Eliminar el prefijo "72 Emissions - " y quitar cualquier sufijo entre paréntesis
-                  emission_type = re.sub(r'72 Emissions -\s*', '', key)
-                  emission_type = re.sub(r'\s*\(.*\)', '', emission_type)
-                  new_key = f"Emissions {emission_type}"
-                  new_rows.append({"Key": new_key, "Value": row["Value"]})
+                  emission_type = _EMISSIONS_PREFIX_PATTERN.sub('', key)
+                  emission_type = _PARENTHESIS_SUFFIX_PATTERN.sub('', emission_type)
+                  new_rows.append((f"Emissions {emission_type}", value))
       elif count_transmissions == 2:
           # Se consultará el valor del Gearbox para decidir qué grupo usar
-          gearbox_row = df[df["Key"] == "Gearbox"]
-          if not gearbox_row.empty:
-              gearbox_val = gearbox_row["Value"].values[0].strip().lower()
+          if "Gearbox" in record:
+              gearbox_val = record.get("Gearbox").strip().lower()
               # Seleccionar el sufijo según el tipo de caja
               chosen_suffix = "(mec)" if gearbox_val == "manual" else "(autom)" if gearbox_val == "automatic" else ""
-              for index, row in df.iterrows():
-                  key = row["Key"]
+              for key, value in rows:
                   if key.startswith("72 Emissions -") and chosen_suffix in key:
                       # Quitar el prefijo y el sufijo elegido
-                      emission_type = re.sub(r'72 Emissions -\s*', '', key)
+                      emission_type = _EMISSIONS_PREFIX_PATTERN.sub('', key)
                       emission_type = emission_type.replace(chosen_suffix, "").strip()
-                      new_key = f"Emissions {emission_type}"
-                      new_rows.append({"Key": new_key, "Value": row["Value"]})
-
-      # Se crean los nuevos registros y se concatenan al DataFrame original
-      if new_rows:
-          new_df = pd.DataFrame(new_rows)
-          df = pd.concat([df, new_df], ignore_index=True)
+                      new_rows.append((f"Emissions {emission_type}", value))
 
-      return df
+      # Se añaden los nuevos registros al final
+      for key, value in new_rows:
+          record.append(key, value)
 
 
-    def _transform_emissions_values(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _transform_emissions_values(self, record: VehicleRecord):
         """
         Transforma los valores de los registros limpios de emisiones:
 
@@ -492,71 +275,146 @@ class VehicleDataTransformer_site2:
         - Si el valor numérico es 0.00, se reemplaza por "----".
         - En caso contrario, se divide el valor por 1000 y se formatea con 4 decimales.
         """
-        # Filtrar filas cuyos registros comiencen con "Emissions"
-        emissions_mask = df["Key"].str.startswith("Emissions")
-
-        for idx in df[emissions_mask].index:
-            valor = df.loc[idx, "Value"]
+        def transform_value(valor):
             try:
                 # Convertir el valor a float
                 num = float(valor)
-                if num == 0.0:
-                    df.loc[idx, "Value"] = "- - - -"
-                else:
-                    # Dividir el valor por 1000 y formatear a 4 decimales
-                    nuevo_valor = num / 1000
-                    df.loc[idx, "Value"] = f"{nuevo_valor:.4f}"
             except ValueError:
                 # Si no se puede convertir a número, se deja el valor original
-                continue
-        return df
-
-
-
-
+                return valor
+            if num == 0.0:
+                return "- - - -"
+            # Dividir el valor por 1000 y formatear a 4 decimales
+            nuevo_valor = num / 1000
+            return f"{nuevo_valor:.4f}"
 
-    def _process_drive_ratio(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Procesa la drive ratio"""
-        if "Transmission/IA" in df["Key"].values:
-            drive = df[df["Key"] == "Transmission/IA"]["Value"].values[0]
-
-            drive_value = self._get_value_slash(drive, 1)
-
-            # Si el valor extraído contiene un "+", tomar solo el primer número antes del "+"
-            drive_value = drive_value.split("+")[0].strip()
-
-            # Reemplazar coma por punto
-            drive_value = drive_value.replace(",", ".")
-
-            new_row = pd.DataFrame({
-                "Key": ["Final drive ratio"],
-                "Value": [f"{drive_value}"]
-            })
-            df = pd.concat([df, new_row], ignore_index=True)
-            df = df[~df["Key"].isin(["Transmission/IA"])]
+        # Filtrar filas cuyos registros comiencen con "Emissions"
+        for key in {key for key in record.keys() if key.startswith("Emissions")}:
+            record.update(key, transform_value)
 
-        return df
 
 
-    def _process_dimensions(self, df: pd.DataFrame) -> pd.DataFrame:
-      """Procesa las dimensiones y extrae el primer número en caso de rango."""
 
-      keys_to_process = ["Length", "Width", "Height", "Rear overhang"]
 
-      for key in keys_to_process:
-          df.loc[df["Key"] == key, "Value"] = df.loc[df["Key"] == key, "Value"].str.split(" - ").str[0].str.strip()
+    # --- Transformación por lotes ------------------------------------------------------
 
-      return df
+    def transform_many(self, df_input: pd.DataFrame, keys: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Transforma muchos vehículos a la vez a partir de un DataFrame largo con columnas
+        vehicle_id, Key y Value.
 
+        Cada paso se aplica con operaciones de columna sobre todos los vehículos, en lugar
+        de llamar a `transform` una vez por vehículo. Retorna un DataFrame largo
+        (vehicle_id, Key, Value) en el que las filas de cada vehículo son las mismas que
+        devolvería `transform`; los vehículos que fallan se listan en attrs['failed_vehicles'].
+        """
+        return transform_batch(self, df_input, self.plan.batch_steps(self, keys), keys=keys)
+
+    def _process_transmission_batch(self, batch: VehicleBatch):
+        transmission = batch.first("Transmission/IA")
+        transmission_spec = transmission.str.split("/", regex=False).str[0].str.strip().str.lower()
+
+        dual_clutch = transmission_spec.str.extract(_DUAL_CLUTCH_PATTERN, expand=False)
+        automatic = transmission_spec.str.extract(_AUTOMATIC_PATTERN, expand=False)
+        manual = transmission_spec.str.match(_MANUAL_PATTERN)
+        cvt = transmission_spec == "s"
+
+        clutch_type = np.select([dual_clutch.notna(), automatic.notna(), manual, cvt],
+                                ["Dual clutch", "Single plate dry", "Single plate dry", "Continuously Variable"],
+                                "Unknown")
+        gearbox = np.select([dual_clutch.notna(), automatic.notna(), manual, cvt],
+                            ["Automatic", "Automatic", "Manual", "Automatic"], "Unknown")
+        gear = dual_clutch.fillna(automatic).where(~cvt, "1").dropna()
+        # Los dígitos que no son ASCII o los números enormes se transforman aparte
+        gear = batch.keep_valid(gear, matches(gear, r'[0-9]{1,15}'))
+        vehicles = transmission.index.intersection(batch.vehicles())
+        index = transmission.index
+
+        batch.append("Clutch", pd.Series(clutch_type, index=index, dtype=object).loc[vehicles])
+        batch.append("Gearbox", pd.Series(gearbox, index=index, dtype=object).loc[vehicles])
+        batch.append("Gear", gear.astype(np.int64).map(str).astype(object))
+
+    def _process_maximum_speed_batch(self, batch: VehicleBatch):
+        gearbox, vmax = batch.firsts("Gearbox", "19 Vehicle VMax")
+        gearbox = gearbox.str.strip().str.lower()
+        mech = vmax.str.extract(_MECH_SPEED_PATTERN, expand=False)
+        autom = vmax.str.extract(_AUTOM_SPEED_PATTERN, expand=False)
+        maximum_speed = mech.where((gearbox == "manual") & mech.notna(),
+                                   autom.where((gearbox == "automatic") & autom.notna(), "Desconocido"))
+        batch.append("Maximum speed", maximum_speed)
+
+    def _process_emissions_batch(self, batch: VehicleBatch):
+        rows = batch.rows
+        keys = rows["Key"]
+        transmissions = batch.key_mask(lambda keys: keys.str.contains("72 Emissions - Transmission", regex=False))
+        count_transmissions = rows.loc[transmissions, "vehicle"].value_counts()
+        is_emission = batch.key_mask(lambda keys: keys.str.startswith("72 Emissions -"))
+
+        # Un solo grupo: todos los registros de emisiones, salvo el de Transmission
+        single = rows["vehicle"].isin(count_transmissions.index[count_transmissions == 1])
+        single &= is_emission & ~batch.key_mask(lambda keys: keys.str.contains("Transmission", regex=False))
+        single_types = (keys[single].str.replace(_EMISSIONS_PREFIX_PATTERN, "", regex=True)
+                        .str.replace(_PARENTHESIS_SUFFIX_PATTERN, "", regex=True))
+        selected, emission_types = [single], [single_types]
+
+        # Dos grupos: el del sufijo que corresponde al Gearbox
+        gearbox = batch.first("Gearbox", count_transmissions.index[count_transmissions == 2]).str.strip().str.lower()
+        chosen_suffix = pd.Series(np.select([gearbox == "manual", gearbox == "automatic"], ["(mec)", "(autom)"], ""),
+                                  index=gearbox.index)
+        for suffix in ("(mec)", "(autom)", ""):
+            chosen = rows["vehicle"].isin(chosen_suffix.index[chosen_suffix == suffix])
+            chosen &= is_emission & batch.key_mask(lambda keys: keys.str.contains(suffix, regex=False))
+            selected.append(chosen)
+            emission_types.append(keys[chosen].str.replace(_EMISSIONS_PREFIX_PATTERN, "", regex=True)
+                                  .str.replace(suffix, "", regex=False).str.strip())
+
+        new_rows = pd.concat([rows.loc[mask, ["vehicle", "seq", "Value"]] for mask in selected])
+        new_rows["Key"] = "Emissions " + pd.concat(emission_types)
+        new_rows = new_rows.sort_values("seq")
+        batch.append_rows(new_rows["vehicle"].to_numpy(), new_rows["Key"].to_numpy(), new_rows["Value"].to_numpy())
+
+    def _transform_emissions_values_batch(self, batch: VehicleBatch):
+        mask, numbers = batch.floats(batch.key_mask(lambda keys: keys.str.startswith("Emissions")), strict=False)
+        values = batch.rows.loc[mask, "Value"].copy()
+        is_number = numbers.notna()
+        values[is_number] = (numbers[is_number] / 1000).map("{:.4f}".format)
+        values[numbers == 0.0] = "- - - -"
+        batch.set_rows(mask, values)
+
+    def _process_engine_details_batch(self, batch: VehicleBatch):
+        source_key_name = "Working principle"
+        source_value = batch.first(source_key_name)
+        source_value = source_value[(batch.count(source_key_name) == 1).reindex(source_value.index).to_numpy()]
+        parts = source_value[source_value.str.contains("/", regex=False)].str.split("/", regex=False)
+        parts = parts[(parts.str.len() >= 4).to_numpy()]
+        part1 = parts.str[0].str.strip()
+        part3 = parts.str[2].str.strip()
+        part4 = parts.str[3].str.strip()
+
+        # isdigit() acepta dígitos con los que int() falla: esos vehículos se transforman aparte
+        digits = part3.str.isdigit()
+        ascii_digits = matches(part3, r'[0-9]{1,15}')
+        part3 = batch.keep_valid(part3, ~digits | ascii_digits)
+        part1, part4, digits = part1[part3.index], part4[part3.index], digits[part3.index]
+
+        diesel, petrol = part1 == "D", part1 == "B"
+        batch.set(source_key_name, "Common rail", vehicles=part1.index[diesel.to_numpy()])
+        batch.set(source_key_name, "Spark ignition, 4-stroke", vehicles=part1.index[petrol.to_numpy()])
+        batch.append("Fuel", pd.Series(np.where(diesel, "Diesel", "Petrol"), index=part1.index, dtype=object)[diesel | petrol])
+        batch.append("Direct injection",
+                     pd.Series(np.where(part4 == "Reihe-Inj-T", "Yes", "No"), index=part4.index, dtype=object))
+
+        num_cyl = part3[digits].astype(np.int64)
+        cyl_value = part3.copy()
+        cyl_value[digits] = num_cyl.map(str).where(~num_cyl.isin([3, 4, 6]), num_cyl.map("{}, in line".format))
+        batch.append("Number and arrangement of cylinders", cyl_value)
+
+    def _add_missing_keys_batch(self, batch: VehicleBatch):
+        batch.add_missing(self.config.ordered_keys, "None")
 
     def _sort_and_clean(self, df: pd.DataFrame) -> pd.DataFrame:
         """Ordena y limpia el DataFrame final."""
-        df["Key"] = pd.Categorical(
-            df["Key"],
-            categories=self.config.ordered_keys,
-            ordered=True
-        )
-        return df.sort_values("Key").head(70).reset_index(drop=True)
+        return self.schema.sort_frame(df, limit=70)
 
     @staticmethod
     def _get_max_value(value: str) -> str:
@@ -608,78 +466,45 @@ DEFAULT_CONFIG_2 = VehicleDataConfig(
         "26 Design type": "Working principle",
 
     },
-    ordered_keys=[
-        "Number of axles / wheels",
-        "Powered axles",
-        "Wheelbase",
-        "Axle(s) track – 1 / 2",
-        "Length",
-        "Width",
-        "Height",
-        "Rear overhang",
-        "Mass of the vehicle with bodywork in running order",
-        "Technically permissible maximum laden mass",
-        "Distribution of this mass among the axles – 1 / 2",
-        "Technically permissible max mass on each axle – 1 / 2",
-        "Maximum permissible roof load",
-        "Maximum mass of trailer – braked / unbraked",
-        "Maximum mass of combination",
-        "Maximum vertical load at the coupling point for a trailer",
-        "Engine manufacturer",
-        "Engine code as marked on the enginee",
-        "Working principle",
-        "Direct injection",
-        "Pure electric",
-        "Hybrid [electric] vehicle",
-        "Number and arrangement of cylinders",
-        "Capacity",
-        "Fuel",
-        "Maximum net power",
-        "Clutch",
-        "Gearbox",
-        "Gear",
-        "Final drive ratio",
-        "EC type approval mark of couplind device if fitted",
-        "Maximum speed",
-        "Stationary (dB(A)) at engine speed",
-        "Drive by",
-        "Emissions standard",
-        "Exhaust emission",
-        "Emissions CO",
-        "Emissions HC",
-        "Emissions NOx",
-        "Emissions HC NOx",
-        "Emissions particulates",
-        "Smoke",
-        "NEDC CO2 urban conditions",
-        "NEDC CO2 extra-urban conditions",
-        "NEDC CO2 combined",
-        "NEDC Fuel consumption urban conditions",
-        "NEDC Fuel consumption extra-urban conditions",
-        "NEDC Fuel consumption combined",
-        "WLTP CO2 Low",
-        "WLTP CO2 Medium",
-        "WLTP CO2 High",
-        "WLTP CO2 Maximum Value",
-        "WLTP CO2 combined",
-        "WLTP Fuel consumption Low",
-        "WLTP Fuel consumption Medium",
-        "WLTP Fuel consumption High",
-        "WLTP Fuel consumption Maximum Value",
-        "WLTP Fuel consumption combined",
-        "Steering, method of assistance",
-        "Suspension",
-        "Brakes",
-        "Type of body",
-        "Number and configuration of doors",
-        "Number and position of seats",
-        "Make",
-        "Type",
-        "Variant",
-        "Version",
-        "Commercial name",
-        "Homologation number",
-
-    ]
+    ordered_keys=list(HOMOLOGATION_KEYS),
+    rules=[
+        RenameKeys(add_missing=True),
+        # Máximo de cada rango ("1543 - 1549"), en la posición de la primera vía
+        Combine(("Axle(s) track – 1", "Axle(s) track – 2"), ("Axle(s) track – 1 / 2",),
+                part=SplitPart("-", -1), in_place=True),
+        MapValues(("Powered axles",), ValueMap({"All-wheel drive": "2"}, default="1"), from_first=True),
+        # Máximo de cada par ("600 / 1000" -> 1000)
+        Combine(("Braked trailer", "Unbraked trailer"), ("Maximum mass of trailer – braked / unbraked",),
+                part=MaxOfPair("/"), remove_sources=True),
+        Combine(("Distribution of this mass among the axles - 1", "Distribution of this mass among the axles - 2"),
+                ("Distribution of this mass among the axles – 1 / 2",
+                 "Technically permissible max mass on each axle – 1 / 2"),
+                part=MaxOfPair("-"), remove_sources=True),
+        Combine(("Support load",), ("Maximum vertical load at the coupling point for a trailer",),
+                part=MaxOfPair("/"), remove_sources=True),
+        # "VW / DADA / EA211" -> marca y código del motor
+        Derive("Brand / Type", (("Engine manufacturer", SplitPart("/", 0)),
+                                ("Engine code as marked on the enginee", RestParts("/", " / "))),
+               remove_source=True),
+        MapValues(("Maximum net power",), NumberPair("/"), from_first=True),
+        Custom("_process_transmission", reads=("Transmission/IA",), writes=("Clutch", "Gearbox", "Gear"),
+               skip_if_missing=True),
+        # "M6 / 3,389+2,5" -> "3.389"
+        Derive("Transmission/IA", (("Final drive ratio", Chain((SplitPart("/", 1), SplitPart("+", 0),
+                                                                 Replace(",", ".")))),),
+               remove_source=True),
+        # Quita el primer "/" de "/ 869 - 869"
+        MapValues(("Rear overhang",), SplitPart("/", 1, strip=False), from_first=True),
+        Custom("_process_maximum_speed", reads=("Gearbox", "19 Vehicle VMax"), writes=("Maximum speed",),
+               skip_if_missing=True),
+        Custom("_process_emissions", reads=("72 Emissions -*", "Gearbox"), writes=("Emissions *",),
+               repeats_keys=True),
+        Custom("_transform_emissions_values", reads=("Emissions*",), writes=("Emissions*",)),
+        # Primer número en caso de rango
+        MapValues(("Length", "Width", "Height", "Rear overhang"), SplitPart(" - ", 0, skip_na=True)),
+        Custom("_process_engine_details", reads=("Working principle",),
+               writes=("Working principle", "Fuel", "Direct injection", "Number and arrangement of cylinders"),
+               skip_if_missing=True),
+    ],
 )
 
@@ -1,122 +1,68 @@
 import pandas as pd
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+from dataclasses import dataclass, field
 import re
 
+from .transform_plan import Combine, RenameKeys, Rule, SplitPart, compile_plan
+from .schema import HOMOLOGATION_KEYS, get_schema
+from .step_metrics import measure_step, transform_report
+from .vehicle_batch import VehicleBatch, transform_batch
+from .vehicle_record import VehicleRecord
+
 @dataclass
 class VehicleDataConfig:
     """Configuración para la transformación de datos del vehículo."""
     column_mapping: Dict[str, str]
     ordered_keys: List[str]
+    # Pasos de la transformación como reglas declarativas (ver transform_plan)
+    rules: List[Rule] = field(default_factory=list)
 
 class VehicleDataTransformer_site3:
     """Clase para transformar datos de vehículos."""
 
+    # Versión de la transformación: incrementarla al cambiarla invalida los resultados memorizados
+    VERSION = 1
+
     def __init__(self, config: VehicleDataConfig):
         self.config = config
+        # Plan compilado una vez por configuración y compartido entre instancias e hilos
+        self.plan = compile_plan(config, type(self))
+        # Esquema de slots internado: los tres sitios comparten el mismo si sus claves coinciden
+        self.schema = get_schema(config.ordered_keys)
 
-    def transform(self, df_input: pd.DataFrame) -> pd.DataFrame:
-        """Método principal que orquesta la transformación de datos."""
-        df = df_input.copy()
-        df = self._rename_columns(df)
-        df = self._create_suspension(df)
-        df = self._create_brakes(df)
-
-
-
-
-
-        df = self._add_missing_keys(df)
-        df = self._sort_and_clean(df)
-        return df
-
-    def _rename_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Renombra las columnas según el mapeo configurado."""
-        df["Key"] = df["Key"].map(lambda x: self.config.column_mapping.get(x, x))
-        return df
-    
-
-    def _create_suspension(self, df: pd.DataFrame) -> pd.DataFrame:
-        
-            if "Front suspension" in df["Key"].values and "Rear suspension" in df["Key"].values:
-                front_val = df[df["Key"] == "Front suspension"]["Value"].values[0].split("-")[0].strip()
-                rear_val = df[df["Key"] == "Rear suspension"]["Value"].values[0].split("-")[0].strip()
-
-                
-                new_row = pd.DataFrame({
-                    "Key": ["Suspension"],
-                    "Value": [f"{front_val}/{rear_val}"]
-                })
-
-            else:
-            
-                new_row = pd.DataFrame({
-                        "Key": ["Suspension"],
-                        "Value": [f"Independent type McPherson/Semi independent multilink"]
-                    })
-                    
-
-            df = pd.concat([df, new_row], ignore_index=True)  
-
-            
-
-            return df
-
-
-    def _create_brakes(self, df: pd.DataFrame) -> pd.DataFrame:
-            
-                if "Front brakes" in df["Key"].values and "Rear brakes" in df["Key"].values:
-                    front_val = df[df["Key"] == "Front brakes"]["Value"].values[0]
-                    rear_val = df[df["Key"] == "Rear brakes"]["Value"].values[0]
-
-                    
-                    new_row = pd.DataFrame({
-                        "Key": ["Brakes"],
-                        "Value": [f"{front_val}/{rear_val}"]
-                    })
-
-                else:
-                
-                    new_row = pd.DataFrame({
-                            "Key": ["Brakes"],
-                            "Value": [f"Ventilated discs/Ventilated discs"]
-                        })
-                        
-
-                df = pd.concat([df, new_row], ignore_index=True)  
-
-                
-
-                return df
-
-
-
-
+    def transform(self, df_input: pd.DataFrame, keys: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Método principal que orquesta la transformación de datos (sobre un `VehicleRecord`).
+        Con `keys` solo se ejecutan los pasos necesarios para esas claves (ver `TransformPlan.run`).
+        """
+        record = VehicleRecord.from_frame(df_input)
+        with transform_report(self, "record"):
+            self.plan.run(self, record, keys)
 
+            with measure_step("_add_missing_keys", record.__len__):
+                self._add_missing_keys(record)
+            with measure_step("_sort_and_clean", record.__len__):
+                return self._sort_and_clean(record.to_frame())
 
+    def transform_many(self, df_input: pd.DataFrame, keys: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Transforma muchos vehículos a la vez a partir de un DataFrame largo con columnas
+        vehicle_id, Key y Value (ver `transform_batch`).
+        """
+        return transform_batch(self, df_input, self.plan.batch_steps(self, keys), keys=keys)
 
-    def _add_missing_keys(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _add_missing_keys(self, record: VehicleRecord):
         """Añade información sobre claves faltantes, asegurando que se incluyan todas las ordered_keys."""
-        missing_rows = [
-            {"Key": key, "Value": "None"}
-            for key in self.config.ordered_keys if key not in df["Key"].values
-        ]
-        if missing_rows:
-            df = pd.concat([df, pd.DataFrame(missing_rows)], ignore_index=True)
-        return df
-
+        record.add_missing(self.config.ordered_keys, "None")
 
+    def _add_missing_keys_batch(self, batch: VehicleBatch):
+        batch.add_missing(self.config.ordered_keys, "None")
 
     def _sort_and_clean(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Ordena y limpia el DataFrame final, manteniendo solo las primeras 59 filas.
         """
-        df["Key"] = pd.Categorical(
-            df["Key"],
-            categories=self.config.ordered_keys,
-            ordered=True
-        )
-        return df.sort_values("Key").head(70).reset_index(drop=True)
+        return self.schema.sort_frame(df, limit=70)
 
     @staticmethod
     def _get_max_value(value: str) -> str:
@@ -153,80 +99,13 @@ DEFAULT_CONFIG_3 = VehicleDataConfig(
 
 
     },
-    ordered_keys=[
-        "Number of axles / wheels",
-        "Powered axles",
-        "Wheelbase",
-        "Axle(s) track – 1 / 2",
-        "Length",
-        "Width",
-        "Height",
-        "Rear overhang",
-        "Mass of the vehicle with bodywork in running order",
-        "Technically permissible maximum laden mass",
-        "Distribution of this mass among the axles – 1 / 2",
-        "Technically permissible max mass on each axle – 1 / 2",
-        "Maximum permissible roof load",
-        "Maximum mass of trailer – braked / unbraked",
-        "Maximum mass of combination",
-        "Maximum vertical load at the coupling point for a trailer",
-        "Engine manufacturer",
-        "Engine code as marked on the enginee",
-        "Working principle",
-        "Direct injection",
-        "Pure electric",
-        "Hybrid [electric] vehicle",
-        "Number and arrangement of cylinders",
-        "Capacity",
-        "Fuel",
-        "Maximum net power",
-        "Clutch",
-        "Gearbox",
-        "Gear",
-        "Final drive ratio",
-        "EC type approval mark of couplind device if fitted",
-        "Maximum speed",
-        "Stationary (dB(A)) at engine speed",
-        "Drive by",
-        "Emissions standard",
-        "Exhaust emission",
-        "Emissions CO",
-        "Emissions HC",
-        "Emissions NOx",
-        "Emissions HC NOx",
-        "Emissions particulates",
-        "Smoke",
-        "NEDC CO2 urban conditions",
-        "NEDC CO2 extra-urban conditions",
-        "NEDC CO2 combined",
-        "NEDC Fuel consumption urban conditions",
-        "NEDC Fuel consumption extra-urban conditions",
-        "NEDC Fuel consumption combined",
-        "WLTP CO2 Low",
-        "WLTP CO2 Medium",
-        "WLTP CO2 High",
-        "WLTP CO2 Maximum Value",
-        "WLTP CO2 combined",
-        "WLTP Fuel consumption Low",
-        "WLTP Fuel consumption Medium",
-        "WLTP Fuel consumption High",
-        "WLTP Fuel consumption Maximum Value",
-        "WLTP Fuel consumption combined",
-        "Steering, method of assistance",
-        "Suspension",
-        "Brakes",
-        "Type of body",
-        "Number and configuration of doors",
-        "Number and position of seats",
-        "Make",
-        "Type",
-        "Variant",
-        "Version",
-        "Commercial name",
-        "Homologation number",
-
-
-    ]
+    ordered_keys=list(HOMOLOGATION_KEYS),
+    rules=[
+        RenameKeys(),
+        Combine(("Front suspension", "Rear suspension"), ("Suspension",), part=SplitPart("-", 0),
+                default="Independent type McPherson/Semi independent multilink"),
+        Combine(("Front brakes", "Rear brakes"), ("Brakes",), default="Ventilated discs/Ventilated discs"),
+    ],
 )
 
 
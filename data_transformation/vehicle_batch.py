@@ -0,0 +1,370 @@
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .schema import VehicleSchema
+from .step_metrics import measure_step, transform_report
+
+# Números que float() convierte sin ambigüedad (solo dígitos ASCII). Para ellos astype(float)
+# sobre la columna da exactamente el mismo resultado que float() valor a valor.
+SAFE_FLOAT = r'[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?'
+# Textos que float() quizá acepte por otras vías (espacios, "inf", "nan", dígitos Unicode, "1_0"):
+# esos vehículos se transforman uno a uno para no depender de las diferencias de cada parser.
+# Lo que no encaja aquí seguro que no es un número para float().
+MAYBE_FLOAT = r'\s*[+-]?(?:(?=[\d_.]*\d)[\d_]*\.?[\d_]*(?:e[+-]?[\d_]+)?|inf(?:inity)?|nan)\s*'
+# Enteros que int() convierte sin ambigüedad y que caben holgadamente en int64
+SAFE_INT = r' *[+-]?[0-9]{1,15} *'
+# Mayor entero con el que int(float(x)) y astype(int64) coinciden con holgura
+SAFE_INT_LIMIT = 1e15
+
+
+def matches(values: pd.Series, pattern) -> pd.Series:
+    """str.fullmatch como máscara booleana (False para los valores que no son texto)."""
+    return values.astype(object).str.fullmatch(pattern, na=False)
+
+
+def as_mask(values: pd.Series, default: bool = False) -> pd.Series:
+    """Máscara booleana a partir de una serie con faltantes (NaN o None toman `default`)."""
+    return values.astype("boolean").fillna(default).astype(bool)
+
+
+class VehicleBatch:
+    """
+    Equivalente a `VehicleRecord` para muchos vehículos a la vez, en formato largo.
+
+    Las filas de todos los vehículos están en un único DataFrame (vehicle, seq, Key, Value)
+    ordenado por `seq`, de modo que el orden de filas de cada vehículo es el mismo que
+    tendría su `VehicleRecord`. Cada operación se aplica a todos los vehículos con una
+    sola operación de columna; `vehicles` permite limitarla a un subconjunto.
+
+    Los vehículos cuyos valores no se pueden tratar de forma vectorizada con garantías
+    (p. ej. un número que float() aceptaría pero la validación no) se apartan con
+    `exclude` y después se transforman individualmente con `transform`.
+    """
+
+    def __init__(self, vehicles: np.ndarray, keys: Sequence, values: Sequence):
+        self.rows = pd.DataFrame({
+            "vehicle": np.asarray(vehicles, dtype=np.int64),
+            "seq": np.arange(len(keys), dtype=np.int64),
+            "Key": pd.Series(keys, dtype=object).to_numpy(),
+            "Value": pd.Series(values, dtype=object).to_numpy(),
+        })
+        self._next_seq = len(keys)
+        self.excluded = set()
+        # Vehículos del lote aunque se queden sin filas (p. ej. al filtrar claves), como un
+        # VehicleRecord vacío que aún recibe las claves que faltan
+        self._vehicles = np.unique(self.rows["vehicle"].to_numpy())
+
+    # --- consultas -------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        """Número de filas vigentes del lote."""
+        return len(self.rows)
+
+    def vehicles(self) -> pd.Index:
+        vehicles = self._vehicles
+        if self.excluded:
+            vehicles = vehicles[~np.isin(vehicles, list(self.excluded))]
+        return pd.Index(vehicles)
+
+    def mask(self, key, vehicles: Optional[Iterable[int]] = None) -> pd.Series:
+        """Filas con la clave dada (y, si se indica, de esos vehículos)."""
+        mask = self.rows["Key"] == key
+        if vehicles is not None:
+            mask &= self.rows["vehicle"].isin(vehicles)
+        return mask
+
+    def key_mask(self, predicate: Callable[[pd.Series], pd.Series]) -> pd.Series:
+        """Filas cuya clave cumple `predicate` (evaluado una vez por clave distinta)."""
+        keys = pd.Series(pd.unique(self.rows["Key"].to_numpy()), dtype=object)
+        selected = keys[as_mask(predicate(keys)).to_numpy()]
+        return self.rows["Key"].isin(selected)
+
+    def has_any(self, keys) -> bool:
+        """True si algún vehículo tiene alguna fila con alguna de las claves."""
+        return bool(self.rows["Key"].isin(keys).any())
+
+    def has(self, key) -> pd.Index:
+        """Vehículos que tienen al menos una fila con la clave."""
+        return pd.Index(self.rows.loc[self.mask(key), "vehicle"].unique())
+
+    def count(self, key) -> pd.Series:
+        """Número de filas con la clave por vehículo (0 si no la tiene)."""
+        counts = self.rows.loc[self.mask(key), "vehicle"].value_counts()
+        return counts.reindex(self.vehicles(), fill_value=0)
+
+    def first(self, key, vehicles: Optional[Iterable[int]] = None) -> pd.Series:
+        """Valor de la primera fila con la clave, indexado por vehículo."""
+        rows = self.rows.loc[self.mask(key, vehicles), ["vehicle", "Value"]]
+        rows = rows.drop_duplicates("vehicle")
+        return pd.Series(rows["Value"].to_numpy(), index=rows["vehicle"].to_numpy(), dtype=object)
+
+    def firsts(self, *keys) -> List[pd.Series]:
+        """Primer valor de cada clave, solo para los vehículos que tienen todas."""
+        values = [self.first(key) for key in keys]
+        common = values[0].index
+        for series in values[1:]:
+            common = common.intersection(series.index)
+        return [series.loc[common] for series in values]
+
+    # --- modificaciones ----------------------------------------------------------------
+
+    def append(self, key, values: pd.Series):
+        """Añade al final una fila con la clave por cada vehículo de `values` (índice = vehículo)."""
+        self.append_rows(values.index.to_numpy(), np.full(len(values), key, dtype=object),
+                         values.to_numpy())
+
+    def append_rows(self, vehicles, keys, values):
+        """Añade filas al final, en el orden dado."""
+        vehicles = np.asarray(vehicles, dtype=np.int64)
+        if self.excluded:
+            # Los vehículos apartados ya no reciben filas
+            keep = ~np.isin(vehicles, list(self.excluded))
+            vehicles, keys, values = vehicles[keep], np.asarray(keys, dtype=object)[keep], as_objects(values)[keep]
+        count = len(vehicles)
+        if not count:
+            return
+        new_rows = pd.DataFrame({
+            "vehicle": np.asarray(vehicles, dtype=np.int64),
+            "seq": np.arange(self._next_seq, self._next_seq + count, dtype=np.int64),
+            "Key": pd.Series(keys, dtype=object).to_numpy(),
+            "Value": as_objects(values),
+        })
+        self._next_seq += count
+        self.rows = pd.concat([self.rows, new_rows], ignore_index=True)
+
+    def set(self, key, values, vehicles: Optional[Iterable[int]] = None):
+        """
+        Asigna el valor a todas las filas con la clave. `values` es un escalar o una
+        Serie indexada por vehículo (solo se modifican los vehículos que aparecen en ella).
+        """
+        if isinstance(values, pd.Series):
+            vehicles = values.index if vehicles is None else values.index.intersection(vehicles)
+            mask = self.mask(key, vehicles)
+            self.set_rows(mask, self.rows.loc[mask, "vehicle"].map(values))
+        else:
+            mask = self.mask(key, vehicles)
+            self.rows.loc[mask, "Value"] = values
+
+    def set_all(self, values):
+        """Reemplaza los valores de todas las filas (alineados con `rows`)."""
+        self.rows["Value"] = as_objects(values)
+
+    def set_rows(self, mask: pd.Series, values):
+        """Asigna valores (alineados con las filas de `mask`) conservando los objetos Python."""
+        if mask.any():
+            self.rows.loc[mask, "Value"] = as_objects(values)
+
+    def update(self, key, func: Callable[[pd.Series], pd.Series], vehicles: Optional[Iterable[int]] = None):
+        """Reemplaza los valores de las filas con la clave por func(valores)."""
+        mask = self.mask(key, vehicles)
+        if mask.any():
+            self.set_rows(mask, func(self.rows.loc[mask, "Value"]))
+
+    def remove(self, *keys, vehicles: Optional[Iterable[int]] = None):
+        """Elimina las filas con alguna de las claves (de todos los vehículos o de `vehicles`)."""
+        mask = self.rows["Key"].isin(keys)
+        if vehicles is not None:
+            mask &= self.rows["vehicle"].isin(vehicles)
+        if mask.any():
+            self.rows = self.rows.loc[~mask]
+
+    def keep_keys(self, keys):
+        """Elimina las filas cuya clave no está en `keys`."""
+        keep = self.rows["Key"].isin(list(keys))
+        if not keep.all():
+            self.rows = self.rows.loc[keep]
+
+    def rename(self, key, new_key, vehicles: Optional[Iterable[int]] = None):
+        mask = self.mask(key, vehicles)
+        if mask.any():
+            self.rows.loc[mask, "Key"] = new_key
+
+    def rename_keys(self, mapping: Dict):
+        """Aplica un mapeo de claves a todas las filas (las claves sin mapeo se conservan)."""
+        keys = self.rows["Key"]
+        mapped = keys.isin(list(mapping))
+        if mapped.any():
+            self.rows.loc[mapped, "Key"] = keys[mapped].map(mapping).to_numpy()
+
+    def add_missing(self, keys: Sequence, value="None"):
+        """
+        Añade, para cada vehículo, una fila con `value` por cada clave de `keys` que no tenía
+        (en el orden de `keys`), como `VehicleRecord.add_missing`.
+        """
+        keys = list(keys)
+        vehicles = self.vehicles().to_numpy()
+        if not keys or not len(vehicles):
+            return
+        # Matriz vehículo × clave con las claves presentes (los vehículos son códigos 0..n-1)
+        unique_keys = pd.unique(np.array(keys, dtype=object))
+        key_codes = pd.Categorical(self.rows["Key"].to_numpy(), categories=unique_keys).codes
+        known = key_codes >= 0
+        present = np.zeros((self._vehicles.max() + 1, len(unique_keys)), dtype=bool)
+        present[self.rows["vehicle"].to_numpy()[known], key_codes[known]] = True
+
+        columns = pd.Index(unique_keys).get_indexer(keys)
+        missing = ~present[vehicles][:, columns]
+        rows, positions = np.nonzero(missing)
+        self.append_rows(vehicles[rows], np.array(keys, dtype=object)[positions],
+                         np.full(len(rows), value, dtype=object))
+
+    def exclude(self, vehicles: Iterable[int]):
+        """Aparta vehículos del lote: se transformarán individualmente."""
+        vehicles = set(vehicles)
+        if vehicles:
+            self.excluded |= vehicles
+            self.rows = self.rows.loc[~self.rows["vehicle"].isin(vehicles)]
+
+    def keep_valid(self, values: pd.Series, valid: pd.Series) -> pd.Series:
+        """Aparta los vehículos (índice de `values`) cuyo `valid` es False y retorna el resto."""
+        valid = as_mask(valid)
+        self.exclude(values.index[~valid.to_numpy()])
+        return values[valid.to_numpy()]
+
+    def exclude_rows(self, mask: pd.Series):
+        """Aparta los vehículos de las filas marcadas."""
+        if mask.any():
+            self.exclude(self.rows.loc[mask, "vehicle"].unique())
+
+    def align(self, mask: pd.Series) -> pd.Series:
+        """Ajusta una máscara de filas a las filas vigentes (las nuevas quedan en False)."""
+        return mask.reindex(self.rows.index, fill_value=False)
+
+    def floats(self, selector, prepare: Callable[[pd.Series], pd.Series] = None, strict: bool = True):
+        """
+        Convierte a float los valores de las filas seleccionadas (una clave o una máscara),
+        tras aplicarles `prepare`.
+
+        Con `strict` (donde float() lanzaría una excepción) se apartan los vehículos con algún
+        valor que no sea un número inequívoco. Sin `strict` solo se apartan los dudosos y los
+        textos no numéricos quedan como NaN. Retorna (máscara, números) de las filas vigentes.
+        """
+        def parse():
+            mask = self.mask(selector) if not isinstance(selector, pd.Series) else self.align(selector)
+            text = self.rows.loc[mask, "Value"]
+            if prepare is not None:
+                text = prepare(text)
+            safe = matches(text, SAFE_FLOAT)
+            return mask, text, safe
+
+        mask, text, safe = parse()
+        doubtful = ~safe
+        if not strict:
+            doubtful &= text.astype(object).str.fullmatch(MAYBE_FLOAT, case=False, na=True)
+        if doubtful.any():
+            self.exclude_rows(self.align(doubtful))
+            mask, text, safe = parse()
+        return mask, text.where(safe).astype(float)
+
+    def sorted_frame(self, schema: VehicleSchema, limit: int = 70) -> pd.DataFrame:
+        """
+        Ordena las filas de cada vehículo por slot del esquema como `_sort_and_clean`: mismo
+        orden, incluso entre claves repetidas, y como mucho `limit` filas.
+        """
+        rows = self.rows
+        codes = schema.codes(rows["Key"].to_numpy())
+        vehicles = rows["vehicle"].to_numpy()
+        # Fuera del esquema van al final en su orden; el resto, por slot
+        sort_codes = np.where(codes < 0, len(schema), codes).astype(np.int64)
+        order = np.lexsort((np.arange(len(rows)), sort_codes, vehicles))
+
+        # sort_values usa quicksort, que no es estable: si un vehículo tiene claves repetidas
+        # se reproduce exactamente su ordenación con el mismo algoritmo
+        repeated = pd.DataFrame({"vehicle": vehicles, "code": codes})
+        repeated = repeated[(codes >= 0) & repeated.duplicated(["vehicle", "code"], keep=False)]
+        if len(repeated):
+            positions = pd.Series(np.arange(len(order)))
+            order_vehicles = vehicles[order]
+            for vehicle in repeated["vehicle"].unique():
+                own = np.flatnonzero(vehicles == vehicle)
+                own_codes = codes[own]
+                exact = own[schema.order(own_codes)]
+                slots = positions[order_vehicles == vehicle].to_numpy()
+                order[slots] = exact
+
+        result = pd.DataFrame({
+            "vehicle": vehicles[order],
+            "Key": schema.categorical(codes[order]),
+            "Value": rows["Value"].to_numpy()[order],
+        })
+        if limit is not None:
+            result = result[result.groupby("vehicle", sort=False).cumcount() < limit]
+        return result.reset_index(drop=True)
+
+
+def as_objects(values) -> np.ndarray:
+    """Array de objetos Python (int/float nativos, no escalares de NumPy), como en VehicleRecord."""
+    if isinstance(values, pd.Series):
+        values = values.to_numpy()
+    values = np.asarray(values)
+    if values.dtype != object:
+        values = values.astype(object)
+    return values
+
+
+def transform_batch(transformer, df_input: pd.DataFrame, steps: Sequence[Callable[[VehicleBatch], None]],
+                    text_values: bool = True, keys: Optional[Iterable] = None) -> pd.DataFrame:
+    """
+    Aplica `steps` de forma vectorizada a un DataFrame largo (vehicle_id, Key, Value).
+
+    Cada vehículo del resultado tiene exactamente las filas que devolvería
+    transformer.transform() con sus pares Key/Value. Los vehículos apartados durante el
+    lote se transforman uno a uno; si fallan, se omiten y su error queda en
+    attrs['failed_vehicles'] ({vehicle_id: mensaje}).
+
+    Con `text_values` se apartan desde el principio los vehículos con valores que no son
+    texto (los pasos vectorizados asumen cadenas, como las que produce el scraper).
+    `keys` son las claves pedidas con las que se construyeron los pasos; los vehículos
+    apartados se transforman con las mismas.
+    """
+    missing = {"vehicle_id", "Key", "Value"} - set(df_input.columns)
+    if missing:
+        raise ValueError(f"Faltan columnas en el DataFrame de entrada: {sorted(missing)}")
+    if df_input["vehicle_id"].isna().any():
+        raise ValueError("vehicle_id no puede contener valores nulos")
+
+    codes, vehicle_ids = pd.factorize(df_input["vehicle_id"], sort=False)
+    batch = VehicleBatch(codes, df_input["Key"].to_numpy(), df_input["Value"].to_numpy())
+
+    # Claves que no son texto, o valores que no lo son cuando los pasos lo requieren
+    not_text = ~batch.rows["Key"].map(lambda key: isinstance(key, str))
+    if text_values:
+        not_text |= ~batch.rows["Value"].map(lambda value: isinstance(value, str))
+    batch.exclude_rows(not_text)
+
+    schema = transformer.schema
+    with transform_report(transformer, "batch"):
+        for step in steps:
+            if batch.rows.empty:
+                break
+            step(batch)
+        with measure_step("_add_missing_keys_batch", batch.__len__):
+            transformer._add_missing_keys_batch(batch)
+        with measure_step("sorted_frame", batch.__len__):
+            frames = [batch.sorted_frame(schema)]
+
+    # Vehículos apartados: misma transformación, uno a uno
+    failed = {}
+    if batch.excluded:
+        pairs_input = df_input[["Key", "Value"]].reset_index(drop=True)
+        positions = pd.Series(np.arange(len(codes)))[np.isin(codes, list(batch.excluded))]
+        for vehicle, vehicle_positions in positions.groupby(codes[positions.to_numpy()]):
+            pairs = pairs_input.iloc[vehicle_positions.to_numpy()].reset_index(drop=True)
+            try:
+                result = transformer.transform(pairs, keys=keys)
+            except Exception as e:
+                failed[vehicle_ids[vehicle]] = str(e) or type(e).__name__
+                continue
+            result.insert(0, "vehicle", vehicle)
+            frames.append(result)
+
+    result = pd.concat(frames, ignore_index=True)
+    # Vehículos en el orden de entrada (mergesort: estable, conserva el orden de cada uno)
+    result = result.iloc[np.argsort(result["vehicle"].to_numpy(), kind="mergesort")]
+    result.insert(0, "vehicle_id", vehicle_ids.take(result["vehicle"].to_numpy()))
+    result = result.drop(columns="vehicle").reset_index(drop=True)
+    result["Key"] = result["Key"].astype(schema.dtype)
+    result.attrs["failed_vehicles"] = failed
+    return result
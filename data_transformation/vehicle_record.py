@@ -0,0 +1,139 @@
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import pandas as pd
+
+# Marca de fila eliminada: las posiciones no se reutilizan para conservar el orden
+_DELETED = object()
+
+
+class VehicleRecord:
+    """
+    Registro ordenado clave→valor de un vehículo, para transformar sin reconstruir DataFrames.
+
+    Conserva el orden de las filas igual que lo haría el DataFrame equivalente:
+    - `append` añade al final (como un pd.concat de una fila),
+    - `remove` deja la posición vacía (como un filtrado con máscara),
+    - `set` y `rename` modifican en sitio todas las filas con esa clave (como df.loc[mask]).
+
+    Las claves pueden repetirse; `get` devuelve la primera, igual que
+    df[df["Key"] == key]["Value"].values[0]. Cada clave tiene un índice con sus
+    posiciones, por lo que buscar, comprobar y modificar cuesta O(1) por fila afectada.
+    """
+
+    __slots__ = ("_keys", "_values", "_index")
+
+    def __init__(self, pairs: Iterable[Tuple[Any, Any]] = ()):
+        self._keys: List[Any] = []
+        self._values: List[Any] = []
+        self._index: Dict[Any, List[int]] = {}
+        for key, value in pairs:
+            self.append(key, value)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "VehicleRecord":
+        return cls(zip(df["Key"].tolist(), df["Value"].tolist()))
+
+    def to_frame(self) -> pd.DataFrame:
+        """Construye el único DataFrame de la transformación, con columnas Key/Value de tipo object."""
+        keys, values = [], []
+        for key, value in self.items():
+            keys.append(key)
+            values.append(value)
+        return pd.DataFrame({"Key": pd.Series(keys, dtype=object), "Value": pd.Series(values, dtype=object)})
+
+    def __contains__(self, key) -> bool:
+        return bool(self._index.get(key))
+
+    def __len__(self) -> int:
+        return sum(len(positions) for positions in self._index.values())
+
+    def keys(self) -> Iterator[Any]:
+        return (key for key, _ in self.items())
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        """Pares (clave, valor) vigentes, en orden de fila."""
+        for key, value in zip(self._keys, self._values):
+            if key is not _DELETED:
+                yield key, value
+
+    def get(self, key, default=None):
+        """Valor de la primera fila con la clave dada."""
+        positions = self._index.get(key)
+        return self._values[positions[0]] if positions else default
+
+    def get_all(self, key) -> List[Any]:
+        """Valores de todas las filas con la clave dada, en orden de fila."""
+        return [self._values[position] for position in self._index.get(key, ())]
+
+    def count(self, key) -> int:
+        return len(self._index.get(key, ()))
+
+    def append(self, key, value):
+        self._index.setdefault(key, []).append(len(self._keys))
+        self._keys.append(key)
+        self._values.append(value)
+
+    def set(self, key, value):
+        """Asigna el valor a todas las filas con la clave dada."""
+        for position in self._index.get(key, ()):
+            self._values[position] = value
+
+    def update(self, key, func):
+        """Reemplaza el valor de todas las filas con la clave dada por func(valor)."""
+        for position in self._index.get(key, ()):
+            self._values[position] = func(self._values[position])
+
+    def map_values(self, func):
+        """Reemplaza el valor de todas las filas por func(valor)."""
+        for position, key in enumerate(self._keys):
+            if key is not _DELETED:
+                self._values[position] = func(self._values[position])
+
+    def remove(self, *keys):
+        """Elimina todas las filas con alguna de las claves dadas."""
+        for key in keys:
+            for position in self._index.pop(key, ()):
+                self._keys[position] = _DELETED
+                self._values[position] = None
+
+    def keep_keys(self, keys):
+        """Elimina todas las filas cuya clave no está en `keys`."""
+        self.remove(*[key for key in self._index if key not in keys])
+
+    def blank_keys(self, keys, value: Any = None):
+        """Asigna `value` a todas las filas cuya clave no está en `keys`, sin eliminarlas."""
+        for key, positions in self._index.items():
+            if key not in keys:
+                for position in positions:
+                    self._values[position] = value
+
+    def has_repeated_keys(self) -> bool:
+        """True si alguna clave está en más de una fila."""
+        return any(len(positions) > 1 for positions in self._index.values())
+
+    def rename(self, key, new_key):
+        """Cambia la clave de todas las filas con `key`, sin moverlas de sitio."""
+        positions = self._index.pop(key, None)
+        if not positions or key == new_key:
+            if positions:
+                self._index[key] = positions
+            return
+        for position in positions:
+            self._keys[position] = new_key
+        existing = self._index.get(new_key)
+        self._index[new_key] = sorted(existing + positions) if existing else positions
+
+    def rename_keys(self, mapping: Dict[Any, Any]):
+        """Aplica un mapeo de claves a todas las filas (las claves sin mapeo se conservan)."""
+        pairs = list(self.items())
+        self.__init__((mapping.get(key, key), value) for key, value in pairs)
+
+    def add_missing(self, keys: Iterable[Any], value: Any = "None") -> List[Any]:
+        """
+        Añade al final una fila con `value` por cada clave que no estaba en el registro
+        antes de la llamada (una clave repetida en `keys` se añade tantas veces como aparezca).
+        """
+        missing = [key for key in keys if key not in self]
+        for key in missing:
+            self.append(key, value)
+        return missing
@@ -7,6 +7,26 @@ from odf.text import Span
 import io
 import re
 
+# Plantilla ODT de cada idioma, relativa a la raíz del proyecto
+TEMPLATES_BY_LANGUAGE = {
+    'Inglés': "utils/planillaIngles.odt",
+    'Alemán': "utils/planillaAleman.odt",
+    'Italiano': "utils/planillaItaliano.odt",
+    'Francés': "utils/planillaFrances.odt",
+    'Holandés': "utils/planillaHolandes.odt",
+    'Portugués': "utils/planillaPortugues.odt",
+    'Polaco': "utils/planillaPolaco.odt",
+    'Checo': "utils/planillaCheco.odt",
+    'Rumano': "utils/planillaRumania.odt",
+}
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def template_path(language):
+    """Ruta absoluta de la plantilla de `language`, sin depender del directorio de trabajo."""
+    return os.path.join(PROJECT_DIR, TEMPLATES_BY_LANGUAGE[language])
+
+
 class ODTExporter:
     def __init__(self, template_path):
         self.template_path = template_path
@@ -57,6 +77,18 @@ class ODTExporter:
             print(f"Error al buscar marcadores en ODT: {repr(e)}")
             return None
             
+    def fields_in_template(self, keys):
+        """
+        Claves de `keys` (en el orden de la planilla: {{B1}} es keys[0]) cuyos marcadores
+        aparecen en la plantilla, para transformar solo esos campos.
+        Devuelve None si no se pueden leer los marcadores.
+        """
+        markers = self.find_markers_in_odt()
+        if markers is None:
+            return None
+        positions = {int(re.search(r'B(\d+)', marker).group(1)) for marker in markers}
+        return [key for position, key in enumerate(keys, start=1) if position in positions]
+
     def export_to_odt(self, df):
         """
         Procesa el DataFrame y genera un ODT con los valores reemplazados.
@@ -1,135 +1,23 @@
+import time
+
 import pandas as pd
 import streamlit as st
 from st_aggrid import AgGrid, GridUpdateMode, GridOptionsBuilder
 
-# Importaciones de los sitios existentes
-from scraping.scraping_site_1 import Site1Scraper
-from scraping.scraping_site_2 import Site2Scraper
-from data_transformation.transform_site1 import VehicleDataTransformer_site1, DEFAULT_CONFIG_1
-from data_transformation.transform_site2 import VehicleDataTransformer_site2, DEFAULT_CONFIG_2
+# El procesamiento (scraping, transformación y combinación) no depende de Streamlit
+from data_processor import DataProcessor, TRANSMISSION_OPTIONS
+from data_transformation.site_merge import merge_sites
 
-# --- NUEVO: Importaciones para el Sitio 3 ---
-from scraping.scraping_site_3 import Site3Scraper
-from data_transformation.transform_site3 import VehicleDataTransformer_site3, DEFAULT_CONFIG_3
-# --- FIN NUEVO ---
+from exportToFile import ODTExporter, TEMPLATES_BY_LANGUAGE
 
-from exportToFile import ODTExporter
 
-class DataProcessor:
+@st.cache_resource
+def get_processor():
     """
-    Clase para manejar el procesamiento y transformación de datos de vehículos
+    DataProcessor compartido por todas las sesiones del servidor: sus scrapers, transformadores
+    y la caché de resultados siguen calientes entre clics y entre operadores.
     """
-    def __init__(self):
-        self.site1_scraper = Site1Scraper()
-        self.site2_scraper = Site2Scraper()
-        # --- NUEVO: Inicializar scraper y transformer para Sitio 3 ---
-        self.site3_scraper = Site3Scraper()
-        # --- FIN NUEVO ---
-
-        self.transformer_site1 = VehicleDataTransformer_site1(DEFAULT_CONFIG_1)
-        self.transformer_site2 = VehicleDataTransformer_site2(DEFAULT_CONFIG_2)
-        # --- NUEVO: ---
-        self.transformer_site3 = VehicleDataTransformer_site3(DEFAULT_CONFIG_3)
-        # --- FIN NUEVO ---
-
-    def process_url(self, url, site_number, transmission_manual=None):
-        """Procesa una URL y retorna los datos transformados."""
-        try:
-            if site_number == 1:
-                data = self.site1_scraper.scrape(url)
-                return self.transformer_site1.transform(data)
-            elif site_number == 2: # <--- Cambiado de else a elif
-                # Solo para el site 2 se utiliza el parámetro transmission_manual.
-                data = self.site2_scraper.scrape(url, transmission_manual)
-                return self.transformer_site2.transform(data)
-            # --- NUEVO: Condición para Sitio 3 ---
-            elif site_number == 3:
-                data = self.site3_scraper.scrape(url)
-                return self.transformer_site3.transform(data)
-            # --- FIN NUEVO ---
-            else:
-                st.error(f"Número de sitio desconocido: {site_number}")
-                return None
-        except Exception as e:
-            st.error(f"Error al procesar el Sitio {site_number} ({url}): {e}")
-            return None
-
-    @staticmethod
-    def merge_dataframes(df1: pd.DataFrame | None, df2: pd.DataFrame | None, df3: pd.DataFrame | None) -> pd.DataFrame | None:
-        """
-        Combina hasta tres DataFrames manteniendo el orden original de df1
-        y priorizando los valores (Sitio 2 > Sitio 1 > Sitio 3).
-        """
-        # Crear una lista de dataframes no nulos
-        dfs = [df for df in [df1, df2, df3] if df is not None]
-
-        if not dfs:
-            return None # No hay dataframes para combinar
-
-        # Tomar el primer dataframe como base para el orden y la fusión inicial
-        merged_df = dfs[0].copy()
-        merged_df['original_index'] = range(len(merged_df))
-        # Asignar sufijo basado en qué dataframe es la base
-        base_suffix_map = {id(df1): '_site1', id(df2): '_site2', id(df3): '_site3'}
-        base_suffix = base_suffix_map.get(id(dfs[0]), '_base')
-        merged_df = merged_df.rename(columns={'Value': f'Value{base_suffix}'})
-
-        # Fusionar los dataframes restantes
-        suffixes = ['_site1', '_site2', '_site3']
-        processed_indices = {suffixes.index(base_suffix)} # Marcar el índice del df base como procesado
-
-        for i, df_to_merge in enumerate([df1, df2, df3]):
-             if df_to_merge is not None and id(df_to_merge) != id(dfs[0]): # Si no es el df base
-                suffix_index = i
-                if suffix_index not in processed_indices:
-                    current_suffix = suffixes[suffix_index]
-                    # Renombrar la columna 'Value' antes de fusionar para evitar conflictos
-                    df_renamed = df_to_merge.rename(columns={'Value': f'Value{current_suffix}'})
-                    merged_df = pd.merge(merged_df, df_renamed[['Key', f'Value{current_suffix}']], on='Key', how='outer')
-                    processed_indices.add(suffix_index)
-
-
-        # Rellenar el índice original para filas que solo existían en df2 o df3
-        # Se usa un valor grande para ponerlos al final antes de ordenar
-        merged_df['original_index'] = merged_df['original_index'].fillna(len(merged_df) + merged_df['original_index'].max())
-
-        # Asegurar que todas las columnas de valor existan, rellenando con None si faltan
-        for suffix in suffixes:
-            col_name = f'Value{suffix}'
-            if col_name not in merged_df.columns:
-                merged_df[col_name] = None
-
-        # --- Lógica ACTUALIZADA para 'Valor Final' con prioridad S2 > S1 > S3 ---
-        def get_final_value(row):
-            if pd.notna(row.get('Value_site2')) and row.get('Value_site2') != 'None':
-                return row['Value_site2']
-            elif pd.notna(row.get('Value_site1')) and row.get('Value_site1') != 'None':
-                return row['Value_site1']
-            elif pd.notna(row.get('Value_site3')) and row.get('Value_site3') != 'None':
-                return row['Value_site3']
-            # Fallback a la primera columna no nula si S2/S1/S3 son None/NaN
-            elif pd.notna(row.get('Value_site2')): return row['Value_site2']
-            elif pd.notna(row.get('Value_site1')): return row['Value_site1']
-            elif pd.notna(row.get('Value_site3')): return row['Value_site3']
-            else: return None # O '' si prefieres string vacío
-
-        merged_df['Value_editable'] = merged_df.apply(get_final_value, axis=1)
-        # --- FIN Lógica ACTUALIZADA ---
-
-        # Renombrar columnas para la visualización final
-        merged_df = merged_df.rename(columns={
-            'Value_site1': 'Valor Sitio 1',
-            'Value_site2': 'Valor Sitio 2',
-            'Value_site3': 'Valor Sitio 3', # <-- Nueva columna
-            'Value_editable': 'Valor Final'
-        })
-
-        # Ordenar y seleccionar columnas finales
-        final_columns = ['Key', 'Valor Sitio 1', 'Valor Sitio 2', 'Valor Sitio 3', 'Valor Final']
-        # Asegurarse de que las columnas existan antes de seleccionarlas
-        final_columns = [col for col in final_columns if col in merged_df.columns]
-
-        return merged_df.sort_values('original_index').drop('original_index', axis=1)[final_columns]
+    return DataProcessor(error_reporter=st.error)
 
 
 def init_session_state():
@@ -143,29 +31,31 @@ def init_session_state():
         st.session_state.df_site3 = None
     # --- FIN NUEVO ---
 
+    # Resultados del Sitio 2 para cada opción de transmisión y opción mostrada
+    if 'df_site2_variants' not in st.session_state:
+        st.session_state.df_site2_variants = None
+    if 'site2_transmission' not in st.session_state:
+        st.session_state.site2_transmission = None
+
     if 'merged_df' not in st.session_state:
         st.session_state.merged_df = None
+    # Sitios que se procesan en segundo plano ({sitio: Future}) y estado de cada uno
+    if 'pending_sites' not in st.session_state:
+        st.session_state.pending_sites = {}
+    if 'site_status' not in st.session_state:
+        st.session_state.site_status = {}
     if 'search_term' not in st.session_state:
         st.session_state.search_term = ""
-    if 'grid_has_changes' not in st.session_state:
-        st.session_state.grid_has_changes = False
-    if 'previous_data' not in st.session_state:
-        st.session_state.previous_data = None
-
-    # Opciones de idioma (sin cambios)
+    # Ediciones de "Valor Final" por índice de fila, aplicadas sobre merged_df sin modificarlo
+    if 'final_edits' not in st.session_state:
+        st.session_state.final_edits = {}
+    # Cambia con cada nueva combinación: la tabla se vuelve a crear y no arrastra eventos viejos
+    if 'grid_generation' not in st.session_state:
+        st.session_state.grid_generation = 0
+
+    # Opciones de idioma (compartidas con el modo por lotes, ver batch_export.py)
     if 'language_options' not in st.session_state:
-        st.session_state.language_options = {
-            'Inglés': "utils/planillaIngles.odt",
-            'Alemán': "utils/planillaAleman.odt",
-            'Italiano': "utils/planillaItaliano.odt",
-            'Francés': "utils/planillaFrances.odt",
-            'Holandés': "utils/planillaHolandes.odt",
-            'Portugués': "utils/planillaPortugues.odt",
-            'Polaco': "utils/planillaPolaco.odt",
-            'Checo': "utils/planillaCheco.odt",
-            'Rumano': "utils/planillaRumania.odt",
-
-        }
+        st.session_state.language_options = dict(TEMPLATES_BY_LANGUAGE)
     if 'selected_language' not in st.session_state:
         st.session_state.selected_language = list(st.session_state.language_options.keys())[0]
 
@@ -199,15 +89,11 @@ def render_url_inputs():
     st.markdown("**Opción para Sitio 2 (Typenscheine):** Si ofrece dos tipos de transmisiones, seleccione la deseada.")
     transmission_option = st.selectbox(
         "Selecciona la opción de transmisión:",
-        ("Por defecto", "Manual", "Automático"),
+        tuple(TRANSMISSION_OPTIONS),
         key="transmission_option",
         index=0 # Asegurar que 'Por defecto' es la opción inicial
     )
-    transmission_manual = None
-    if transmission_option == "Manual":
-        transmission_manual = True
-    elif transmission_option == "Automático":
-        transmission_manual = False
+    transmission_manual = TRANSMISSION_OPTIONS[transmission_option]
 
     # --- NUEVO: Retornar url_site3 ---
     return url_site1, url_site2, url_site3, transmission_manual
@@ -266,106 +152,191 @@ def render_aggrid(df):
     grid_response = AgGrid(
         df_display,
         gridOptions=grid_options,
-        update_mode=GridUpdateMode.MODEL_CHANGED,
+        # Solo se vuelve a Streamlit al editar una celda; el evento trae la fila editada
+        update_mode=GridUpdateMode.VALUE_CHANGED,
         fit_columns_on_grid_load=True, # Puede ser problemático con wrapText
         theme='alpine', # Otras opciones: 'streamlit', 'balham'
         height=600, # Aumentar altura si es necesario
         width='100%',
         allow_unsafe_jscode=True,
-        key="data_grid",
-        reload_data=True # Forzar recarga para reflejar cambios de estado
+        key=f"data_grid_{st.session_state.grid_generation}",
     )
     return grid_response
 
 
-def update_dataframe_values(original_df, updated_data):
-    """Actualiza el DataFrame original con los valores modificados"""
-    if updated_data is None or updated_data.empty: # Comprobar si el DataFrame está vacío
-        return original_df
-    if original_df is None:
-        return None # No se puede actualizar un df None
+def apply_grid_edit(event):
+    """
+    Registra la edición de una celda de "Valor Final" a partir del evento cellValueChanged de
+    AgGrid. Solo se usa la fila editada (columna 'index' = índice en merged_df), sin
+    reconstruir ni comparar la tabla entera. Volver al valor combinado elimina la edición.
+    """
+    if not event or event.get('type') != 'cellValueChanged':
+        return
+    if (event.get('colDef') or {}).get('field') != 'Valor Final':
+        return
+    row = (event.get('data') or {}).get('index')
+    merged_df = st.session_state.merged_df
+    if merged_df is None or row not in merged_df.index:
+        return
+
+    new_value = event.get('newValue')
+    current_value = merged_df.at[row, 'Valor Final']
+    if (pd.isna(current_value) and pd.isna(new_value)) or str(current_value) == str(new_value):
+        st.session_state.final_edits.pop(row, None)
+    else:
+        st.session_state.final_edits[row] = new_value
 
-    updated_df = pd.DataFrame(updated_data)
 
-    # Reindexar original_df temporalmente si 'index' no es el índice real
-    original_indexed = original_df.set_index('index', drop=False) if 'index' in original_df.columns else original_df
+def merged_with_edits():
+    """merged_df con las ediciones de la tabla aplicadas (el que se muestra y se exporta)"""
+    merged_df = st.session_state.merged_df
+    edits = st.session_state.final_edits
+    if merged_df is None or not edits:
+        return merged_df
+    edited = merged_df.copy()
+    rows = [row for row in edits if row in edited.index]
+    edited.loc[rows, 'Valor Final'] = pd.Series([edits[row] for row in rows], index=rows, dtype=object)
+    return edited
 
-    changes_made = False
-    for _, row in updated_df.iterrows():
-        try:
-            # Usar el índice de la tabla AgGrid si existe, sino asumir que es el índice del df
-            original_idx = row.get('index', row.name)
-            new_value = row.get('Valor Final')
-
-            # Asegurar que el índice existe en el DF original
-            if original_idx in original_indexed.index:
-                 # Comparar cuidadosamente, considerando tipos y NaN/None
-                current_value = original_indexed.loc[original_idx, 'Valor Final']
-                if (pd.isna(current_value) and pd.isna(new_value)) or (str(current_value) == str(new_value)):
-                    continue # Sin cambios reales
-                else:
-                    # Aplicar cambio usando el índice correcto
-                    original_indexed.loc[original_idx, 'Valor Final'] = new_value
-                    changes_made = True
-            # else: # El índice de AgGrid no corresponde a uno en el DF (puede pasar con filtrado)
-                 # print(f"Advertencia: Índice {original_idx} no encontrado en el DF original durante la actualización.")
-
-        except KeyError as e:
-            st.warning(f"Error de clave al actualizar el registro con índice {original_idx}: {e}")
-        except Exception as e: # Captura más genérica por si acaso
-             st.error(f"Error inesperado al actualizar índice {original_idx}: {e}")
-
-    if changes_made:
-        st.session_state.grid_has_changes = True
-
-    # Devolver el dataframe con el índice reseteado si lo modificamos
-    return original_indexed.reset_index(drop=True) if 'index' in original_df.columns else original_indexed
-
-
-# --- NUEVO: Actualizar firma de process_urls ---
-def process_urls(url_site1, url_site2, url_site3, transmission_manual):
-# --- FIN NUEVO ---
-    """Procesa las URLs y actualiza los dataframes en session_state"""
-    processor = DataProcessor()
 
-    with st.spinner('Procesando datos...'):
-        # Inicializar a None para asegurar un estado limpio
-        st.session_state.df_site1 = None
-        st.session_state.df_site2 = None
-        # --- NUEVO: Inicializar df_site3 ---
-        st.session_state.df_site3 = None
-        # --- FIN NUEVO ---
+def reset_grid_edits():
+    """Descarta las ediciones y recrea la tabla (nueva combinación de datos)"""
+    st.session_state.final_edits = {}
+    st.session_state.grid_generation += 1
 
-        if url_site1:
-            st.session_state.df_site1 = processor.process_url(url_site1, 1)
-        if url_site2:
-            st.session_state.df_site2 = processor.process_url(url_site2, 2, transmission_manual)
-        # --- NUEVO: Procesar url_site3 ---
-        if url_site3:
-            st.session_state.df_site3 = processor.process_url(url_site3, 3)
-        # --- FIN NUEVO ---
 
-        # Actualizar el DataFrame combinado pasando los tres dataframes
-        st.session_state.merged_df = processor.merge_dataframes(
-            st.session_state.df_site1,
-            st.session_state.df_site2,
-            st.session_state.df_site3 # <-- Pasar el tercer df
-        )
+def process_urls(url_site1, url_site2, url_site3, transmission_manual):
+    """
+    Lanza el procesamiento de las URLs en segundo plano y retorna sin esperar: cada sitio
+    aparece en la tabla en cuanto termina (ver render_site_progress).
+    """
+    processor = get_processor()
+
+    # Inicializar a None para asegurar un estado limpio
+    st.session_state.df_site1 = None
+    st.session_state.df_site2 = None
+    st.session_state.df_site2_variants = None
+    st.session_state.df_site3 = None
+    st.session_state.merged_df = None
+    st.session_state.site2_transmission = transmission_manual
+    reset_grid_edits()
+
+    # Del Sitio 2 se obtienen las tres opciones de transmisión para poder cambiar después
+    urls = {1: url_site1, 2: url_site2, 3: url_site3}
+    pending = processor.submit_urls(urls, transmission_manual, site2_variants=True)
+    started = time.monotonic()
+    st.session_state.site_status = {}
+    for site, future in pending.items():
+        st.session_state.site_status[site] = {'state': 'pending', 'url': urls[site], 'started': started}
+        # Se anota cuándo terminó cada sitio, aunque se recoja en una consulta posterior
+        future.add_done_callback(lambda f: setattr(f, 'finished_at', time.monotonic()))
+    st.session_state.pending_sites = pending
+
+
+def merge_available_sites():
+    """Combina los sitios que ya terminaron; los que siguen en curso todavía no tienen columna"""
+    pending = st.session_state.pending_sites
+    frames = {site: st.session_state[f'df_site{site}'] for site in (1, 2, 3) if site not in pending}
+    return merge_sites(frames)
+
+
+def collect_site_results():
+    """Recoge los sitios terminados y recalcula "Valor Final"; retorna True si llegó alguno"""
+    pending = st.session_state.pending_sites
+    finished = [site for site, future in pending.items() if future.done()]
+    for site in finished:
+        future = pending.pop(site)
+        status = st.session_state.site_status[site]
+        status['elapsed'] = getattr(future, 'finished_at', time.monotonic()) - status['started']
+        try:
+            result = future.result()
+        except Exception as e:
+            status['state'] = 'error'
+            status['message'] = DataProcessor.site_error(site, status['url'], e)
+            continue
+        status['state'] = 'done'
+        if site == 2:
+            st.session_state.df_site2_variants = result
+            st.session_state.df_site2 = result[st.session_state.site2_transmission]
+        else:
+            st.session_state[f'df_site{site}'] = result
+    if finished:
+        st.session_state.merged_df = merge_available_sites()
+    return bool(finished)
+
+
+def render_site_status():
+    """Muestra el estado de cada sitio: en curso, listo (con su tiempo) o con error"""
+    site_status = st.session_state.site_status
+    if not site_status:
+        return
+    for column, site in zip(st.columns(3), (1, 2, 3)):
+        status = site_status.get(site)
+        if status is None:
+            continue
+        with column:
+            if status['state'] == 'pending':
+                st.info(f"Sitio {site}: procesando...", icon="⏳")
+            elif status['state'] == 'done':
+                st.success(f"Sitio {site}: listo en {status['elapsed']:.1f} s", icon="✅")
+            else:
+                st.error(status['message'], icon="⚠️")
 
-        # Reiniciar el estado de los cambios
-        st.session_state.grid_has_changes = False
-        st.session_state.previous_data = st.session_state.merged_df.to_dict('records') if st.session_state.merged_df is not None else None
 
-    st.success('¡Procesamiento completado!')
+@st.fragment(run_every=0.5)
+def render_site_progress():
+    """
+    Consulta periódicamente los sitios en curso. Cuando llega alguno se vuelve a ejecutar la
+    página para mostrar su columna; cuando no queda ninguno, este fragmento deja de llamarse.
+    """
+    if collect_site_results():
+        st.rerun()
+    render_site_status()
+
+
+def switch_site2_transmission(transmission_manual):
+    """
+    Aplica la opción de transmisión del Sitio 2 sin volver a procesar las URLs: se toma la
+    variante ya transformada y solo se recalcula la combinación. Como al procesar de nuevo,
+    las ediciones de la tabla se descartan.
+    """
+    variants = st.session_state.df_site2_variants
+    if variants is None or st.session_state.site2_transmission == transmission_manual:
+        return
+    st.session_state.site2_transmission = transmission_manual
+    st.session_state.df_site2 = variants[transmission_manual]
+    st.session_state.merged_df = merge_available_sites()
+    reset_grid_edits()
+
+
+def render_cache_stats():
+    """Muestra en la barra lateral los aciertos y fallos de la caché de resultados compartida"""
+    result_cache = get_processor().result_cache
+    if not result_cache:
+        return
+    stats = result_cache.stats()
+    with st.sidebar:
+        st.subheader("Caché de resultados")
+        st.caption(f"Compartida por todas las sesiones; las entradas caducan a los {result_cache.ttl / 60:g} minutos.")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Aciertos", stats["hits"])
+        col2.metric("Fallos", stats["misses"])
+        col3.metric("Entradas", stats["entries"])
+        if st.button("Vaciar caché"):
+            result_cache.clear()
+            st.rerun()
 
 
 def main():
     setup_page()
     init_session_state()
+    render_cache_stats()
 
     # --- NUEVO: Recibir url_site3 ---
     url_site1, url_site2, url_site3, transmission_manual = render_url_inputs()
     # --- FIN NUEVO ---
+    # Cambiar la transmisión no requiere volver a pulsar "Procesar URLs"
+    switch_site2_transmission(transmission_manual)
 
     if st.button("Procesar URLs", type="primary"):
         # --- NUEVO: Comprobar las tres URLs ---
@@ -376,9 +347,12 @@ def main():
             # --- NUEVO: Pasar url_site3 ---
             process_urls(url_site1, url_site2, url_site3, transmission_manual)
             # --- FIN NUEVO ---
-            # Forzar un rerun para asegurar que AgGrid se renderice con los nuevos datos
-            st.rerun()
 
+    # Estado de cada sitio; mientras quede alguno en curso se sigue consultando
+    if st.session_state.pending_sites:
+        render_site_progress()
+    else:
+        render_site_status()
 
     # Mostrar resultados (AgGrid)
     if st.session_state.merged_df is not None:
@@ -392,29 +366,15 @@ def main():
         )
         st.session_state.search_term = search_term # Actualizar estado
 
-        # Filtrar DataFrame basado en la búsqueda
-        filtered_df = filter_dataframe(st.session_state.merged_df, search_term)
+        # Filtrar DataFrame basado en la búsqueda (con las ediciones ya aplicadas)
+        filtered_df = filter_dataframe(merged_with_edits(), search_term)
 
         # Renderizar AgGrid con el DataFrame filtrado
         grid_response = render_aggrid(filtered_df)
 
-        # Lógica para manejar actualizaciones de AgGrid
-        if grid_response and grid_response['data'] is not None:
-            current_grid_data = pd.DataFrame(grid_response['data'])
-            previous_grid_data_df = pd.DataFrame(st.session_state.previous_data) if st.session_state.previous_data is not None else pd.DataFrame()
-
-            # Comprobar si los datos de la tabla han cambiado realmente
-            if not current_grid_data.equals(previous_grid_data_df):
-                # Actualizar el DataFrame principal en session_state con los cambios de la tabla
-                # Importante: pasar filtered_df para mapear correctamente los índices si está filtrado
-                st.session_state.merged_df = update_dataframe_values(
-                     st.session_state.merged_df, # El DF completo
-                     grid_response['data'] # Los datos actuales de la tabla (pueden estar filtrados)
-                )
-                # Actualizar previous_data para la próxima comparación
-                st.session_state.previous_data = current_grid_data.to_dict('records')
-                # Puede ser útil un rerun aquí si la actualización no se refleja inmediatamente
-                # st.rerun()
+        # Cada edición llega como un evento de celda; se guarda como ajuste sobre merged_df
+        if grid_response:
+            apply_grid_edit(grid_response.event_data)
 
 
         # Selección de idioma y exportación (sin cambios funcionales)
@@ -433,7 +393,7 @@ def main():
                     planilla_path = st.session_state.language_options[st.session_state.selected_language]
                     exporter = ODTExporter(planilla_path)
                     # Asegurarse de pasar el DF completo y actualizado para exportar
-                    doc_bytes = exporter.export_to_odt(st.session_state.merged_df)
+                    doc_bytes = exporter.export_to_odt(merged_with_edits())
 
                     if doc_bytes:
                         st.download_button(
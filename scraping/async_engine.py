@@ -0,0 +1,146 @@
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+import requests
+
+from .response_cache import ResponseCache, get_response_cache
+from .scheduler import AsyncDomainScheduler
+from .snapshot_store import SnapshotStore, get_snapshot_store
+from .transfer import DEFAULT_MAX_BODY_BYTES, FetchStats, decode_text, read_limited_async
+
+
+class AsyncScrapeEngine:
+    """
+    Motor asíncrono de descarga para conversiones masivas.
+
+    Un único event loop atiende todas las peticiones: un semáforo global acota la
+    concurrencia total y cada dominio tiene su propia cola con un límite adaptativo
+    (AIMD, entre 1 y `per_host_limit`) y reintentos con backoff. Se usa como context
+    manager asíncrono:
+
+        async with AsyncScrapeEngine() as engine:
+            df = await Site1Scraper().scrape_async(url, engine)
+    """
+
+    def __init__(self, max_concurrency: int = 50, per_host_limit: int = 6,
+                 connect_timeout: float = 5.0, read_timeout: float = 10.0,
+                 response_cache: ResponseCache = None, snapshot_store: SnapshotStore = None,
+                 max_body_bytes: int = DEFAULT_MAX_BODY_BYTES, **scheduler_kwargs):
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.scheduler_kwargs = {'max_limit': per_host_limit, **scheduler_kwargs}
+        self.scheduler = None
+        self._session = None
+        self._global_semaphore = None
+        # Misma caché que la ruta síncrona; response_cache=False la desactiva
+        self.response_cache = get_response_cache() if response_cache is None else response_cache
+        # Sin almacén explícito se usa el del proceso vigente en cada descarga (ver BaseScraper)
+        self._snapshot_store = snapshot_store
+        self.max_body_bytes = max_body_bytes
+        self.fetch_stats = deque(maxlen=10000)
+
+    @property
+    def snapshot_store(self) -> SnapshotStore:
+        return get_snapshot_store() if self._snapshot_store is None else self._snapshot_store
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.per_host_limit)
+        # La descompresión se hace por bloques en read_limited_async para poder medir
+        # los bytes transferidos y cortar las respuestas que exceden el tamaño máximo.
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, auto_decompress=False)
+        self._global_semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.scheduler = AsyncDomainScheduler(**self.scheduler_kwargs)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+        self._session = None
+
+    async def _request(self, url, headers):
+        # El hueco global se toma después del hueco del dominio: las peticiones que esperan
+        # a un sitio lento no ocupan capacidad que podrían usar los otros sitios.
+        async with self._global_semaphore:
+            stats = FetchStats(url=url, status=0)
+            started = time.monotonic()
+            async with self._session.get(url, headers=headers) as response:
+                stats.status = response.status
+                stats.content_encoding = response.headers.get('Content-Encoding')
+                if response.status == 304:
+                    html = None
+                else:
+                    response.raise_for_status()
+                    content = await read_limited_async(response, self.max_body_bytes, stats)
+                    html = decode_text(content, response.charset)
+            stats.elapsed = time.monotonic() - started
+            self.fetch_stats.append(stats)
+            return response.status, response.headers, html
+
+    async def fetch_html(self, url: str, headers: Optional[Dict[str, str]] = None) -> str:
+        """Descarga la página y devuelve su HTML como texto."""
+        if self._session is None:
+            raise RuntimeError("AsyncScrapeEngine debe usarse dentro de 'async with'.")
+        snapshot_store = self.snapshot_store
+        if snapshot_store and snapshot_store.replaying:
+            html = snapshot_store.load(url)
+            if html is None:
+                raise Exception(f"La URL no está en el almacén de instantáneas: {url}")
+            return html
+        html = await self._download(url, headers)
+        if snapshot_store and snapshot_store.recording:
+            snapshot_store.save(url, html)
+        return html
+
+    async def _download(self, url: str, headers: Optional[Dict[str, str]]) -> str:
+        cached = self.response_cache.lookup(url) if self.response_cache else None
+        if cached is not None and self.response_cache.is_fresh(cached):
+            return cached.body
+
+        headers = dict(headers or {})
+        if cached is not None:
+            headers.update(cached.conditional_headers())
+        try:
+            status, response_headers, html = await self.scheduler.call(url, self._request, url, headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError, requests.RequestException) as e:
+            raise Exception(f"Error al realizar la solicitud: {e or type(e).__name__}")
+        if cached is not None and status == 304:
+            return self.response_cache.refresh(cached, response_headers).body
+
+        if self.response_cache:
+            self.response_cache.store(url, html, response_headers.get('ETag'), response_headers.get('Last-Modified'))
+        return html
+
+
+async def scrape_triples_async(triples: Iterable[Tuple[str, str, str]], scrapers: Dict[int, object],
+                               engine: AsyncScrapeEngine,
+                               transmission_manual: Optional[bool] = None) -> List[Tuple[Dict, Dict]]:
+    """
+    Extrae en un único event loop los datos de muchas ternas (url_sitio1, url_sitio2, url_sitio3).
+
+    Retorna, para cada terna y en el mismo orden, una tupla (resultados, errores) con
+    los DataFrames sin transformar y los mensajes de error indexados por número de sitio.
+    """
+
+    async def run_site(site_number, url):
+        scraper = scrapers[site_number]
+        if site_number == 2:
+            return await scraper.scrape_async(url, engine, transmission_manual)
+        return await scraper.scrape_async(url, engine)
+
+    async def run_triple(triple):
+        urls = {site_number: url for site_number, url in enumerate(triple, start=1)}
+        tasks = {site: run_site(site, url) for site, url in urls.items() if url}
+        outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        results = {site: None for site in urls}
+        errors = {}
+        for site, outcome in zip(tasks, outcomes):
+            if isinstance(outcome, Exception):
+                errors[site] = f"Error al procesar el Sitio {site} ({urls[site]}): {outcome}"
+            else:
+                results[site] = outcome
+        return results, errors
+
+    return await asyncio.gather(*(run_triple(triple) for triple in triples))
@@ -1,19 +1,175 @@
+import asyncio
+import time
+from collections import deque
+from functools import partial
+
 import requests
 from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+
+from .response_cache import ResponseCache, get_response_cache
+from .result_memo import ResultMemo, get_result_memo
+from .scheduler import DomainScheduler, get_domain_scheduler
+from .session_pool import SessionPool, get_session_pool
+from .snapshot_store import SnapshotStore, get_snapshot_store
+from .transfer import ACCEPTED_ENCODINGS, DEFAULT_MAX_BODY_BYTES, FetchStats, decode_text, read_limited
+
+# Parser de respaldo cuando el solicitado no está instalado
+FALLBACK_PARSER = 'html.parser'
+
+
+def resolve_parser(name):
+    """Devuelve `name` si BeautifulSoup dispone de ese parser; si no, el de respaldo."""
+    return name if builder_registry.lookup(name) is not None else FALLBACK_PARSER
+
 
 class BaseScraper:
-    def __init__(self, headers=None):
-        self.headers = headers or {
+    # Versión de la lógica de extracción: incrementarla al cambiarla invalida los resultados memorizados
+    VERSION = 1
+    # Parser de BeautifulSoup por defecto de cada sitio ('lxml' o 'html.parser')
+    parser_backend = 'lxml'
+    # SoupStrainer opcional para construir solo la parte de la página que usa el scraper
+    parse_only = None
+
+    def __init__(self, headers=None, session_pool: SessionPool = None, response_cache: ResponseCache = None,
+                 scheduler: DomainScheduler = None, snapshot_store: SnapshotStore = None,
+                 max_body_bytes: int = DEFAULT_MAX_BODY_BYTES, parser_backend: str = None,
+                 result_memo: ResultMemo = None):
+        self.headers = dict(headers) if headers else {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        self.headers.setdefault('Accept-Encoding', ACCEPTED_ENCODINGS)
+        # Tamaño máximo del cuerpo decodificado; las páginas más grandes se rechazan
+        self.max_body_bytes = max_body_bytes
+        # Métricas de las últimas descargas (bytes transferidos vs. decodificados)
+        self.fetch_stats = deque(maxlen=1000)
+        self.parser_backend = resolve_parser(parser_backend or self.parser_backend)
+        # Segundos de cada parseo, para comparar backends con datos reales
+        self.parse_times = deque(maxlen=1000)
+        # Si no se indica un pool, se usa el compartido por todo el proceso
+        self.session_pool = session_pool or get_session_pool()
+        # Igual con la caché de respuestas; response_cache=False la desactiva
+        self.response_cache = get_response_cache() if response_cache is None else response_cache
+        # Cola y límite de concurrencia adaptativo por dominio, con reintentos y backoff
+        self.scheduler = scheduler or get_domain_scheduler()
+        # Almacén de instantáneas para grabar/reproducir páginas (desactivado por defecto).
+        # Sin uno explícito se consulta en cada descarga el del proceso, de modo que
+        # configure_snapshot_store también afecta a los scrapers ya creados.
+        self._snapshot_store = snapshot_store
+        # Resultados memorizados por contenido de la página; result_memo=False la desactiva
+        self.result_memo = get_result_memo() if result_memo is None else result_memo
 
-    def fetch_page(self, url):
+    @property
+    def snapshot_store(self) -> SnapshotStore:
+        return get_snapshot_store() if self._snapshot_store is None else self._snapshot_store
+
+    def _request(self, url, headers):
+        stats = FetchStats(url=url, status=0)
+        started = time.monotonic()
+        response = self.session_pool.get(url, headers=headers, stream=True)
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
+            stats.status = response.status_code
+            stats.content_encoding = response.headers.get('Content-Encoding')
             response.raise_for_status()
-            return BeautifulSoup(response.text, 'html.parser')
+            content = b'' if response.status_code == 304 else read_limited(response, self.max_body_bytes, stats)
+        finally:
+            # Tras leer el cuerpo completo, close() devuelve la conexión al pool
+            response.close()
+        stats.elapsed = time.monotonic() - started
+        self.fetch_stats.append(stats)
+        return response, content
+
+    def fetch_html(self, url):
+        """
+        Devuelve el HTML de la página como texto: desde el almacén de instantáneas en
+        modo replay o, en otro caso, descargándolo (pasando por la caché si está activa).
+        """
+        snapshot_store = self.snapshot_store
+        if snapshot_store and snapshot_store.replaying:
+            return self._replay(snapshot_store, url)
+        html = self._download(url)
+        if snapshot_store and snapshot_store.recording:
+            snapshot_store.save(url, html)
+        return html
+
+    def _replay(self, snapshot_store, url):
+        html = snapshot_store.load(url)
+        if html is None:
+            raise Exception(f"La URL no está en el almacén de instantáneas: {url}")
+        return html
+
+    def _download(self, url):
+        """Descarga la página, sirviéndola desde la caché o revalidándola cuando es posible."""
+        cached = self.response_cache.lookup(url) if self.response_cache else None
+        if cached is not None and self.response_cache.is_fresh(cached):
+            return cached.body
+
+        headers = dict(self.headers)
+        if cached is not None:
+            headers.update(cached.conditional_headers())
+        try:
+            response, content = self.scheduler.call(url, self._request, url, headers)
         except requests.RequestException as e:
             raise Exception(f"Error al realizar la solicitud: {e}")
+        if cached is not None and response.status_code == 304:
+            # La página no cambió: se renueva la entrada sin volver a descargarla
+            return self.response_cache.refresh(cached, response.headers).body
+
+        html = decode_text(content, response.encoding)
+        if self.response_cache:
+            self.response_cache.store(url, html, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return html
+
+    def parse_html(self, html):
+        started = time.perf_counter()
+        soup = BeautifulSoup(html, self.parser_backend, parse_only=self.parse_only)
+        self.parse_times.append(time.perf_counter() - started)
+        return soup
+
+    def parse_stats(self):
+        """Resumen de los tiempos de parseo registrados con el backend actual."""
+        times = sorted(self.parse_times)
+        if not times:
+            return {'parser': self.parser_backend, 'count': 0}
+        return {
+            'parser': self.parser_backend,
+            'count': len(times),
+            'mean': sum(times) / len(times),
+            'p50': times[len(times) // 2],
+            'max': times[-1],
+        }
 
-    def scrape(self, url):
+    def fetch_page(self, url):
+        return self.parse_html(self.fetch_html(url))
+
+    def scrape_html(self, html, *args, **kwargs):
+        """Extrae los datos a partir del HTML ya descargado."""
         raise NotImplementedError("Este es implementado en subclases.")
+
+    def scrape_page(self, html, *args, **kwargs):
+        """
+        Como `scrape_html`, pero si ya se extrajo una página con el mismo contenido
+        (y los mismos argumentos) se devuelve el resultado memorizado sin volver a parsearla.
+        """
+        if not self.result_memo:
+            return self.scrape_html(html, *args, **kwargs)
+        return self.result_memo.scrape(self, html, self.scrape_html, *args, **kwargs)
+
+    def scrape(self, url, *args, **kwargs):
+        return self.scrape_page(self.fetch_html(url), *args, **kwargs)
+
+    async def scrape_async(self, url, engine, *args, **kwargs):
+        """
+        Variante asíncrona de `scrape`: la descarga la realiza el `AsyncScrapeEngine`
+        dado y la extracción es la misma que en la ruta síncrona.
+        """
+        html = await engine.fetch_html(url, headers=self.headers)
+        return await self.scrape_page_async(html, *args, **kwargs)
+
+    async def scrape_page_async(self, html, *args, **kwargs):
+        """
+        `scrape_page` en el ejecutor de hilos del event loop: mientras se parsea una página
+        el loop sigue atendiendo las demás descargas.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.scrape_page, html, *args, **kwargs))
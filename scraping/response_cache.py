@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+
+# Raíz del proyecto: los directorios relativos se resuelven desde aquí, no desde el CWD
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def project_path(path: str) -> str:
+    """`path` tal cual si es absoluta; si no, relativa a la raíz del proyecto."""
+    return path if os.path.isabs(path) else os.path.join(PROJECT_DIR, path)
+
+
+@dataclass
+class CachedResponse:
+    """Respuesta HTTP almacenada junto con los validadores necesarios para revalidarla."""
+    url: str
+    body: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    stored_at: float = 0.0
+
+    @property
+    def size(self) -> int:
+        """Tamaño aproximado en bytes (cuerpo codificado en UTF-8)."""
+        return len(self.body.encode("utf-8"))
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Cabeceras para un GET condicional (304 si la página no cambió)."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class MemoryLRUCache:
+    """Caché LRU en memoria acotada por bytes, no por número de entradas."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        with self._lock:
+            item = self._entries.get(url)
+            if item is None:
+                return None
+            self._entries.move_to_end(url)
+            return item[0]
+
+    def put(self, entry: CachedResponse):
+        size = entry.size
+        with self._lock:
+            previous = self._entries.pop(entry.url, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            # Una página mayor que toda la caché no se guarda en memoria
+            if size > self.max_bytes:
+                return
+            self._entries[entry.url] = (entry, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+class DiskCache:
+    """
+    Caché en disco: un fichero JSON por URL, nombrado por el hash de la URL.
+
+    Ocupa como mucho `max_bytes`. Al superarlos se borran los ficheros guardados hace más
+    tiempo (primero, por tanto, los caducados) hasta bajar al 90 % del límite, de modo que
+    el recorrido del directorio no se repite en cada escritura. El recorrido se hace sobre
+    el disco, no sobre lo que sabe este proceso: varios procesos pueden compartir el directorio.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._bytes = sum(size for _, _, size in self._files())
+
+    def _path(self, url: str) -> str:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _files(self):
+        """(ruta, fecha de escritura, bytes) de cada entrada del directorio."""
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((entry.path, stat.st_mtime, stat.st_size))
+        return files
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                return CachedResponse(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def put(self, entry: CachedResponse):
+        path = self._path(entry.url)
+        # Escritura atómica: otro hilo o proceso nunca ve un fichero a medio escribir
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(entry), f)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._bytes += size
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        files = sorted(self._files(), key=lambda file: file[1])
+        total = sum(size for _, _, size in files)
+        target = self.max_bytes * 0.9
+        for path, _, size in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self._bytes = total
+
+
+class ResponseCache:
+    """
+    Caché de respuestas en dos niveles (memoria LRU + disco) indexada por URL.
+
+    Las entradas más antiguas que `ttl` segundos se consideran caducadas, pero no se
+    descartan: se conservan para revalidarlas con ETag/Last-Modified, de modo que una
+    respuesta 304 solo cuesta la ida y vuelta, sin volver a descargar la página. Solo
+    salen del disco cuando este supera `disk_max_bytes`, empezando por las más antiguas.
+    """
+
+    def __init__(self, directory: str = ".http_cache", ttl: float = 3600.0,
+                 memory_max_bytes: int = 64 * 1024 * 1024, disk_max_bytes: int = 256 * 1024 * 1024):
+        self.ttl = ttl
+        self.memory = MemoryLRUCache(memory_max_bytes)
+        # Relativo a la raíz del proyecto, como las plantillas (ver exportToFile.template_path)
+        self.disk = DiskCache(project_path(directory), disk_max_bytes)
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return (time.time() - entry.stored_at) < self.ttl
+
+    def lookup(self, url: str) -> Optional[CachedResponse]:
+        """Busca la URL en memoria y después en disco (promoviéndola a memoria)."""
+        entry = self.memory.get(url)
+        if entry is None:
+            entry = self.disk.get(url)
+            if entry is not None:
+                self.memory.put(entry)
+        return entry
+
+    def store(self, url: str, body: str, etag: Optional[str] = None,
+              last_modified: Optional[str] = None) -> CachedResponse:
+        entry = CachedResponse(url=url, body=body, etag=etag, last_modified=last_modified,
+                               stored_at=time.time())
+        self.memory.put(entry)
+        self.disk.put(entry)
+        return entry
+
+    def refresh(self, entry: CachedResponse, headers=None) -> CachedResponse:
+        """Renueva una entrada tras un 304 (la página no cambió), con los validadores que traiga la respuesta."""
+        headers = headers or {}
+        return self.store(entry.url, entry.body,
+                          headers.get("ETag", entry.etag),
+                          headers.get("Last-Modified", entry.last_modified))
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Devuelve la caché compartida por defecto (una por proceso)."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ResponseCache()
+    return _default_cache
+
+
+def configure_response_cache(**kwargs) -> ResponseCache:
+    """Reemplaza la caché por defecto con una nueva configurada con los parámetros dados."""
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = ResponseCache(**kwargs)
+    return _default_cache
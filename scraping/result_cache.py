@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+import pandas as pd
+
+
+class ResultCache:
+    """
+    Caché de resultados ya transformados por (URL, sitio, opción de transmisión), compartida
+    por todas las sesiones del proceso.
+
+    A diferencia de `ResultMemo`, que evita reparsear una página idéntica pero aun así
+    necesita descargarla (o revalidarla), aquí un acierto no hace ninguna petición: dos
+    operadores que convierten el mismo vehículo dentro de `ttl` segundos comparten el
+    resultado. Las entradas caducan a los `ttl` segundos y, por encima de `max_entries`,
+    se descartan las usadas hace más tiempo.
+
+    Los DataFrames se guardan y se entregan como copias, para que las ediciones de una
+    sesión no alteren lo que ven las demás.
+    """
+
+    def __init__(self, ttl: float = 15 * 60, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url: str, site_number: int, transmission_manual=None, requested_keys=None) -> tuple:
+        keys = None if requested_keys is None else tuple(sorted(requested_keys))
+        return (url, site_number, transmission_manual, keys)
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and time.monotonic() - item[0] > self.ttl:
+                del self._entries[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return item[1].copy()
+
+    def put(self, key: Hashable, value: pd.DataFrame):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value.copy())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Aciertos, fallos y entradas vigentes, para mostrarlos en la aplicación."""
+        with self._lock:
+            now = time.monotonic()
+            entries = sum(now - stored_at <= self.ttl for stored_at, _ in self._entries.values())
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Devuelve la caché de resultados compartida por defecto (una por proceso)."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ResultCache()
+    return _default_cache
+
+
+def configure_result_cache(**kwargs) -> ResultCache:
+    """Reemplaza la caché de resultados por defecto con una nueva configurada con los parámetros dados."""
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = ResultCache(**kwargs)
+    return _default_cache
@@ -0,0 +1,128 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, is_dataclass
+from typing import Callable, Optional
+
+import pandas as pd
+
+# Atributo de DataFrame.attrs con la clave de la página de la que salió el DataFrame
+MEMO_KEY_ATTR = "memo_key"
+
+
+def content_hash(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def scraper_fingerprint(scraper) -> str:
+    """Identifica la lógica de extracción: clase, versión, parser y modo de extracción (Sitio 1)."""
+    cls = type(scraper)
+    mode = getattr(scraper, "extraction_mode", None)
+    return f"{cls.__module__}.{cls.__qualname__}:v{getattr(cls, 'VERSION', 0)}:{scraper.parser_backend}:{mode}"
+
+
+def transformer_fingerprint(transformer) -> str:
+    """Identifica la transformación: clase, versión y hash de su configuración."""
+    cls = type(transformer)
+    config = getattr(transformer, "config", None)
+    config = asdict(config) if is_dataclass(config) else config
+    digest = hashlib.sha256(repr(config).encode("utf-8")).hexdigest()[:16]
+    return f"{cls.__module__}.{cls.__qualname__}:v{getattr(cls, 'VERSION', 0)}:{digest}"
+
+
+class ResultMemo:
+    """
+    Memoización por contenido de los resultados de extracción y transformación.
+
+    Las claves son (hash del HTML, huella del scraper, argumentos) para la extracción y,
+    además, la huella del transformador para la transformación. Una página byte a byte
+    idéntica a otra ya procesada (un 304, una repetición desde instantáneas, la misma
+    URL pedida dos veces) no vuelve a parsearse ni a pasar por pandas.
+
+    Los DataFrames se guardan y se entregan como copias, para que quien los modifique
+    no altere la entrada memorizada.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.hits = {"scrape": 0, "transform": 0}
+        self.misses = {"scrape": 0, "transform": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key) -> Optional[pd.DataFrame]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            self.hits[key[0]] += value is not None
+            self.misses[key[0]] += value is None
+        return None if value is None else value.copy()
+
+    def _put(self, key, value: pd.DataFrame):
+        with self._lock:
+            self._entries[key] = value.copy()
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def scrape(self, scraper, html: str, extract: Callable[..., pd.DataFrame], *args, **kwargs) -> pd.DataFrame:
+        """
+        Devuelve extract(html, *args, **kwargs), memorizado por contenido. El resultado lleva en
+        `attrs` la clave de la página, que después usa `transform`.
+        """
+        page_key = (content_hash(html), scraper_fingerprint(scraper), repr((args, sorted(kwargs.items()))))
+        key = ("scrape",) + page_key
+        data = self._get(key)
+        if data is None:
+            data = extract(html, *args, **kwargs)
+            data.attrs[MEMO_KEY_ATTR] = page_key
+            self._put(key, data)
+        return data
+
+    def transform(self, transformer, data: pd.DataFrame, keys=None) -> pd.DataFrame:
+        """
+        Devuelve transformer.transform(data) (o transform(data, keys=keys) si se piden solo
+        algunas claves). Solo se memoriza si `data` procede de `scrape` (lleva la clave de
+        su página); en otro caso se transforma sin más.
+        """
+        def run():
+            return transformer.transform(data) if keys is None else transformer.transform(data, keys=keys)
+
+        page_key = data.attrs.get(MEMO_KEY_ATTR)
+        if page_key is None:
+            return run()
+        key = ("transform",) + page_key + (transformer_fingerprint(transformer),)
+        if keys is not None:
+            key += (tuple(sorted(keys)),)
+        result = self._get(key)
+        if result is None:
+            result = run()
+            self._put(key, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_default_memo = None
+_default_memo_lock = threading.Lock()
+
+
+def get_result_memo() -> ResultMemo:
+    """Devuelve la memoización compartida por defecto (una por proceso)."""
+    global _default_memo
+    if _default_memo is None:
+        with _default_memo_lock:
+            if _default_memo is None:
+                _default_memo = ResultMemo()
+    return _default_memo
+
+
+def configure_result_memo(**kwargs) -> ResultMemo:
+    """Reemplaza la memoización por defecto con una nueva configurada con los parámetros dados."""
+    global _default_memo
+    with _default_memo_lock:
+        _default_memo = ResultMemo(**kwargs)
+    return _default_memo
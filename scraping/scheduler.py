@@ -0,0 +1,231 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+# Respuestas que indican que el sitio está saturado: se reintentan y reducen la concurrencia
+OVERLOAD_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    """Código HTTP de un error de requests o de aiohttp (None si no es un error HTTP)."""
+    status = getattr(exc, "status", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after_of(exc: BaseException) -> float:
+    """Segundos indicados por la cabecera Retry-After del error, o 0 si no la hay."""
+    headers = getattr(exc, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None)
+    try:
+        return float((headers or {}).get("Retry-After", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def is_overload(exc: BaseException) -> bool:
+    return _status_of(exc) in OVERLOAD_STATUSES
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Sobrecarga del sitio o fallo de red transitorio; los 404 y similares no se reintentan."""
+    return is_overload(exc) or isinstance(exc, (
+        requests.ConnectionError, requests.Timeout,
+        aiohttp.ClientConnectionError, asyncio.TimeoutError,
+    ))
+
+
+class AIMDLimit:
+    """
+    Límite de concurrencia adaptativo (additive increase / multiplicative decrease).
+
+    Cada respuesta rápida suma 1/limit (≈ +1 por cada ronda completa de peticiones);
+    una respuesta lenta, un 429 o un 5xx multiplican el límite por `backoff`. Tras
+    una reducción se ignoran las siguientes durante `cooldown` segundos para que una
+    ráfaga de errores cuente como una sola señal de sobrecarga.
+    """
+
+    def __init__(self, initial: float = 4, min_limit: float = 1, max_limit: float = 32,
+                 latency_target: float = 3.0, backoff: float = 0.5, cooldown: float = 1.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self._last_decrease = 0.0
+
+    @property
+    def slots(self) -> int:
+        return max(int(self.min_limit), int(self.limit))
+
+    def on_success(self, latency: float):
+        if latency > self.latency_target:
+            self.on_overload()
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def on_overload(self):
+        now = time.monotonic()
+        if now - self._last_decrease >= self.cooldown:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self._last_decrease = now
+
+
+class _SchedulerBase:
+    """Configuración común de los planificadores por dominio."""
+
+    def __init__(self, max_attempts: int = 4, backoff_multiplier: float = 0.5, backoff_max: float = 30.0,
+                 **limit_kwargs):
+        self.max_attempts = max_attempts
+        self.backoff_max = backoff_max
+        self._jitter = wait_random_exponential(multiplier=backoff_multiplier, max=backoff_max)
+        self.limit_kwargs = limit_kwargs
+        self.limits = {}
+
+    @staticmethod
+    def _domain(url: str) -> str:
+        return urlsplit(url).netloc.lower()
+
+    def _wait(self, retry_state) -> float:
+        # Backoff exponencial con jitter completo, respetando Retry-After si el sitio lo envía,
+        # pero nunca más de backoff_max: un "Retry-After: 3600" no puede dejar una petición
+        # de la aplicación esperando una hora
+        exc = retry_state.outcome.exception()
+        retry_after = min(_retry_after_of(exc), self.backoff_max) if exc else 0.0
+        return max(self._jitter(retry_state), retry_after)
+
+    def _retry_kwargs(self):
+        return dict(
+            retry=retry_if_exception(is_retryable),
+            wait=self._wait,
+            stop=stop_after_attempt(self.max_attempts),
+            reraise=True,
+        )
+
+    def _record(self, limit: AIMDLimit, started: float, exc: Optional[BaseException]):
+        # Se llama con la condición del dominio tomada: el límite lo actualizan varios hilos
+        if exc is None:
+            limit.on_success(time.monotonic() - started)
+        elif is_overload(exc):
+            limit.on_overload()
+
+
+class DomainScheduler(_SchedulerBase):
+    """
+    Planificador por dominio para la ruta síncrona (hilos).
+
+    Cada dominio tiene su propia cola de espera y su propio límite AIMD, de modo que
+    un sitio lento o saturado no retiene las peticiones a los demás. Los fallos
+    transitorios se reintentan con backoff exponencial con jitter (tenacity).
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._conditions = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _state(self, domain: str):
+        with self._lock:
+            if domain not in self.limits:
+                self.limits[domain] = AIMDLimit(**self.limit_kwargs)
+                self._conditions[domain] = threading.Condition()
+                self._in_flight[domain] = 0
+            return self.limits[domain], self._conditions[domain]
+
+    def _attempt(self, domain, fn, *args, **kwargs):
+        limit, condition = self._state(domain)
+        with condition:
+            condition.wait_for(lambda: self._in_flight[domain] < limit.slots)
+            self._in_flight[domain] += 1
+        started = time.monotonic()
+        exc = None
+        try:
+            return fn(*args, **kwargs)
+        except BaseException as e:
+            exc = e
+            raise
+        finally:
+            with condition:
+                self._record(limit, started, exc)
+                self._in_flight[domain] -= 1
+                condition.notify_all()
+
+    def call(self, url: str, fn, *args, **kwargs):
+        """Ejecuta fn(*args, **kwargs) dentro de la cola del dominio de `url`, con reintentos."""
+        domain = self._domain(url)
+        for attempt in Retrying(**self._retry_kwargs()):
+            with attempt:
+                return self._attempt(domain, fn, *args, **kwargs)
+
+
+class AsyncDomainScheduler(_SchedulerBase):
+    """Equivalente asíncrono de `DomainScheduler`, para usar dentro de un event loop."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._conditions = {}
+        self._in_flight = {}
+
+    def _state(self, domain: str):
+        if domain not in self.limits:
+            self.limits[domain] = AIMDLimit(**self.limit_kwargs)
+            self._conditions[domain] = asyncio.Condition()
+            self._in_flight[domain] = 0
+        return self.limits[domain], self._conditions[domain]
+
+    async def _attempt(self, domain, fn, *args, **kwargs):
+        limit, condition = self._state(domain)
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight[domain] < limit.slots)
+            self._in_flight[domain] += 1
+        started = time.monotonic()
+        exc = None
+        try:
+            return await fn(*args, **kwargs)
+        except BaseException as e:
+            exc = e
+            raise
+        finally:
+            async with condition:
+                self._record(limit, started, exc)
+                self._in_flight[domain] -= 1
+                condition.notify_all()
+
+    async def call(self, url: str, fn, *args, **kwargs):
+        """Ejecuta await fn(*args, **kwargs) dentro de la cola del dominio de `url`, con reintentos."""
+        domain = self._domain(url)
+        async for attempt in AsyncRetrying(**self._retry_kwargs()):
+            with attempt:
+                return await self._attempt(domain, fn, *args, **kwargs)
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_domain_scheduler() -> DomainScheduler:
+    """Devuelve el planificador síncrono compartido por defecto (uno por proceso)."""
+    global _default_scheduler
+    if _default_scheduler is None:
+        with _default_scheduler_lock:
+            if _default_scheduler is None:
+                _default_scheduler = DomainScheduler()
+    return _default_scheduler
+
+
+def configure_domain_scheduler(**kwargs) -> DomainScheduler:
+    """Reemplaza el planificador por defecto con uno nuevo configurado con los parámetros dados."""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        _default_scheduler = DomainScheduler(**kwargs)
+    return _default_scheduler
@@ -1,9 +1,84 @@
 from .base_scraper import BaseScraper
 import pandas as pd
+import time
+from lxml import etree, html as lxml_html
+
+
+def _has_class(name):
+    # Equivalente XPath de class_='name' en BeautifulSoup: basta con que sea una de las clases
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _class_is(value):
+    # Equivalente XPath de class_='a b' en BeautifulSoup: el atributo completo debe coincidir
+    return f"normalize-space(@class)='{value}'"
+
 
 class Site1Scraper(BaseScraper):
-    def scrape(self, url):
-        soup = self.fetch_page(url)
+    # 'xpath' usa las expresiones compiladas de abajo; 'soup' el recorrido con BeautifulSoup
+    extraction_mode = 'xpath'
+
+    # Selectores compilados una sola vez para toda la clase
+    _ARTICLES = etree.XPath(f"//article[{_has_class('container')}]")
+    _HEADERS = etree.XPath(f".//h2[{_class_is('h3 mt-4')}]")
+    _LIST_GROUP = etree.XPath(
+        f"(descendant::div[{_class_is('list-group striped-rows')}]"
+        f" | following::div[{_class_is('list-group striped-rows')}])[1]"
+    )
+    _ITEMS = etree.XPath(f".//div[{_has_class('list-group-item')}]")
+    _KEY = etree.XPath(f"(.//div[{_class_is('col-sm-6 one-line text-sm-bold')}])[1]")
+    _VALUE = etree.XPath(f"(.//div[{_class_is('col-sm-6 one-line')}])[1]")
+    # get_text() de BeautifulSoup ignora comentarios y el contenido de script/style/template
+    _TEXTS = etree.XPath(
+        "descendant::text()[not(ancestor::script) and not(ancestor::style) and not(ancestor::template)]",
+        smart_strings=False,
+    )
+
+    def __init__(self, *args, extraction_mode=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if extraction_mode is not None:
+            self.extraction_mode = extraction_mode
+
+    def scrape_html(self, html):
+        if self.extraction_mode == 'xpath':
+            try:
+                data = self._extract_xpath(html)
+            except (ValueError, etree.LxmlError):
+                data = []
+            # Si la estructura no coincide con la esperada, se usa el recorrido completo
+            if data:
+                return pd.DataFrame(data, columns=["Key", "Value"])
+        return pd.DataFrame(self._extract_soup(html), columns=["Key", "Value"])
+
+    @classmethod
+    def _text(cls, element):
+        """Mismo resultado que get_text(strip=True) de BeautifulSoup."""
+        return ''.join(piece.strip() for piece in cls._TEXTS(element))
+
+    def _extract_xpath(self, html):
+        started = time.perf_counter()
+        root = lxml_html.document_fromstring(html)
+        self.parse_times.append(time.perf_counter() - started)
+
+        data = []
+        for section in self._ARTICLES(root):
+            for header in self._HEADERS(section):
+                section_name = self._text(header)
+                list_group = self._LIST_GROUP(header)
+                if not list_group:
+                    continue
+
+                for item in self._ITEMS(list_group[0]):
+                    key = self._KEY(item)
+                    value = self._VALUE(item)
+
+                    if key and value:
+                        combined_key = f"{section_name} - {self._text(key[0])}"
+                        data.append((combined_key, self._text(value[0])))
+        return data
+
+    def _extract_soup(self, html):
+        soup = self.parse_html(html)
         data = []
         # Lógica específica para pagina holandesa
         sections = soup.find_all('article', class_='container')
@@ -26,4 +101,4 @@ class Site1Scraper(BaseScraper):
                         combined_key = f"{section_name} - {key}"
                         data.append((combined_key, value))
 
-        return pd.DataFrame(data, columns=["Key", "Value"])
+        return data
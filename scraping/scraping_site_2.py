@@ -1,13 +1,93 @@
 from .base_scraper import BaseScraper
 import pandas as pd
-from typing import List, Dict, Tuple
-from bs4 import BeautifulSoup
+from bisect import bisect_right
+from typing import Callable, List, Dict, Optional, Tuple, Union
+from bs4 import BeautifulSoup, Tag
 import re
 
 
+class DocumentIndex:
+    """
+    Índice de la página construido en un único recorrido del documento.
+
+    Registra, en orden de documento, todos los elementos div/label/pre y los agrupa
+    por (etiqueta, clase), por (etiqueta, clase completa) y por (etiqueta, texto
+    directo). Así, las búsquedas equivalentes a `find`/`find_all`/`find_next` de
+    BeautifulSoup se resuelven con una búsqueda binaria sobre listas de posiciones,
+    en lugar de recorrer de nuevo el resto del documento en cada extractor.
+    """
+
+    TAGS = ('div', 'label', 'pre')
+
+    def __init__(self, soup: BeautifulSoup):
+        self.nodes = soup.find_all(list(self.TAGS))
+        self.position = {}
+        self._by_token = {}
+        self._by_class = {}
+        self._by_string = {}
+        for pos, node in enumerate(self.nodes):
+            self.position[id(node)] = pos
+            classes = node.get('class') or []
+            for token in classes:
+                self._by_token.setdefault((node.name, token), []).append(pos)
+            if classes:
+                self._by_class.setdefault((node.name, ' '.join(classes)), []).append(pos)
+            string = node.string
+            if string is not None:
+                self._by_string.setdefault((node.name, str(string)), []).append(pos)
+
+    def _positions(self, name: str, class_: Optional[str]) -> List[int]:
+        # Mismo criterio que BeautifulSoup: una clase con espacios debe coincidir con el
+        # atributo completo; una clase simple basta con que sea uno de sus valores.
+        if class_ is None:
+            return self._by_name(name)
+        if ' ' in class_:
+            return self._by_class.get((name, class_), [])
+        return self._by_token.get((name, class_), [])
+
+    def _by_name(self, name: str) -> List[int]:
+        key = (name, None)
+        if key not in self._by_token:
+            self._by_token[key] = [pos for pos, node in enumerate(self.nodes) if node.name == name]
+        return self._by_token[key]
+
+    def find_all(self, name: str, class_: Optional[str] = None) -> List[Tag]:
+        return [self.nodes[pos] for pos in self._positions(name, class_)]
+
+    def find_next(self, name: str, class_: Optional[str] = None,
+                  string: Union[str, Callable[[Optional[str]], bool], None] = None,
+                  after: Optional[Tag] = None) -> Optional[Tag]:
+        """
+        Primer elemento que cumple los filtros y está después de `after` en el documento
+        (o desde el principio si `after` es None), como `find`/`find_next`.
+        """
+        start = 0 if after is None else self.position[id(after)] + 1
+        positions = self._positions(name, class_)
+        if isinstance(string, str):
+            # Texto exacto: se cruza con el índice por texto, que suele ser mucho más corto
+            by_string = self._by_string.get((name, string), [])
+            if len(by_string) < len(positions):
+                candidates = set(positions)
+                positions = [pos for pos in by_string if pos in candidates]
+        for pos in positions[bisect_right(positions, start - 1):]:
+            node = self.nodes[pos]
+            if string is None:
+                return node
+            text = node.string
+            if isinstance(string, str):
+                if text is not None and str(text) == string:
+                    return node
+            elif string(text):
+                return node
+        return None
+
+
 class Site2Scraper(BaseScraper):
-    def __init__(self):
-        super().__init__()
+    # Opciones de transmisión: por defecto, manual (primer bloque) y automática (segundo)
+    TRANSMISSION_OPTIONS = (None, True, False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
         self.search_configs = [
             {
                 'container_class': 'col-sm-7 cocInfo',
@@ -37,55 +117,74 @@ class Site2Scraper(BaseScraper):
                 'element_type': 'label'
             }
         ]
+        self._identifier_patterns = {}
 #            <div class="col-sm-5 cocInfo">16 Final drive</div><div class="col-sm-7">Front wheel </div>
 
-    def extract_data_by_config(self, soup: BeautifulSoup, config: Dict) -> List[Tuple[str, str]]:
+    @staticmethod
+    def _index(document: Union[BeautifulSoup, DocumentIndex]) -> DocumentIndex:
+        """Permite llamar a los extractores con un soup o con un índice ya construido."""
+        return document if isinstance(document, DocumentIndex) else DocumentIndex(document)
+
+    def _identifier_pattern(self, config: Dict) -> re.Pattern:
+        # Una sola expresión por configuración: el coste de comprobar un elemento no
+        # crece con el número de identificadores configurados.
+        key = tuple(config['identifiers'])
+        pattern = self._identifier_patterns.get(key)
+        if pattern is None:
+            pattern = re.compile('|'.join(re.escape(identifier) for identifier in config['identifiers']))
+            self._identifier_patterns[key] = pattern
+        return pattern
+
+    def extract_data_by_config(self, document: Union[BeautifulSoup, DocumentIndex], config: Dict) -> List[Tuple[str, str]]:
         """Extrae datos según la configuración proporcionada."""
+        index = self._index(document)
         data = []
         element_type = config.get('element_type', 'div')
-        elements = soup.find_all(element_type, class_=config['container_class'])
+        pattern = self._identifier_pattern(config)
 
-        for element in elements:
+        for element in index.find_all(element_type, config['container_class']):
             text = element.get_text(strip=True)
-            if any(identifier in text for identifier in config['identifiers']):
-                value_element = element.find_next(element_type, class_=config['value_class'])
+            if pattern.search(text):
+                value_element = index.find_next(element_type, config['value_class'], after=element)
                 if value_element:
                     value = value_element.get_text(strip=True)
                     data.append((text, value))
         return data
 
-    def extract_axle_guarantees(self, soup: BeautifulSoup) -> List[Tuple[str, str]]:
+    def extract_axle_guarantees(self, document: Union[BeautifulSoup, DocumentIndex]) -> List[Tuple[str, str]]:
         """Extrae específicamente las garantías de ejes."""
+        index = self._index(document)
         data = []
-        main_element = soup.find('div', class_='col-sm-6 cocInfo', string='54 Axle guarantees')
+        main_element = index.find_next('div', 'col-sm-6 cocInfo', string='54 Axle guarantees')
 
         if main_element:
             # Extraer garantía delantera (v.)
-            v_element = main_element.find_next('div', class_='col-sm-1 cocInfo', string='v.')
+            v_element = index.find_next('div', 'col-sm-1 cocInfo', string='v.', after=main_element)
             if v_element:
-                value_v = v_element.find_next('div', class_='col-sm-5')
+                value_v = index.find_next('div', 'col-sm-5', after=v_element)
                 if value_v:
                     data.append((f"54 Axle guarantees v.", value_v.get_text(strip=True)))
 
             # Extraer garantía trasera (b.)
-            b_element = main_element.find_next('div', class_='offset-sm-6 col-sm-1 cocInfo', string='b.')
+            b_element = index.find_next('div', 'offset-sm-6 col-sm-1 cocInfo', string='b.', after=main_element)
             if b_element:
-                value_b = b_element.find_next('div', class_='col-sm-5')
+                value_b = index.find_next('div', 'col-sm-5', after=b_element)
                 if value_b:
                     data.append((f"54 Axle guarantees b.", value_b.get_text(strip=True)))
 
         return data
 
-    def extract_tow_hitch_info(self, soup: BeautifulSoup) -> List[Tuple[str, str]]:
+    def extract_tow_hitch_info(self, document: Union[BeautifulSoup, DocumentIndex]) -> List[Tuple[str, str]]:
       """Extrae la información del enganche de remolque (56) de la sección de Remarks."""
+      index = self._index(document)
       data = []
 
       # Buscar la sección de Remarks
-      remarks_header = soup.find('div', string='Remarks')
+      remarks_header = index.find_next('div', string='Remarks')
 
       if remarks_header:
           # Buscar el elemento pre que contiene las observaciones
-          pre_element = remarks_header.find_next('pre')
+          pre_element = index.find_next('pre', after=remarks_header)
 
           if pre_element:
               pre_html = str(pre_element)
@@ -98,23 +197,24 @@ class Site2Scraper(BaseScraper):
 
       return data
 
-    def extract_vmax_info(self, soup: BeautifulSoup) -> List[Tuple[str, str]]:
+    def extract_vmax_info(self, document: Union[BeautifulSoup, DocumentIndex]) -> List[Tuple[str, str]]:
       """Extrae información de VMax mecánica y automática y las combina en un solo valor."""
+      index = self._index(document)
       data = []
 
       # Buscar el elemento que contiene "19 Vehicle VMax mech."
-      vmax_element = soup.find('div', class_='col-sm-6 cocInfo', string=lambda s: '19 Vehicle VMax mech.' in s if s else False)
+      vmax_element = index.find_next('div', 'col-sm-6 cocInfo', string=lambda s: '19 Vehicle VMax mech.' in s if s else False)
 
       if vmax_element:
           # Extraer valor mecánico
-          mech_value_element = vmax_element.find_next('div', class_='col-sm-1 no-gutters')
+          mech_value_element = index.find_next('div', 'col-sm-1 no-gutters', after=vmax_element)
           mech_value = mech_value_element.get_text(strip=True) if mech_value_element else ""
 
           # Extraer valor automático
-          autom_label_element = vmax_element.find_next('div', class_='col-sm-2 cocInfo', string=lambda s: 'autom.' in s if s else False)
+          autom_label_element = index.find_next('div', 'col-sm-2 cocInfo', string=lambda s: 'autom.' in s if s else False, after=vmax_element)
           autom_value = ""
           if autom_label_element:
-              autom_value_element = autom_label_element.find_next('div', class_='col-sm-3')
+              autom_value_element = index.find_next('div', 'col-sm-3', after=autom_label_element)
               autom_value = autom_value_element.get_text(strip=True) if autom_value_element else ""
 
           # Crear un valor combinado simple
@@ -126,7 +226,7 @@ class Site2Scraper(BaseScraper):
 
 
 
-    def extract_emissions_data(self, soup: BeautifulSoup) -> List[Tuple[str, str]]:
+    def extract_emissions_data(self, document: Union[BeautifulSoup, DocumentIndex]) -> List[Tuple[str, str]]:
         """Extrae información de emisiones usando hermanos directos para separar encabezados y datos.
 
         Se asume que dentro de un bloque (div.row.cocRow):
@@ -135,9 +235,10 @@ class Site2Scraper(BaseScraper):
           - Los elementos restantes se agrupan en bloques de 8 datos cada uno.
           Si existen dos grupos, se asigna un sufijo según la primera celda de cada grupo.
         """
+        index = self._index(document)
         data = []
         # Buscar el elemento con el título "72 Emissions"
-        emissions_header = soup.find('div', string='72 Emissions')
+        emissions_header = index.find_next('div', string='72 Emissions')
         if emissions_header:
             # Obtener el contenedor (la fila completa)
             block = emissions_header.find_parent("div", class_="row cocRow")
@@ -171,59 +272,115 @@ class Site2Scraper(BaseScraper):
 
 
 
-    def extract_transmission_info(self, soup: BeautifulSoup, transmissionManual: bool = None) -> List[Tuple[str, str]]:
+    def extract_transmission_blocks(self, document: Union[BeautifulSoup, DocumentIndex]) -> Optional[Tuple[str, str]]:
+      """Extrae los dos bloques de '18 Transmission/IA' (primero y el de "Assignment").
+
+      Retorna (primer_valor, segundo_valor), con "" en el que no exista, o None si la
+      página no tiene el encabezado.
+      """
+      index = self._index(document)
+      # Buscar el encabezado "18 Transmission/IA"
+      transmission_header = index.find_next('div', 'col-sm-5 cocInfo', string=lambda s: s and '18 Transmission/IA' in s)
+      if not transmission_header:
+          return None
+
+      # Extraer el primer bloque de datos
+      first_data_div = index.find_next('div', 'col-sm-7', after=transmission_header)
+      first_value = first_data_div.get_text(strip=True) if first_data_div else ""
+
+      # Buscar el siguiente bloque de datos asociado (por ejemplo, en la sección "Assignment")
+      assignment_header = None
+      if first_data_div:
+          assignment_header = index.find_next('div', 'col-sm-5 cocInfo', string=lambda s: s and 'Assignment' in s, after=first_data_div)
+      second_value = ""
+      if assignment_header:
+          second_data_div = index.find_next('div', 'col-sm-7', after=assignment_header)
+          second_value = second_data_div.get_text(strip=True) if second_data_div else ""
+
+      return first_value, second_value
+
+    @staticmethod
+    def _transmission_rows(blocks: Optional[Tuple[str, str]], transmissionManual: bool = None) -> List[Tuple[str, str]]:
+      """Fila de '18 Transmission/IA' para la opción indicada a partir de los dos bloques."""
+      if blocks is None:
+          return []
+      first_value, second_value = blocks
+      # Decidir cuál valor extraer según transmissionManual
+      if transmissionManual is not None:
+          value = first_value if transmissionManual else second_value
+      else:
+          # Valor por defecto si no se especifica la variable: tomar el primero
+          value = first_value
+      return [("18 Transmission/IA", value)]
+
+    def extract_transmission_info(self, document: Union[BeautifulSoup, DocumentIndex], transmissionManual: bool = None) -> List[Tuple[str, str]]:
       """Extrae la información de '18 Transmission/IA' según la opción indicada por transmissionManual.
 
       Si transmissionManual es True, se extrae el primer bloque (por ejemplo, la opción manual).
       Si es False, se extrae el segundo bloque (por ejemplo, la opción automática).
       Si no se indica, se toma por defecto el primer bloque.
       """
-      data = []
-      # Buscar el encabezado "18 Transmission/IA"
-      transmission_header = soup.find('div', class_='col-sm-5 cocInfo', string=lambda s: s and '18 Transmission/IA' in s)
-
-      if transmission_header:
-          # Extraer el primer bloque de datos
-          first_data_div = transmission_header.find_next('div', class_='col-sm-7')
-          first_value = first_data_div.get_text(strip=True) if first_data_div else ""
-
-          # Buscar el siguiente bloque de datos asociado (por ejemplo, en la sección "Assignment")
-          assignment_header = first_data_div.find_next('div', class_='col-sm-5 cocInfo', string=lambda s: s and 'Assignment' in s)
-          second_value = ""
-          if assignment_header:
-              second_data_div = assignment_header.find_next('div', class_='col-sm-7')
-              second_value = second_data_div.get_text(strip=True) if second_data_div else ""
-
-          # Decidir cuál valor extraer según transmissionManual
-          if transmissionManual is not None:
-              value = first_value if transmissionManual else second_value
-          else:
-              # Valor por defecto si no se especifica la variable: tomar el primero
-              value = first_value
-
-          data.append(("18 Transmission/IA", value))
-
-      return data
-
+      return self._transmission_rows(self.extract_transmission_blocks(document), transmissionManual)
 
+    def _extract_common(self, index: DocumentIndex) -> List[Tuple[str, str]]:
+      """Todos los datos de la página salvo '18 Transmission/IA', que depende de la opción."""
+      all_data = []
 
+      # Extraer datos según las configuraciones existentes
+      for config in self.search_configs:
+          all_data.extend(self.extract_data_by_config(index, config))
 
+      all_data.extend(self.extract_axle_guarantees(index))
+      all_data.extend(self.extract_tow_hitch_info(index))
+      all_data.extend(self.extract_vmax_info(index))
+      # Ambos grupos de emisiones ("(mec)" y "(autom)"): la elección se hace al transformar
+      all_data.extend(self.extract_emissions_data(index))
+      return all_data
 
     def scrape(self, url: str, transmissionManual: bool = None) -> pd.DataFrame:
       """Método principal para realizar el scraping, con opción de especificar la transmisión."""
-      soup = self.fetch_page(url)
-      all_data = []
-
-      # Extraer datos según las configuraciones existentes
-      for config in self.search_configs:
-          all_data.extend(self.extract_data_by_config(soup, config))
+      return self.scrape_page(self.fetch_html(url), transmissionManual)
 
-      all_data.extend(self.extract_axle_guarantees(soup))
-      all_data.extend(self.extract_tow_hitch_info(soup))
-      all_data.extend(self.extract_vmax_info(soup))
-      all_data.extend(self.extract_emissions_data(soup))
+    def scrape_html(self, html: str, transmissionManual: bool = None) -> pd.DataFrame:
+      """Extrae los datos del HTML ya descargado."""
+      # Un único recorrido de la página; todos los extractores consultan el índice
+      index = DocumentIndex(self.parse_html(html))
+      all_data = self._extract_common(index)
 
       # Extraer información de Transmission/IA con la opción indicada
-      all_data.extend(self.extract_transmission_info(soup, transmissionManual))
+      all_data.extend(self.extract_transmission_info(index, transmissionManual))
 
       return pd.DataFrame(all_data, columns=['Key', 'Value'])
+
+    def scrape_html_transmissions(self, html: str) -> Dict[Optional[bool], pd.DataFrame]:
+      """
+      Con un único parseo, el resultado de `scrape_html` para cada opción de
+      transmisión (None, True, False): los dos bloques de '18 Transmission/IA' se
+      extraen a la vez y solo esa fila cambia entre opciones.
+      """
+      index = DocumentIndex(self.parse_html(html))
+      common = self._extract_common(index)
+      blocks = self.extract_transmission_blocks(index)
+      return {
+          option: pd.DataFrame(common + self._transmission_rows(blocks, option), columns=['Key', 'Value'])
+          for option in self.TRANSMISSION_OPTIONS
+      }
+
+    def scrape_transmissions(self, url: str) -> Dict[Optional[bool], pd.DataFrame]:
+      """
+      Como `scrape`, pero devuelve el resultado de las tres opciones de transmisión con una
+      sola descarga y un solo parseo. Cada resultado se memoriza igual que el de
+      `scrape(url, opción)`, de modo que ambas rutas comparten las entradas.
+      """
+      html = self.fetch_html(url)
+      if not self.result_memo:
+          return self.scrape_html_transmissions(html)
+
+      frames = {}
+
+      def extract(html, option):
+          if not frames:
+              frames.update(self.scrape_html_transmissions(html))
+          return frames[option]
+
+      return {option: self.result_memo.scrape(self, html, extract, option) for option in self.TRANSMISSION_OPTIONS}
@@ -1,7 +1,7 @@
 # scraping/scraping_site_3.py
 
 import pandas as pd
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 # Importa la clase base desde el mismo directorio
 from .base_scraper import BaseScraper
 
@@ -10,18 +10,37 @@ class Site3Scraper(BaseScraper):
     Scraper específico para extraer datos de especificaciones de vehículos
     del sitio auto-data.net.
     """
+    # Solo se usa la tabla de detalles: no hace falta construir el resto del árbol
+    parse_only = SoupStrainer('table', class_='cardetailsout car2')
+
     def scrape(self, url: str) -> pd.DataFrame:
         """
         Realiza el scraping de la URL dada y devuelve un DataFrame con los datos extraídos.
         """
         print(f"Iniciando scraping para el Sitio 3: {url}") # Mensaje informativo
         try:
-            # Usa el método fetch_page de la clase base para obtener el soup
-            soup = self.fetch_page(url)
+            # Usa el método fetch_html de la clase base para obtener la página
+            html = self.fetch_html(url)
         except Exception as e:
-            # Si fetch_page falla, retorna un DataFrame vacío o maneja el error como prefieras
+            # Si fetch_html falla, retorna un DataFrame vacío o maneja el error como prefieras
             print(f"Error al obtener la página para el Sitio 3 ({url}): {e}")
             return pd.DataFrame(columns=["Key", "Value"])
+        return self.scrape_page(html)
+
+    async def scrape_async(self, url: str, engine) -> pd.DataFrame:
+        """Variante asíncrona de `scrape`, con el mismo manejo de errores de descarga."""
+        try:
+            html = await engine.fetch_html(url, headers=self.headers)
+        except Exception as e:
+            print(f"Error al obtener la página para el Sitio 3 ({url}): {e}")
+            return pd.DataFrame(columns=["Key", "Value"])
+        return await self.scrape_page_async(html)
+
+    def scrape_html(self, html: str) -> pd.DataFrame:
+        """
+        Extrae los datos de especificaciones a partir del HTML ya descargado.
+        """
+        soup = self.parse_html(html)
 
         # Mapeo de los textos de encabezado (th) en el HTML a los nombres de clave deseados
         key_mapping = {
@@ -0,0 +1,91 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionPool:
+    """
+    Pool compartido de sesiones HTTP con keep-alive.
+
+    Mantiene una ``requests.Session`` por host (esquema + dominio) para reutilizar
+    las conexiones TCP/TLS entre llamadas, entre scrapers y entre instancias de
+    ``DataProcessor``. Cada sesión monta un ``HTTPAdapter`` cuyo pool de urllib3
+    limita el número de conexiones simultáneas contra ese host.
+    """
+
+    def __init__(self, pool_maxsize: int = 10, connect_timeout: float = 5.0,
+                 read_timeout: float = 10.0, pool_block: bool = True):
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_block = pool_block
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self):
+        """Timeout (conexión, lectura) que se pasa a requests."""
+        return (self.connect_timeout, self.read_timeout)
+
+    @staticmethod
+    def _host_key(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def _build_session(self) -> requests.Session:
+        session = requests.Session()
+        # pool_block=True hace que, al alcanzar pool_maxsize conexiones con el host,
+        # las peticiones adicionales esperen una conexión libre en lugar de abrir otra.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize, pool_block=self.pool_block)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def session_for(self, url: str) -> requests.Session:
+        """Devuelve (creándola si no existe) la sesión asociada al host de la URL."""
+        key = self._host_key(url)
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = self._build_session()
+                    self._sessions[key] = session
+        return session
+
+    def get(self, url: str, headers=None, timeout=None, **kwargs) -> requests.Response:
+        """Realiza un GET reutilizando la sesión del host."""
+        return self.session_for(url).get(url, headers=headers, timeout=timeout or self.timeout, **kwargs)
+
+    def close(self):
+        """Cierra todas las sesiones y libera sus conexiones."""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> SessionPool:
+    """Devuelve el pool compartido por defecto (uno por proceso)."""
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = SessionPool()
+    return _default_pool
+
+
+def configure_session_pool(**kwargs) -> SessionPool:
+    """Reemplaza el pool por defecto con uno nuevo configurado con los parámetros dados."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+        _default_pool = SessionPool(**kwargs)
+    return _default_pool
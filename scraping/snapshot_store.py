@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .response_cache import project_path
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class SnapshotStore:
+    """
+    Almacén de instantáneas HTML comprimidas y direccionadas por contenido.
+
+    - En modo "record", cada página descargada se guarda como
+      objects/<ab>/<sha256>.html.gz y se anota en index.jsonl (url -> sha256).
+      Dos URLs con el mismo HTML comparten el mismo objeto.
+    - En modo "replay", las páginas se sirven desde el almacén sin tocar la red;
+      una URL que no esté grabada produce un error.
+
+    Sirve para re-ejecutar el pipeline sobre un corpus real a velocidad de disco y
+    para tener entradas estables al perfilar los transformadores.
+    """
+
+    def __init__(self, directory: str, mode: str = REPLAY):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Modo de instantáneas desconocido: {mode}")
+        self.directory = directory
+        self.mode = mode
+        self._index_path = os.path.join(directory, "index.jsonl")
+        self._lock = threading.Lock()
+        self._index = None
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == RECORD
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "objects", digest[:2], f"{digest}.html.gz")
+
+    def _load_index(self) -> Dict[str, str]:
+        if self._index is None:
+            index = {}
+            if os.path.exists(self._index_path):
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            record = json.loads(line)
+                            # La última grabación de una URL es la vigente
+                            index[record["url"]] = record["sha256"]
+            self._index = index
+        return self._index
+
+    def urls(self) -> List[str]:
+        """URLs grabadas en el almacén."""
+        with self._lock:
+            return list(self._load_index())
+
+    def save(self, url: str, html: str) -> str:
+        """Guarda el HTML de la URL y devuelve su hash de contenido."""
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(gzip.compress(data))
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            index = self._load_index()
+            if index.get(url) != digest:
+                index[url] = digest
+                with open(self._index_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"url": url, "sha256": digest, "recorded_at": time.time()}) + "\n")
+        return digest
+
+    def load(self, url: str) -> Optional[str]:
+        """Devuelve el HTML grabado para la URL, o None si no está en el almacén."""
+        with self._lock:
+            digest = self._load_index().get(url)
+        if digest is None:
+            return None
+        with open(self._object_path(digest), "rb") as f:
+            return gzip.decompress(f.read()).decode("utf-8")
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+_default_store_loaded = False
+
+
+def get_snapshot_store() -> Optional[SnapshotStore]:
+    """
+    Devuelve el almacén por defecto, o None si las instantáneas están desactivadas.
+
+    Se activa con configure_snapshot_store() o con las variables de entorno
+    HOMOLOGATION_SNAPSHOT_MODE (record/replay) y HOMOLOGATION_SNAPSHOT_DIR. Una carpeta
+    relativa se toma desde la raíz del proyecto, no desde el directorio de trabajo.
+    """
+    global _default_store, _default_store_loaded
+    if not _default_store_loaded:
+        with _default_store_lock:
+            if not _default_store_loaded:
+                mode = os.environ.get("HOMOLOGATION_SNAPSHOT_MODE")
+                if mode:
+                    directory = os.environ.get("HOMOLOGATION_SNAPSHOT_DIR", ".snapshots")
+                    _default_store = SnapshotStore(project_path(directory), mode)
+                _default_store_loaded = True
+    return _default_store
+
+
+def configure_snapshot_store(mode: Optional[str], directory: str = ".snapshots") -> Optional[SnapshotStore]:
+    """
+    Activa (mode="record"/"replay") o desactiva (mode=None) el almacén por defecto.
+    `directory` relativa se toma desde la raíz del proyecto.
+    """
+    global _default_store, _default_store_loaded
+    with _default_store_lock:
+        _default_store = SnapshotStore(project_path(directory), mode) if mode else None
+        _default_store_loaded = True
+    return _default_store
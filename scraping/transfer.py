@@ -0,0 +1,186 @@
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Optional
+
+import charset_normalizer
+import requests
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él simplemente no se anuncia "br"
+    brotli = None
+
+# brotli >= 1.2 permite acotar la salida de cada llamada (output_buffer_limit); con versiones
+# anteriores una respuesta diminuta puede descomprimirse en cientos de MB de una vez, así que
+# "br" solo se acepta si se puede cortar al alcanzar el tamaño máximo.
+BROTLI_BOUNDED = brotli is not None and hasattr(brotli.Decompressor(), "can_accept_more_data")
+
+# Codificaciones que se anuncian al servidor: exactamente las que sabe descomprimir
+# _StreamDecoder con el tamaño acotado. Las dos rutas (requests y aiohttp) leen el cuerpo
+# sin decodificar y lo pasan por _StreamDecoder; cualquier otra codificación se rechaza.
+SUPPORTED_ENCODINGS = ("gzip", "deflate") + (("br",) if BROTLI_BOUNDED else ())
+ACCEPTED_ENCODINGS = ", ".join(SUPPORTED_ENCODINGS)
+
+DEFAULT_MAX_BODY_BYTES = 20 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class ResponseTooLarge(requests.RequestException):
+    """El cuerpo de la respuesta supera el tamaño máximo permitido."""
+
+
+@dataclass
+class FetchStats:
+    """Métricas de una descarga: bytes transferidos (comprimidos) frente a bytes decodificados."""
+    url: str
+    status: int
+    content_encoding: Optional[str] = None
+    transferred_bytes: int = 0
+    decoded_bytes: int = 0
+    elapsed: float = 0.0
+    started_at: float = field(default_factory=time.time)
+
+    @property
+    def compression_ratio(self) -> Optional[float]:
+        if not self.transferred_bytes:
+            return None
+        return self.decoded_bytes / self.transferred_bytes
+
+
+def _too_large(url: str, max_bytes: int) -> ResponseTooLarge:
+    return ResponseTooLarge(f"La respuesta de {url} supera el tamaño máximo de {max_bytes} bytes")
+
+
+def _check_content_length(headers, url: str, max_bytes: int):
+    """Rechaza de antemano las respuestas sin comprimir cuyo Content-Length ya excede el límite."""
+    length = headers.get("Content-Length")
+    if length and not headers.get("Content-Encoding") and length.isdigit() and int(length) > max_bytes:
+        raise _too_large(url, max_bytes)
+
+
+def decode_text(content: bytes, encoding: Optional[str]) -> str:
+    """Convierte el cuerpo a texto con el charset indicado o, si falta, el detectado (como requests)."""
+    if not encoding:
+        encoding = charset_normalizer.detect(content)["encoding"] or "utf-8"
+    try:
+        return str(content, encoding, errors="replace")
+    except LookupError:
+        return str(content, "utf-8", errors="replace")
+
+
+def read_limited(response: requests.Response, max_bytes: int, stats: FetchStats) -> bytes:
+    """
+    Lee en streaming el cuerpo de una respuesta de requests (abierta con stream=True).
+
+    Los bloques se leen sin decodificar de urllib3 (que descomprimiría cada bloque entero,
+    sin límite) y se descomprimen con `_StreamDecoder`, cortando en cuanto el contenido
+    decodificado supera `max_bytes`, sin llegar a tenerlo entero en memoria.
+    """
+    _check_content_length(response.headers, response.url, max_bytes)
+    body = _LimitedBody(response.url, response.headers.get("Content-Encoding"), max_bytes)
+    for data in response.raw.stream(CHUNK_SIZE, decode_content=False):
+        body.feed(data)
+    return body.finish(stats)
+
+
+class _StreamDecoder:
+    """Descompresor incremental para las codificaciones de SUPPORTED_ENCODINGS."""
+
+    def __init__(self, content_encoding: Optional[str]):
+        encoding = (content_encoding or "").strip().lower()
+        # Solo lo anunciado en ACCEPTED_ENCODINGS (p. ej. "br" sin brotli >= 1.2 no lo está)
+        if encoding not in SUPPORTED_ENCODINGS + ("", "identity"):
+            raise requests.RequestException(f"Content-Encoding no soportado: {content_encoding}")
+        self._zlib = None
+        self._brotli = None
+        if encoding == "gzip":
+            self._zlib = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            self._zlib = zlib.decompressobj()
+        elif encoding == "br":
+            self._brotli = brotli.Decompressor()
+        self._first = True
+
+    def decode(self, data: bytes, max_length: int) -> bytes:
+        """Descomprime `data` devolviendo como mucho unos `max_length` bytes (ver `pending`)."""
+        if self._brotli is not None:
+            return self._decode_brotli(data, max_length)
+        if self._zlib is None:
+            return data
+        try:
+            out = self._zlib.decompress(data, max_length)
+        except zlib.error:
+            # Algunos servidores envían "deflate" sin cabecera zlib (deflate crudo)
+            if not self._first:
+                raise
+            self._zlib = zlib.decompressobj(-zlib.MAX_WBITS)
+            out = self._zlib.decompress(data, max_length)
+        self._first = False
+        return out
+
+    def _decode_brotli(self, data: bytes, max_length: int) -> bytes:
+        # Al llegar al límite, el descompresor retiene el resto de la salida hasta que se le
+        # pida con entrada vacía: se pide solo mientras no se haya alcanzado max_length
+        chunks = [self._brotli.process(data, output_buffer_limit=max_length)]
+        produced = len(chunks[0])
+        while produced < max_length and not self._brotli.can_accept_more_data():
+            chunk = self._brotli.process(b"", output_buffer_limit=max_length - produced)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            produced += len(chunk)
+        return b"".join(chunks)
+
+    def flush(self) -> bytes:
+        return self._zlib.flush() if self._zlib is not None else b""
+
+    @property
+    def pending(self) -> bool:
+        """Hay datos comprimidos sin devolver (porque se alcanzó max_length)."""
+        if self._brotli is not None:
+            return not self._brotli.can_accept_more_data()
+        return self._zlib is not None and bool(self._zlib.unconsumed_tail)
+
+
+class _LimitedBody:
+    """Cuerpo de una respuesta que se va descomprimiendo bloque a bloque hasta `max_bytes`."""
+
+    def __init__(self, url: str, content_encoding: Optional[str], max_bytes: int):
+        self.url = url
+        self.max_bytes = max_bytes
+        self.decoder = _StreamDecoder(content_encoding)
+        self.chunks = []
+        self.transferred = 0
+        self.decoded = 0
+
+    def feed(self, data: bytes):
+        self.transferred += len(data)
+        # max_length acota la memoria incluso ante una "bomba" de compresión
+        chunk = self.decoder.decode(data, self.max_bytes - self.decoded + 1)
+        self.decoded += len(chunk)
+        if self.decoded > self.max_bytes or self.decoder.pending:
+            raise _too_large(self.url, self.max_bytes)
+        self.chunks.append(chunk)
+
+    def finish(self, stats: FetchStats) -> bytes:
+        tail = self.decoder.flush()
+        self.decoded += len(tail)
+        if self.decoded > self.max_bytes:
+            raise _too_large(self.url, self.max_bytes)
+        self.chunks.append(tail)
+        stats.transferred_bytes = self.transferred
+        stats.decoded_bytes = self.decoded
+        return b"".join(self.chunks)
+
+
+async def read_limited_async(response, max_bytes: int, stats: FetchStats) -> bytes:
+    """
+    Lee en streaming el cuerpo de una respuesta de aiohttp abierta con auto_decompress=False,
+    descomprimiéndolo bloque a bloque y cortando en cuanto supera `max_bytes` decodificados.
+    """
+    _check_content_length(response.headers, str(response.url), max_bytes)
+    body = _LimitedBody(str(response.url), response.headers.get("Content-Encoding"), max_bytes)
+    async for data in response.content.iter_chunked(CHUNK_SIZE):
+        body.feed(data)
+    return body.finish(stats)
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from page_server import PAGES_DIR, start_page_server  # noqa: E402
+from scraping.response_cache import configure_response_cache  # noqa: E402
+from scraping.result_cache import configure_result_cache  # noqa: E402
+from scraping.result_memo import configure_result_memo  # noqa: E402
+from scraping.snapshot_store import configure_snapshot_store  # noqa: E402
+
+
+def read_page(name: str) -> str:
+    with open(os.path.join(PAGES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="session")
+def page_server():
+    """URL base del servidor local con las páginas de los tres sitios (ver page_server.py)."""
+    server = start_page_server()
+    yield server.base_url
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path):
+    """Cachés y memoizaciones del proceso nuevas en cada prueba, sin tocar el proyecto."""
+    configure_response_cache(directory=str(tmp_path / "http_cache"))
+    configure_result_memo()
+    configure_result_cache()
+    configure_snapshot_store(None)
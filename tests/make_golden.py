@@ -0,0 +1,218 @@
+"""
+Genera tests/fixtures/golden/site<n>.json: pares entrada → salida de los transformadores
+originales (commit de base, antes de VehicleRecord y de los planes compilados), que
+test_transformers.py compara con los actuales; y merge.json: las tablas combinadas del
+merge original (`DataProcessor.merge_dataframes` de main.py), que compara test_site_merge.py.
+
+Las entradas son lo que extraen los scrapers de las páginas de tests/fixtures/pages (el
+Sitio 2 con cada opción de transmisión) y variantes de ellas: orden invertido, filas
+faltantes, valores raros y valores nulos (al azar, con semilla fija) y una tabla vacía. Si el
+transformador original lanza una excepción, se guarda su tipo (o el tipo incorporado del que deriva).
+Las entradas del merge son salidas de los transformadores originales (con claves repetidas,
+filas duplicadas o faltantes y algún sitio sin datos) y unos casos pequeños escritos a mano. Solo hace falta volver a generarlos si cambian las entradas:
+
+    python tests/make_golden.py
+"""
+import ast
+import builtins
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import textwrap
+import types
+
+import pandas as pd
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+from data_transformation.schema import HOMOLOGATION_SCHEMA  # noqa: E402
+from scraping.scraping_site_1 import Site1Scraper  # noqa: E402
+from scraping.scraping_site_2 import Site2Scraper  # noqa: E402
+from scraping.scraping_site_3 import Site3Scraper  # noqa: E402
+
+BASELINE = "260e444"
+GOLDEN_DIR = os.path.join(TESTS_DIR, "fixtures", "golden")
+PAGES = {
+    1: [("voertuig", Site1Scraper, "voertuig.html", ())],
+    2: [(f"{page}_{label}", Site2Scraper, f"{page}.html", (transmission,))
+        for page in ("typenschein", "typenschein_single")
+        for label, transmission in (("default", None), ("manual", True), ("automatic", False))],
+    3: [("autodata", Site3Scraper, "autodata.html", ())],
+}
+ODD_VALUES = ["", "None", "-", "0", "n/a", "12,5", " 7 ", "1 / 2"]
+NULL_VALUES = [None, math.nan]
+# Claves que el transformador original trataba con el accesor .str, que acepta valores nulos
+NULL_KEYS = {2: ("40 Length", "41 Width", "42 Height")}
+
+
+def _baseline_source(path):
+    return subprocess.run(["git", "show", f"{BASELINE}:{path}"], cwd=PROJECT_DIR,
+                          check=True, capture_output=True, text=True).stdout
+
+
+def baseline_transformer(site):
+    """Transformador del sitio tal como estaba en el commit de base."""
+    path = f"data_transformation/transform_site{site}.py"
+    source = _baseline_source(path)
+    module = types.ModuleType(f"baseline_transform_site{site}")
+    exec(compile(source, path, "exec"), module.__dict__)
+    return getattr(module, f"VehicleDataTransformer_site{site}")(getattr(module, f"DEFAULT_CONFIG_{site}"))
+
+
+def baseline_merge():
+    """
+    `DataProcessor.merge_dataframes` tal como estaba en el commit de base, con un sort estable:
+    el original ordena con quicksort, que deja en cualquier orden las filas empatadas (las
+    combinaciones de una clave repetida y las claves que no están en el primer DataFrame).
+    """
+    source = _baseline_source("main.py")
+    node = next(node for node in ast.walk(ast.parse(source))
+                if isinstance(node, ast.FunctionDef) and node.name == "merge_dataframes")
+    code = textwrap.dedent(ast.get_source_segment(source, node))
+    stable = code.replace("sort_values('original_index')", "sort_values('original_index', kind='stable')")
+    assert stable != code, "merge_dataframes ya no ordena por original_index"
+    namespace = {"pd": pd}
+    exec(compile(stable, "main.py", "exec"), namespace)
+    return namespace["merge_dataframes"]
+
+
+def variants(name, rows, rng, count=3):
+    """La entrada tal cual y sus variantes: (nombre, filas)."""
+    yield name, rows
+    yield f"{name}_reversed", rows[::-1]
+    yield f"{name}_missing_keys", [row for i, row in enumerate(rows) if i % 3 != 1]
+    for n in range(count):
+        dropped = set(rng.sample(range(len(rows)), min(3, len(rows))))
+        yield f"{name}_missing_{n}", [row for i, row in enumerate(rows) if i not in dropped]
+    for n in range(count):
+        odd = [list(row) for row in rows]
+        for row in rng.sample(odd, min(6, len(odd))):
+            row[1] = rng.choice(ODD_VALUES)
+        yield f"{name}_odd_{n}", odd
+
+
+def null_variants(name, rows, keys, count=3):
+    """Variantes con valores nulos: en las claves `keys` y en filas al azar (con semilla propia)."""
+    for key in keys:
+        yield f"{name}_null_{key}", [[k, None if k == key else v] for k, v in rows]
+    rng = random.Random(name)
+    for n in range(count):
+        nulls = [list(row) for row in rows]
+        for row in rng.sample(nulls, min(rng.randint(1, 3), len(nulls))):
+            row[1] = rng.choice(NULL_VALUES)
+        yield f"{name}_null_{n}", nulls
+
+
+def _error_name(error):
+    """Tipo incorporado más cercano de la excepción (IntCastingNaNError de pandas -> ValueError)."""
+    return next(cls.__name__ for cls in type(error).__mro__ if getattr(builtins, cls.__name__, None) is cls)
+
+
+def _plain(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+def golden_cases(site, transformer, rng):
+    inputs = []
+    for name, scraper_class, page, args in PAGES[site]:
+        with open(os.path.join(TESTS_DIR, "fixtures", "pages", page), encoding="utf-8") as f:
+            html = f.read()
+        scraper = scraper_class(result_memo=False, response_cache=False)
+        rows = scraper.scrape_html(html, *args)[["Key", "Value"]].values.tolist()
+        inputs.extend(variants(name, rows, rng))
+        inputs.extend(null_variants(name, rows, NULL_KEYS.get(site, ())))
+    inputs.append(("empty", []))
+
+    cases = []
+    for name, rows in inputs:
+        case = {"name": name, "input": rows}
+        try:
+            output = transformer.transform(pd.DataFrame(rows, columns=["Key", "Value"]))
+        except Exception as e:
+            case["error"] = _error_name(e)
+        else:
+            case["output"] = [[str(key), _plain(value)] for key, value in output[["Key", "Value"]].values]
+        cases.append(case)
+    return cases
+
+
+# Casos pequeños del merge: {sitio: filas o None}
+MERGE_CASES = {
+    "repeated_in_two_sites": {1: [["A", "a1"], ["X", "x1"], ["B", "b1"], ["X", "x2"]],
+                              2: [["X", "y1"], ["C", "c2"], ["X", "y2"]], 3: None},
+    "repeated_in_three_sites": {1: [["A", "a1"], ["X", "x1"], ["B", "b1"], ["X", "x2"]], 2: [["A", "a2"], ["X", "y1"]],
+                                3: [["X", "z1"], ["D", "d3"], ["X", "z2"], ["X", "z3"]]},
+    "repeated_outside_base": {1: [["A", "a1"], ["B", "b1"]], 2: [["X", "y1"], ["C", "c2"], ["X", "None"]], 3: None},
+    "repeated_in_base": {1: [["X", "x1"], ["X", "x2"], ["A", "None"]], 2: None, 3: [["A", "a3"], ["X", "z1"]]},
+    "base_from_site2": {1: None, 2: [["X", "y1"], ["A", "None"], ["X", "y2"]], 3: [["B", "b3"], ["X", "z1"], ["A", "a3"]]},
+    "single_site": {1: None, 2: [["X", "y1"], ["A", "a2"], ["X", "y2"]], 3: None},
+}
+# Salidas de los transformadores originales que se combinan (el caso de Sitio 2 repite claves)
+MERGE_PAGES = {1: "voertuig", 2: "typenschein_manual_missing_1", 3: "autodata"}
+
+
+def merge_variants(outputs, rng, count=3):
+    """Combinaciones de salidas de los transformadores: (nombre, {sitio: filas o None})."""
+    yield "pages", outputs
+    yield "pages_without_site1", {**outputs, 1: None}
+    yield "pages_without_site2", {**outputs, 2: None}
+    for n in range(count):
+        sites = {}
+        for site, rows in outputs.items():
+            rows = [list(row) for row in rows]
+            for row in rng.sample(rows, rng.randint(1, 3)):
+                rows.insert(rng.randrange(len(rows) + 1), [row[0], f"{row[1]} ({site})"])
+            for _ in range(rng.randint(0, 3)):
+                rows.pop(rng.randrange(len(rows)))
+            sites[site] = rows
+        yield f"pages_repeated_{n}", sites
+
+
+def merge_cases(outputs, merge, rng):
+    inputs = [(name, sites, False) for name, sites in MERGE_CASES.items()]
+    for name, sites in merge_variants(outputs, rng):
+        inputs.append((name, sites, False))
+        # Como las devuelven los transformadores: Key categórica con las claves del esquema
+        inputs.append((f"{name}_categorical", sites, True))
+
+    cases = []
+    for name, sites, categorical in inputs:
+        frames = [None if sites[site] is None else pd.DataFrame(sites[site], columns=["Key", "Value"])
+                  for site in (1, 2, 3)]
+        if categorical:
+            frames = [df if df is None else df.astype({"Key": HOMOLOGATION_SCHEMA.dtype}) for df in frames]
+        merged = merge(*frames)
+        output = [[str(row[0])] + [None if pd.isna(value) else _plain(value) for value in row[1:]]
+                  for row in merged.values]
+        cases.append({"name": name, "categorical": categorical, "sites": sites, "output": output})
+    return cases
+
+
+def _write(name, cases):
+    with open(os.path.join(GOLDEN_DIR, name), "w", encoding="utf-8") as f:
+        # Un caso por línea: los cambios se ven caso a caso en el diff
+        f.write("[\n" + ",\n".join(json.dumps(case, ensure_ascii=False) for case in cases) + "\n]\n")
+
+
+def main():
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    outputs = {}
+    for site in PAGES:
+        cases = golden_cases(site, baseline_transformer(site), random.Random(site))
+        _write(f"site{site}.json", cases)
+        errors = sum("error" in case for case in cases)
+        print(f"Sitio {site}: {len(cases)} casos ({errors} con excepción)")
+        outputs[site] = next(case["output"] for case in cases if case["name"] == MERGE_PAGES[site])
+
+    cases = merge_cases(outputs, baseline_merge(), random.Random(0))
+    _write("merge.json", cases)
+    print(f"Merge: {len(cases)} casos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Servidor HTTP local que sustituye a los sitios reales en las pruebas: sirve las páginas de
+tests/fixtures/pages (Voertuig, Typenscheine y auto-data) con gzip, ETag y 304, como los
+sitios. La query string se ignora, de modo que /voertuig.html?v=1 y ?v=2 son URLs distintas
+con la misma página. Rutas especiales:
+
+    /status/<código>           responde con ese código (p. ej. /status/503)
+    /slow/<segundos>/<página>  espera antes de servir la página
+    /bomb/<codificación>       64 MiB de ceros comprimidos con gzip o br, se pidan o no
+
+También se puede levantar a mano: python tests/page_server.py 8765
+"""
+import functools
+import gzip
+import hashlib
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "pages")
+
+
+@functools.lru_cache(maxsize=None)
+def compression_bomb(encoding: str) -> bytes:
+    """Unos pocos KB (o bytes, con br) que se descomprimen en 64 MiB."""
+    data = b"\0" * (64 * 1024 * 1024)
+    return brotli.compress(data, quality=5) if encoding == "br" else gzip.compress(data)
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].lstrip("/")
+        if path.startswith("status/"):
+            self._send(int(path.split("/")[1]), b"error")
+            return
+        if path.startswith("bomb/"):
+            encoding = path.split("/")[1]
+            self._send(200, compression_bomb(encoding),
+                       {"Content-Type": "text/html; charset=utf-8", "Content-Encoding": encoding})
+            return
+        if path.startswith("slow/"):
+            _, seconds, path = path.split("/", 2)
+            time.sleep(float(seconds))
+
+        page = os.path.join(PAGES_DIR, os.path.basename(path))
+        if not os.path.isfile(page):
+            self._send(404)
+            return
+        with open(page, "rb") as f:
+            body = f.read()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, headers={"ETag": etag})
+            return
+        headers = {"Content-Type": "text/html; charset=utf-8", "ETag": etag}
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        self._send(200, body, headers)
+
+
+class PageServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+    def handle_error(self, request, client_address):
+        # Un cliente que corta la descarga (p. ej. al superar el tamaño máximo) no es un error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_page_server(port: int = 0) -> PageServer:
+    """Arranca el servidor en un hilo (port=0 elige un puerto libre) y lo devuelve."""
+    server = PageServer(("127.0.0.1", port), PageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    server = PageServer(("127.0.0.1", int(sys.argv[1]) if len(sys.argv) > 1 else 8765), PageHandler)
+    print(f"Sirviendo {PAGES_DIR} en {server.base_url}")
+    server.serve_forever()
@@ -0,0 +1,103 @@
+import asyncio
+import time
+from functools import partial
+
+import pandas as pd
+import pytest
+
+from data_processor import DataProcessor
+from scraping.async_engine import AsyncScrapeEngine
+from scraping.result_cache import ResultCache
+from scraping.scraping_site_1 import Site1Scraper
+
+SITE2_PAGES = ("typenschein.html", "typenschein_single.html")
+
+
+def make_triples(base_url, count):
+    """Ternas con URLs distintas (la query string no cambia la página) y algunos sitios vacíos."""
+    triples = []
+    for i in range(count):
+        site1 = f"{base_url}/voertuig.html?v={i}" if i % 7 else ""
+        site2 = f"{base_url}/{SITE2_PAGES[i % 2]}?v={i}"
+        site3 = f"{base_url}/autodata.html?v={i}" if i % 3 else ""
+        triples.append((site1, site2, site3))
+    return triples
+
+
+@pytest.mark.parametrize("transmission_manual, count", [(None, 300), (True, 60), (False, 60)])
+def test_process_many_matches_process_url(page_server, transmission_manual, count):
+    triples = make_triples(page_server, count)
+    processed = DataProcessor(result_cache=False).process_many(triples, transmission_manual)
+
+    reported = []
+    reference = DataProcessor(result_cache=False, error_reporter=reported.append)
+    assert len(processed) == len(triples)
+    for triple, (results, errors) in zip(triples, processed):
+        for site, url in enumerate(triple, start=1):
+            if not url:
+                assert results[site] is None and site not in errors
+                continue
+            expected = reference.process_url(url, site, transmission_manual if site == 2 else None)
+            if expected is None:
+                # Mismo fallo en ambas rutas (p. ej. Automático en una página con una sola transmisión)
+                assert results[site] is None and errors[site] == reported.pop()
+            else:
+                assert site not in errors
+                pd.testing.assert_frame_equal(results[site], expected)
+
+
+def test_process_many_reports_http_errors(page_server):
+    triples = [(f"{page_server}/status/404", f"{page_server}/typenschein.html", "")]
+    (results, errors), = DataProcessor(result_cache=False).process_many(triples)
+    assert results[1] is None and results[2] is not None
+    assert list(errors) == [1] and "404" in errors[1]
+
+
+def test_parsing_does_not_block_the_event_loop(page_server):
+    class SlowParser(Site1Scraper):
+        def scrape_html(self, html):
+            time.sleep(0.3)
+            return super().scrape_html(html)
+
+    scraper = SlowParser(result_memo=False)
+
+    async def run():
+        async with AsyncScrapeEngine(response_cache=False) as engine:
+            urls = [f"{page_server}/voertuig.html?slow={i}" for i in range(5)]
+            return await asyncio.gather(*(scraper.scrape_async(url, engine) for url in urls))
+
+    started = time.monotonic()
+    frames = asyncio.run(run())
+    # En el loop, los cinco parseos irían uno tras otro (≥ 1.5 s)
+    assert time.monotonic() - started < 1.2
+    assert all(len(frame) for frame in frames)
+
+
+def counted(scrape_async, fetched, url, *args):
+    fetched.append(url)
+    return scrape_async(url, *args)
+
+
+def test_process_many_uses_the_result_cache(page_server):
+    cache = ResultCache()
+    processor = DataProcessor(result_cache=cache)
+    triples = [(f"{page_server}/voertuig.html?c=1", f"{page_server}/typenschein.html?c=1", ""),
+               (f"{page_server}/status/500", f"{page_server}/typenschein.html?c=2", "")]
+    first = processor.process_many(triples, True)
+    assert cache.stats()["entries"] == 3  # los errores no se guardan
+
+    # Lo mismo que process_urls: las entradas sirven a ambos métodos
+    results, _ = DataProcessor(result_cache=cache).process_urls({2: triples[0][1]}, True)
+    pd.testing.assert_frame_equal(results[2], first[0][0][2])
+
+    # La segunda vez los sitios guardados no se descargan (solo se reintenta el que falló)
+    fetched = []
+    for scraper in (processor.site1_scraper, processor.site2_scraper):
+        scraper.scrape_async = partial(counted, scraper.scrape_async, fetched)
+    second = processor.process_many(triples, True)
+    assert fetched == [triples[1][0]]
+    for (results, errors), (expected, expected_errors) in zip(second, first):
+        assert errors.keys() == expected_errors.keys()
+        for site, df in expected.items():
+            if df is not None:
+                pd.testing.assert_frame_equal(results[site], df)
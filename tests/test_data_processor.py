@@ -0,0 +1,51 @@
+import pandas as pd
+
+import data_processor
+from data_processor import DataProcessor
+from data_transformation.schema import HOMOLOGATION_KEYS
+
+KEYS = frozenset(HOMOLOGATION_KEYS[:10])
+
+
+def triple(base_url):
+    return (f"{base_url}/voertuig.html", f"{base_url}/typenschein.html", f"{base_url}/autodata.html")
+
+
+def only_requested(df, keys):
+    return all(value == "None" for key, value in zip(df["Key"].astype(object), df["Value"]) if key not in keys)
+
+
+def test_process_urls_uses_per_call_requested_keys(page_server):
+    processor = DataProcessor(result_cache=False)
+    urls = dict(enumerate(triple(page_server), start=1))
+    subset, errors = processor.process_urls(urls, requested_keys=KEYS)
+    full, _ = processor.process_urls(urls)
+    assert not errors and processor.requested_keys is None
+    for site in urls:
+        assert only_requested(subset[site], KEYS) and not only_requested(full[site], KEYS)
+
+
+def test_process_triple_leaves_the_worker_processor_untouched(page_server):
+    data_processor._init_worker()
+    worker = data_processor._worker_processor
+    for report in (False, True):
+        packed, errors, _ = data_processor._process_triple(triple(page_server), None, KEYS, report)
+        assert not errors and worker.requested_keys is None
+        for site, record in packed.items():
+            assert only_requested(worker._transformer(site).schema.unpack(record), KEYS)
+
+    # Sin claves pedidas, la terna siguiente del mismo proceso se transforma completa
+    packed, _, _ = data_processor._process_triple(triple(page_server))
+    reference = DataProcessor(result_cache=False)
+    for site, url in enumerate(triple(page_server), start=1):
+        pd.testing.assert_frame_equal(worker._transformer(site).schema.unpack(packed[site]),
+                                      reference.process_url(url, site))
+
+
+def test_process_triple_measures_memory_only_when_asked(page_server):
+    data_processor._init_worker()
+    for memory in (False, True):
+        _, errors, url_reports = data_processor._process_triple(triple(page_server), report=True, memory=memory)
+        assert not errors and len(url_reports) == 3
+        steps = pd.concat([url.to_frame() for url in url_reports], ignore_index=True)
+        assert steps["allocated_bytes"].notna().any() == memory
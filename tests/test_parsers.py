@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+
+from conftest import read_page
+from scraping.scraping_site_1 import Site1Scraper
+from scraping.scraping_site_2 import Site2Scraper
+from scraping.scraping_site_3 import Site3Scraper
+
+CASES = [
+    (Site1Scraper, "voertuig.html", {"extraction_mode": "soup"}, ()),
+    (Site1Scraper, "voertuig.html", {"extraction_mode": "xpath"}, ()),
+    (Site2Scraper, "typenschein.html", {}, (None,)),
+    (Site2Scraper, "typenschein.html", {}, (True,)),
+    (Site2Scraper, "typenschein.html", {}, (False,)),
+    (Site2Scraper, "typenschein_single.html", {}, (None,)),
+    (Site3Scraper, "autodata.html", {}, ()),
+]
+
+
+@pytest.mark.parametrize("scraper_class, page, options, args", CASES)
+def test_lxml_and_html_parser_extract_the_same(scraper_class, page, options, args):
+    html = read_page(page)
+    frames = {}
+    for backend in ("lxml", "html.parser"):
+        scraper = scraper_class(parser_backend=backend, result_memo=False, response_cache=False, **options)
+        assert scraper.parser_backend == backend
+        frames[backend] = scraper.scrape_html(html, *args)
+    assert len(frames["lxml"])
+    pd.testing.assert_frame_equal(frames["lxml"], frames["html.parser"])
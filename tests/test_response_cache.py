@@ -0,0 +1,36 @@
+import os
+
+from scraping.response_cache import PROJECT_DIR, CachedResponse, DiskCache, ResponseCache, project_path
+
+
+def entry(url, size=1000):
+    return CachedResponse(url=url, body="x" * size, stored_at=0.0)
+
+
+def test_disk_cache_evicts_oldest_files_over_the_limit(tmp_path):
+    tmp_path = tmp_path / "disk"
+    disk = DiskCache(str(tmp_path), max_bytes=10_000)
+    for i in range(8):
+        disk.put(entry(f"http://site/{i}"))
+        # Fechas de escritura crecientes, sin depender de la resolución del reloj
+        os.utime(disk._path(f"http://site/{i}"), (1000 + i, 1000 + i))
+    disk.put(entry("http://site/new", 4000))
+
+    sizes = [os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path)]
+    assert sum(sizes) <= 9_000
+    assert disk.get("http://site/0") is None and disk.get("http://site/1") is None
+    assert disk.get("http://site/7") is not None and disk.get("http://site/new") is not None
+
+
+def test_disk_cache_counts_existing_files(tmp_path):
+    tmp_path = tmp_path / "disk"
+    DiskCache(str(tmp_path)).put(entry("http://site/a", 5000))
+    disk = DiskCache(str(tmp_path), max_bytes=6000)
+    disk.put(entry("http://site/b", 5000))
+    assert disk.get("http://site/a") is None and disk.get("http://site/b") is not None
+
+
+def test_relative_directories_resolve_from_the_project(tmp_path):
+    assert project_path(".http_cache") == os.path.join(PROJECT_DIR, ".http_cache")
+    assert project_path(str(tmp_path)) == str(tmp_path)
+    assert ResponseCache(directory=str(tmp_path / "cache")).disk.directory == str(tmp_path / "cache")
@@ -0,0 +1,17 @@
+from conftest import read_page
+from scraping.result_memo import ResultMemo, scraper_fingerprint
+from scraping.scraping_site_1 import Site1Scraper
+
+
+def test_extraction_modes_do_not_share_memo_entries():
+    memo = ResultMemo()
+    xpath = Site1Scraper(extraction_mode="xpath", result_memo=memo, response_cache=False)
+    soup = Site1Scraper(extraction_mode="soup", result_memo=memo, response_cache=False)
+    assert scraper_fingerprint(xpath) != scraper_fingerprint(soup)
+
+    html = read_page("voertuig.html")
+    xpath.scrape_page(html)
+    soup.scrape_page(html)
+    assert memo.misses["scrape"] == 2 and memo.hits["scrape"] == 0
+    soup.scrape_page(html)
+    assert memo.hits["scrape"] == 1
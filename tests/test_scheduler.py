@@ -0,0 +1,40 @@
+import time
+
+import requests
+
+from scraping.scheduler import DomainScheduler
+
+
+def overloaded(retry_after):
+    response = requests.Response()
+    response.status_code = 503
+    response.headers["Retry-After"] = retry_after
+    return requests.HTTPError("503 Server Error", response=response)
+
+
+def test_retry_after_is_capped_by_backoff_max():
+    scheduler = DomainScheduler(max_attempts=2, backoff_multiplier=0.01, backoff_max=0.2)
+    calls = []
+
+    def fetch():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise overloaded("3600")
+        return "ok"
+
+    assert scheduler.call("http://site/page", fetch) == "ok"
+    assert 0.15 <= calls[1] - calls[0] < 1.0
+
+
+def test_retry_after_below_the_cap_is_respected():
+    scheduler = DomainScheduler(max_attempts=2, backoff_multiplier=0.001, backoff_max=5.0)
+    calls = []
+
+    def fetch():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise overloaded("0.3")
+        return "ok"
+
+    assert scheduler.call("http://site/page", fetch) == "ok"
+    assert calls[1] - calls[0] >= 0.3
@@ -0,0 +1,57 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from data_transformation.schema import HOMOLOGATION_SCHEMA
+from data_transformation.site_merge import merge_sites, merge_sites_many
+
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "golden", "merge.json")
+COLUMNS = ["Key", "Valor Sitio 1", "Valor Sitio 2", "Valor Sitio 3", "Valor Final"]
+
+
+def merge_cases():
+    """Casos de tests/fixtures/golden/merge.json (generados por make_golden.py con el merge original)."""
+    with open(GOLDEN, encoding="utf-8") as f:
+        return [pytest.param(case, id=case["name"]) for case in json.load(f)]
+
+
+def frames_of(case):
+    frames = {}
+    for site, rows in case["sites"].items():
+        df = None if rows is None else pd.DataFrame(rows, columns=["Key", "Value"])
+        if df is not None and case["categorical"]:
+            df = df.astype({"Key": HOMOLOGATION_SCHEMA.dtype})
+        frames[int(site)] = df
+    return frames
+
+
+def rows_of(df):
+    """Filas como listas, con la clave como texto y los valores nulos como None."""
+    return [[str(row[0])] + [None if pd.isna(value) else value for value in row[1:]]
+            for row in df[COLUMNS].values]
+
+
+@pytest.mark.parametrize("case", merge_cases())
+def test_merge_matches_baseline(case):
+    # Las filas repetidas deben quedar en la posición del merge original: la exportación
+    # asigna cada fila a su marcador {{B n}}
+    merged = merge_sites(frames_of(case))
+    assert list(merged.columns) == COLUMNS
+    assert rows_of(merged) == case["output"]
+
+
+@pytest.mark.parametrize("categorical", [False, True])
+def test_merge_many_matches_merge(categorical):
+    cases = [case.values[0] for case in merge_cases() if case.values[0]["categorical"] == categorical]
+    long_frames = {}
+    for site in (1, 2, 3):
+        parts = [frames_of(case)[site].assign(vehicle_id=vehicle)
+                 for vehicle, case in enumerate(cases) if case["sites"][str(site)] is not None]
+        long_frames[site] = pd.concat(parts, ignore_index=True)[["vehicle_id", "Key", "Value"]]
+
+    merged = merge_sites_many(long_frames)
+    for vehicle, case in enumerate(cases):
+        rows = merged[merged["vehicle_id"] == vehicle]
+        assert rows_of(rows) == rows_of(merge_sites(frames_of(case)))
@@ -0,0 +1,39 @@
+import os
+
+import pandas as pd
+
+from conftest import read_page
+from data_processor import DataProcessor
+from scraping.response_cache import PROJECT_DIR, project_path
+from scraping.snapshot_store import configure_snapshot_store
+
+# Dominio reservado: nunca resuelve, así que solo puede servirse desde el almacén
+OFFLINE_URL = "http://snapshots.invalid/voertuig.html"
+
+
+def test_store_configured_after_the_processor_is_used(page_server, tmp_path):
+    processor = DataProcessor(result_cache=False, error_reporter=print)
+    url = f"{page_server}/voertuig.html"
+
+    store = configure_snapshot_store("record", str(tmp_path / "snapshots"))
+    recorded = processor.process_url(url, 1)
+    assert store.urls() == [url]
+
+    replay = configure_snapshot_store("replay", str(tmp_path / "snapshots"))
+    replay.save(OFFLINE_URL, read_page("voertuig.html"))
+    pd.testing.assert_frame_equal(processor.process_url(OFFLINE_URL, 1), recorded)
+
+
+def test_async_engine_uses_the_current_store(tmp_path):
+    processor = DataProcessor(result_cache=False)
+    configure_snapshot_store("replay", str(tmp_path / "snapshots")).save(OFFLINE_URL, read_page("voertuig.html"))
+    (results, errors), = processor.process_many([(OFFLINE_URL, "", "")])
+    assert errors == {} and len(results[1])
+
+
+def test_default_store_is_anchored_to_the_project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path / "..")
+    relative = os.path.relpath(tmp_path / "snapshots", PROJECT_DIR)
+    store = configure_snapshot_store("record", relative)
+    assert store.directory == project_path(relative)
+    assert os.path.samefile(store.directory, tmp_path / "snapshots")
@@ -0,0 +1,104 @@
+import asyncio
+import gzip
+import tracemalloc
+
+import pytest
+import requests
+
+from scraping import transfer
+from conftest import read_page
+from page_server import compression_bomb
+from scraping.scraping_site_1 import Site1Scraper
+from scraping.transfer import ACCEPTED_ENCODINGS, FetchStats, ResponseTooLarge, _StreamDecoder, read_limited_async
+
+PAGE = ("<html><body>" + "<div class='row'>dato</div>" * 2000 + "</body></html>").encode()
+# 64 MiB de ceros: comprimidos ocupan unos pocos KB (o bytes, con brotli)
+BOMB = b"\0" * (64 * 1024 * 1024)
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return transfer.brotli.compress(data, quality=5)
+    return gzip.compress(data)
+
+
+class FakeContent:
+    def __init__(self, body, size):
+        self._chunks = [body[i:i + size] for i in range(0, len(body), size)]
+
+    async def iter_chunked(self, size):
+        for chunk in self._chunks:
+            yield chunk
+
+
+class FakeResponse:
+    """Lo que read_limited_async usa de una respuesta de aiohttp."""
+
+    def __init__(self, body, encoding, chunk_size=4096):
+        self.headers = {"Content-Encoding": encoding}
+        self.url = "http://site/page"
+        self.content = FakeContent(body, chunk_size)
+
+
+ENCODINGS = ["gzip", pytest.param("br", marks=pytest.mark.skipif(
+    not transfer.BROTLI_BOUNDED, reason="brotli < 1.2 no puede acotar la salida"))]
+
+
+def test_only_decodable_encodings_are_advertised():
+    encodings = [encoding.strip() for encoding in ACCEPTED_ENCODINGS.split(",")]
+    assert "zstd" not in encodings
+    assert ("br" in encodings) == transfer.BROTLI_BOUNDED
+    for encoding in encodings:
+        _StreamDecoder(encoding)
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_decodes_in_chunks(encoding):
+    stats = FetchStats(url="http://site/page", status=200)
+    body = asyncio.run(read_limited_async(FakeResponse(compress(PAGE, encoding), encoding, 512), 10 ** 6, stats))
+    assert body == PAGE and stats.decoded_bytes == len(PAGE)
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_decompression_stops_at_the_limit(encoding):
+    response = FakeResponse(compress(BOMB, encoding), encoding)
+    tracemalloc.start()
+    try:
+        with pytest.raises(ResponseTooLarge):
+            asyncio.run(read_limited_async(response, 1024 * 1024, FetchStats(url=response.url, status=200)))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 8 * 1024 * 1024
+
+
+@pytest.mark.parametrize("encoding", ["gzip", pytest.param("br", marks=pytest.mark.skipif(
+    transfer.brotli is None, reason="brotli no está instalado"))])
+def test_sync_path_stops_bombs_early(page_server, encoding):
+    # Sin brotli >= 1.2, "br" no se anuncia y la respuesta se rechaza sin descomprimir nada
+    scraper = Site1Scraper(response_cache=False, result_memo=False, max_body_bytes=1024 * 1024)
+    compression_bomb(encoding)  # el servidor corre en este proceso: que no cuente en la medición
+    tracemalloc.start()
+    try:
+        with pytest.raises(Exception) as raised:
+            scraper.fetch_html(f"{page_server}/bomb/{encoding}")
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    expected = "tamaño máximo" if encoding in transfer.SUPPORTED_ENCODINGS else "no soportado"
+    assert expected in str(raised.value)
+    assert peak < 8 * 1024 * 1024
+
+
+def test_sync_path_decodes_pages(page_server):
+    scraper = Site1Scraper(response_cache=False, result_memo=False)
+    html = scraper.fetch_html(f"{page_server}/voertuig.html?sync=1")
+    stats = scraper.fetch_stats[-1]
+    assert html == read_page("voertuig.html")
+    assert stats.content_encoding == "gzip" and stats.transferred_bytes < stats.decoded_bytes == len(html.encode())
+
+
+def test_unadvertised_encodings_are_rejected():
+    for encoding in ("zstd", "compress", "gzip, br"):
+        with pytest.raises(requests.RequestException):
+            _StreamDecoder(encoding)
@@ -0,0 +1,204 @@
+import builtins
+import contextlib
+import io
+import json
+import math
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from data_transformation.schema import HOMOLOGATION_KEYS
+from data_transformation.transform_site1 import DEFAULT_CONFIG_1, VehicleDataTransformer_site1
+from data_transformation.transform_site2 import DEFAULT_CONFIG_2, VehicleDataTransformer_site2
+from data_transformation.transform_site3 import DEFAULT_CONFIG_3, VehicleDataTransformer_site3
+from exportToFile import ODTExporter, TEMPLATES_BY_LANGUAGE, template_path
+
+# Las máscaras con faltantes no deben depender del downcasting de fillna, que pandas deprecó
+pytestmark = pytest.mark.filterwarnings("error::FutureWarning")
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "golden")
+TRANSFORMERS = {
+    1: (VehicleDataTransformer_site1, DEFAULT_CONFIG_1),
+    2: (VehicleDataTransformer_site2, DEFAULT_CONFIG_2),
+    3: (VehicleDataTransformer_site3, DEFAULT_CONFIG_3),
+}
+
+
+def golden_cases():
+    """Casos de tests/fixtures/golden (generados por make_golden.py con los transformadores originales)."""
+    cases = []
+    for site in TRANSFORMERS:
+        with open(os.path.join(GOLDEN_DIR, f"site{site}.json"), encoding="utf-8") as f:
+            cases.extend(pytest.param(site, case, id=f"site{site}-{case['name']}") for case in json.load(f))
+    return cases
+
+
+def transformer(site):
+    transformer_class, config = TRANSFORMERS[site]
+    return transformer_class(config)
+
+
+def input_frame(case):
+    return pd.DataFrame(case["input"], columns=["Key", "Value"])
+
+
+def rows_of(df):
+    """Filas (clave, valor) con la clave como texto (Key puede ser categórica)."""
+    return [(str(key), value) for key, value in df[["Key", "Value"]].values]
+
+
+def _comparable(value):
+    # NaN no es igual a sí mismo: se compara como texto (None sigue siendo None)
+    return ("NaN" if isinstance(value, float) and math.isnan(value) else value), type(value)
+
+
+def assert_rows_equal(actual, expected):
+    assert [key for key, _ in actual] == [key for key, _ in expected]
+    # Mismo valor y mismo tipo (1 y 1.0 o "1" no son intercambiables en la exportación)
+    assert [_comparable(value) for _, value in actual] == [_comparable(value) for _, value in expected]
+
+
+@pytest.mark.parametrize("site, case", golden_cases())
+def test_transform_matches_baseline(site, case):
+    if "error" in case:
+        with pytest.raises(getattr(builtins, case["error"])):
+            transformer(site).transform(input_frame(case))
+        return
+    output = transformer(site).transform(input_frame(case))
+    assert list(output.columns) == ["Key", "Value"]
+    assert_rows_equal(rows_of(output), [tuple(row) for row in case["output"]])
+
+
+def mutations(rows, rng):
+    """Variante al azar de una entrada: filas eliminadas, duplicadas, reordenadas o con valores raros."""
+    rows = [list(row) for row in rows]
+    for _ in range(rng.randint(1, 4)):
+        kind = rng.choice(("drop", "duplicate", "shuffle", "odd", "number"))
+        if not rows:
+            break
+        i = rng.randrange(len(rows))
+        if kind == "drop":
+            del rows[i]
+        elif kind == "duplicate":
+            rows.insert(rng.randrange(len(rows) + 1), list(rows[i]))
+        elif kind == "shuffle":
+            rng.shuffle(rows)
+        elif kind == "odd":
+            rows[i][1] = rng.choice(["", "None", "-", "0", "n/a", "12,5", " 7 ", "1 / 2", "3 liter", "x"])
+        else:
+            rows[i][1] = rng.choice([0, 1.5, None, float("nan")])
+    return rows
+
+
+def batch_inputs(site, count=120):
+    """Entradas de los casos de referencia, mutaciones con semilla fija y una entrada vacía."""
+    rng = random.Random(site)
+    inputs = [case.values[1]["input"] for case in golden_cases() if case.values[0] == site]
+    inputs += [mutations(rng.choice(inputs), rng) for _ in range(count)]
+    inputs.append([])
+    return inputs
+
+
+def long_frame(inputs):
+    return pd.DataFrame([(f"v{number}", key, value) for number, rows in enumerate(inputs) for key, value in rows],
+                        columns=["vehicle_id", "Key", "Value"])
+
+
+@pytest.mark.parametrize("site", TRANSFORMERS)
+def test_transform_many_matches_transform(site):
+    inputs = batch_inputs(site)
+    single = transformer(site)
+    output = transformer(site).transform_many(long_frame(inputs))
+    failed = output.attrs["failed_vehicles"]
+    vehicles = {vehicle: frame for vehicle, frame in output.groupby("vehicle_id", sort=False)}
+
+    for number, rows in enumerate(inputs):
+        vehicle = f"v{number}"
+        if not rows:
+            # Sin filas no hay vehículo en el formato largo
+            assert vehicle not in vehicles and vehicle not in failed
+            continue
+        try:
+            expected = single.transform(pd.DataFrame(rows, columns=["Key", "Value"]))
+        except Exception:
+            assert vehicle in failed and vehicle not in vehicles
+            continue
+        assert vehicle not in failed
+        assert_rows_equal(rows_of(vehicles[vehicle]), rows_of(expected))
+
+
+@pytest.mark.parametrize("site", TRANSFORMERS)
+def test_transform_many_on_empty_input(site):
+    output = transformer(site).transform_many(pd.DataFrame(columns=["vehicle_id", "Key", "Value"]))
+    assert output.empty and list(output.columns) == ["vehicle_id", "Key", "Value"]
+    assert output.attrs["failed_vehicles"] == {}
+
+
+def key_subsets(count=12):
+    """Claves pedidas: las de cada plantilla (como batch_export) y muestras al azar del esquema."""
+    subsets = []
+    for language in TEMPLATES_BY_LANGUAGE:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fields = ODTExporter(template_path(language)).fields_in_template(HOMOLOGATION_KEYS)
+        if fields is not None and fields not in subsets:
+            subsets.append(fields)
+    rng = random.Random(0)
+    subsets += [rng.sample(HOMOLOGATION_KEYS, rng.randint(1, len(HOMOLOGATION_KEYS))) for _ in range(count)]
+    subsets += [HOMOLOGATION_KEYS[::2], HOMOLOGATION_KEYS[-1:]]
+    return subsets
+
+
+def restricted(expected, keys):
+    """
+    Salida de referencia con solo `keys` calculadas: el resto queda en 'None', en su posición
+    (la exportación asigna los marcadores {{B<i>}} por posición, así que el orden debe ser el mismo).
+    """
+    keys = set(keys)
+    return [(key, value if key in keys else "None") for key, value in expected]
+
+
+@pytest.mark.parametrize("site", TRANSFORMERS)
+def test_requested_keys_keep_baseline_values_and_positions(site):
+    cases = [case.values[1] for case in golden_cases() if case.values[0] == site and "output" in case.values[1]]
+    # Una entrada vacía no tiene filas en el formato largo
+    batched = [case for case in cases if case["input"]]
+    batch_input = long_frame([case["input"] for case in batched])
+    for keys in key_subsets():
+        single = transformer(site)
+        for case in cases:
+            output = single.transform(input_frame(case), keys=keys)
+            assert_rows_equal(rows_of(output), restricted(case["output"], keys))
+
+        output = transformer(site).transform_many(batch_input, keys=keys)
+        assert output.attrs["failed_vehicles"] == {}
+        vehicles = dict(tuple(output.groupby("vehicle_id", sort=False)))
+        for number, case in enumerate(batched):
+            assert_rows_equal(rows_of(vehicles[f"v{number}"]), restricted(case["output"], keys))
+
+
+@pytest.mark.parametrize("site", TRANSFORMERS)
+def test_requested_keys_match_full_transform_on_mutations(site):
+    # Incluye entradas con claves repetidas, que desplazan las posiciones de las claves siguientes
+    inputs = [rows for rows in batch_inputs(site, count=60) if rows]
+    single = transformer(site)
+    expected = {}
+    for number, rows in enumerate(inputs):
+        try:
+            expected[f"v{number}"] = rows_of(single.transform(pd.DataFrame(rows, columns=["Key", "Value"])))
+        except Exception:
+            pass
+
+    batch_input = long_frame(inputs)
+    for keys in key_subsets(count=6):
+        for number, rows in enumerate(inputs):
+            if f"v{number}" in expected:
+                output = single.transform(pd.DataFrame(rows, columns=["Key", "Value"]), keys=keys)
+                assert_rows_equal(rows_of(output), restricted(expected[f"v{number}"], keys))
+
+        output = transformer(site).transform_many(batch_input, keys=keys)
+        for vehicle, frame in output.groupby("vehicle_id", sort=False):
+            # Sin referencia si el plan completo falla (el paso que falla puede no hacer falta)
+            if vehicle in expected:
+                assert_rows_equal(rows_of(frame), restricted(expected[vehicle], keys))